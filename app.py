@@ -1,11 +1,7 @@
 
 import streamlit as st
-import asyncio
-import json
-import os
 import pandas as pd
 from dotenv import load_dotenv
-import re
 
 # Load environment variables
 load_dotenv()
@@ -16,9 +12,13 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 
 # Import from the src directory
-from src.api_client import ApiClient
-from src.llm_agent import get_cognitive_agent
-from src.tools import APIRequest, Question
+from src.backend import get_backend
+from src.debug_panel import render_debug_panel
+from src.session import SessionNotFound
+
+# --- Agent Backend ---
+# The agent service when AGENT_SERVICE_URL is set; otherwise sessions run in this process.
+backend = get_backend()
 
 # --- Page Config ---
 st.set_page_config(page_title="Cognitive API Agent", layout="wide")
@@ -26,127 +26,215 @@ st.set_page_config(page_title="Cognitive API Agent", layout="wide")
 st.title("🤖 Cognitive API Agent")
 st.write("Provide an API endpoint, then chat with the agent. It will ask for details if needed.")
 
+DATA_PAGE_SIZE = 100
+
 # --- Session State ---
-if "messages" not in st.session_state:
-    st.session_state.messages = [{"role": "assistant", "content": "Hello! Please provide an API endpoint to begin."}]
-if "api_client" not in st.session_state:
-    st.session_state.api_client = None
-if "api_spec" not in st.session_state:
-    st.session_state.api_spec = None
-if "pending_api_request" not in st.session_state:
-    st.session_state.pending_api_request = None
+# The conversation lives in a backend session; `messages` is the local copy shown in the chat.
+def start_session(expired: bool = False):
+    created = backend.create_session()
+    st.session_state.session_id = created["state"]["session_id"]
+    st.session_state.messages = created["messages"]
+    st.session_state.agent_state = created["state"]
+    if expired:
+        st.session_state.messages.append(
+            {"role": "assistant", "content": "⚠️ Your previous session expired; a new one was started.", "data": None})
+
+if "session_id" not in st.session_state:
+    start_session()
 
 # --- Helper Functions ---
-def add_message(role, content, data=None):
-    st.session_state.messages.append({"role": role, "content": content, "data": data})
-
-async def initialize_api_client(url: str):
-    st.session_state.api_client = ApiClient(url)
-    with st.spinner("Fetching API specification..."):
-        spec = await st.session_state.api_client.get_api_spec()
-        if spec:
-            st.session_state.api_spec = json.dumps(spec, indent=2)
-            add_message("assistant", f"✅ API endpoint set to `{url}` and specification loaded successfully! How can I help?")
+def call_backend(method: str, *args):
+    """Calls the backend for this session; starts a new session if the old one has expired."""
+    try:
+        return getattr(backend, method)(st.session_state.session_id, *args)
+    except SessionNotFound:
+        start_session(expired=True)
+        return None
+
+def apply_result(result):
+    if result:
+        st.session_state.messages.extend(result["messages"])
+        st.session_state.agent_state = result["state"]
+
+def render_partial_decision(placeholder, event):
+    if event["kind"] == "Question":
+        placeholder.markdown(event["decision"].get("question_to_user", "") + " ▌")
+    else:
+        placeholder.json(event["decision"])
+
+def run_chat(prompt: str):
+    """Sends one chat message, streaming the agent's partial decision into the chat when enabled."""
+    if not st.session_state.get("stream_output", True):
+        with st.spinner("Agent is thinking..."):
+            return call_backend("chat", prompt)
+
+    with st.chat_message("user"):
+        st.markdown(prompt)
+    final = None
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        placeholder.markdown("_Agent is thinking..._")
+        try:
+            for event in backend.stream_chat(st.session_state.session_id, prompt):
+                if event["type"] == "partial":
+                    render_partial_decision(placeholder, event)
+                elif event["type"] == "done":
+                    final = event
+        except SessionNotFound:
+            start_session(expired=True)
+    return final
+
+def loaded_spec() -> str:
+    """The API spec for display, fetched once per endpoint."""
+    base_url = st.session_state.agent_state["base_url"]
+    if st.session_state.get("spec_for") != base_url:
+        st.session_state.spec_text = call_backend("spec") or ""
+        st.session_state.spec_for = base_url
+    return st.session_state.spec_text
+
+def render_rows(rows):
+    if isinstance(rows, list) and rows and all(isinstance(i, dict) for i in rows):
+        st.dataframe(pd.DataFrame(rows))
+    else:
+        st.json(rows)
+
+def render_data(data, index: int, key: str):
+    """Renders a result, one page at a time for long lists and for responses spilled or stored out of line."""
+    spilled = data.get("spilled") if isinstance(data, dict) else None
+    if spilled:
+        if spilled["format"] == "jsonl":
+            pages = max(1, -(-spilled["items"] // DATA_PAGE_SIZE))
+        else:
+            pages = max(1, -(-spilled["bytes"] // (DATA_PAGE_SIZE * 100)))
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=key) if pages > 1 else 1
+        # Spilled and stored results stay with the session; pages are read through the backend.
+        rows = call_backend("data_page", index, page - 1, DATA_PAGE_SIZE)
+        if rows is None:
+            st.warning("The stored response is no longer available.")
+            return
+        if spilled["format"] == "jsonl":
+            render_rows(rows)
         else:
-            add_message("assistant", f"⚠️ API endpoint set to `{url}`, but I could not find a specification.")
-    st.session_state.pending_api_request = None
+            st.code(rows, language="json")
+        where = f" at `{spilled['path']}`" if spilled.get("path") else " with the session"
+        st.caption(f"{spilled['bytes']:,} bytes stored{where}")
+        return
+    if isinstance(data, list) and len(data) > DATA_PAGE_SIZE:
+        pages = -(-len(data) // DATA_PAGE_SIZE)
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=key)
+        render_rows(data[(page - 1) * DATA_PAGE_SIZE:page * DATA_PAGE_SIZE])
+        return
+    render_rows(data)
 
 # --- UI Rendering ---
 # (This section remains largely the same but is included for completeness)
-if st.session_state.api_client:
-    status_message = f"✅ API Endpoint Set: `{st.session_state.api_client.base_url}`"
-    if st.session_state.api_spec:
+st.sidebar.checkbox("Stream agent output", value=True, key="stream_output")
+agent_state = st.session_state.agent_state
+if agent_state.get("last_turn"):
+    last_turn = agent_state["last_turn"]
+    st.sidebar.caption(f"Last turn: first output after {last_turn['ttft_s']}s, done after {last_turn['total_s']}s")
+cache_stats = backend.stats()
+if cache_stats.get("decision_cache"):
+    with st.sidebar.expander("Decision cache"):
+        st.json(cache_stats["decision_cache"])
+if cache_stats.get("response_cache"):
+    with st.sidebar.expander("Response cache"):
+        st.json(cache_stats["response_cache"])
+render_debug_panel()
+
+if agent_state["base_url"]:
+    status_message = f"✅ API Endpoint Set: `{agent_state['base_url']}`"
+    if agent_state["spec_loaded"]:
         st.info(status_message + " | ✅ Specification Loaded")
         with st.expander("View Loaded API Specification"):
-            st.json(st.session_state.api_spec)
+            st.code(loaded_spec(), language="text")
     else:
         st.warning(status_message + " | ⚠️ Specification Not Found")
 else:
     st.warning("⚠️ No API endpoint set. Please provide a URL in the chat.")
 
-for msg in st.session_state.messages:
+for i, msg in enumerate(st.session_state.messages):
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
         if msg.get("data"):
-            if isinstance(msg["data"], list) and msg["data"] and all(isinstance(i, dict) for i in msg["data"]):
-                st.dataframe(pd.DataFrame(msg["data"]))
-            else:
-                st.json(msg["data"])
+            render_data(msg["data"], i, key=f"data-page-{i}")
 
-if st.session_state.pending_api_request:
+if agent_state["pending_api_request"]:
     with st.container():
         st.warning("Please review the API request below:")
-        st.json(st.session_state.pending_api_request.model_dump())
+        st.json(agent_state["pending_api_request"])
         col1, col2, col3 = st.columns([1, 1, 3])
         with col1:
             if st.button("✅ Execute", use_container_width=True, type="primary"):
-                req = st.session_state.pending_api_request
-                st.session_state.pending_api_request = None
                 with st.spinner("Executing API call..."):
-                    result = asyncio.run(st.session_state.api_client.make_request(
-                        req.method, req.endpoint, req.json_payload, req.params
-                    ))
-                add_message("assistant", "API call executed.", data=result)
+                    apply_result(call_backend("confirm"))
                 st.rerun()
         with col2:
             if st.button("❌ Cancel", use_container_width=True):
-                st.session_state.pending_api_request = None
-                add_message("assistant", "API request cancelled.")
+                apply_result(call_backend("cancel"))
+                st.rerun()
+
+if agent_state["pending_api_plan"]:
+    with st.container():
+        st.warning("Please review the API calls below. They will be executed together:")
+        for step in agent_state["pending_api_plan"]["steps"]:
+            after = f" (after {', '.join(step['depends_on'])})" if step.get("depends_on") else ""
+            st.markdown(f"**{step['id']}**: `{step['method']} {step['endpoint']}`{after}")
+            payload = {k: step[k] for k in ("json_payload", "params") if step.get(k)}
+            if payload:
+                st.json(payload)
+        col1, col2, col3 = st.columns([1, 1, 3])
+        with col1:
+            if st.button("✅ Execute all", use_container_width=True, type="primary"):
+                with st.spinner(f"Executing {len(agent_state['pending_api_plan']['steps'])} API calls..."):
+                    apply_result(call_backend("confirm"))
+                st.rerun()
+        with col2:
+            if st.button("❌ Cancel plan", use_container_width=True):
+                apply_result(call_backend("cancel"))
                 st.rerun()
 
 # --- Main Logic ---
 if prompt := st.chat_input("Enter a URL or command..."):
-    add_message("user", prompt)
-    
-    url_match = re.search(r'https?://[^\s/]+(?::\d+)?', prompt)
-    if url_match:
-        asyncio.run(initialize_api_client(url_match.group(0)))
-    elif not st.session_state.api_client:
-        add_message("assistant", "Please provide an API endpoint first.")
-    else:
-        with st.spinner("Agent is thinking..."):
-            try:
-                # Get the last 5 messages for context
-                chat_history = json.dumps(st.session_state.messages[-5:])
-                agent = get_cognitive_agent(st.session_state.api_spec, chat_history)
-                
-                # The agent now makes a single, clear decision
-                decision = asyncio.run(agent.run(prompt))
-                
-                # Act based on the type of decision
-                if isinstance(decision.data, Question):
-                    add_message("assistant", decision.data.question_to_user)
-                
-                elif isinstance(decision.data, APIRequest):
-                    api_request = decision.data
-                    if api_request.method in ["POST", "PUT"]:
-                        st.session_state.pending_api_request = api_request
-                    else: # For GET/DELETE, execute immediately
-                        result = asyncio.run(st.session_state.api_client.make_request(
-                            api_request.method, api_request.endpoint, api_request.json_payload, api_request.params
-                        ))
-                        add_message("assistant", "API call successful.", data=result)
-                else:
-                    add_message("assistant", "I'm not sure how to proceed. Can you please clarify?")
-
-            except Exception as e:
-                logger.error(f"An error occurred: {e}", exc_info=True)
-                add_message("assistant", f"An error occurred: {e}")
+    # The session handles the message: a URL sets the endpoint, anything else is an agent turn
+    # whose GET calls run immediately and whose writes wait for confirmation above.
+    try:
+        apply_result(run_chat(prompt))
+    except Exception as e:
+        logger.error(f"An error occurred: {e}", exc_info=True)
+        st.session_state.messages += [
+            {"role": "user", "content": prompt, "data": None},
+            {"role": "assistant", "content": f"An error occurred: {e}", "data": None},
+        ]
     
     st.rerun()
-import asyncio
 import streamlit as st
-from main import ask_generate, ask_execute
+from src.backend import get_backend
+from src.debug_panel import render_debug_panel
+
+# The agent service when AGENT_SERVICE_URL is set; otherwise the agent runs in this process.
+db_backend = get_backend()
 
 # Set up Streamlit page
 st.set_page_config(page_title="Dynamic DB Agent", layout="centered")
 st.title("🤖 Dynamic Database Agent")
 st.write("You can manage notes (create, update, delete, search) or manage the database structure (create table).")
+render_debug_panel()
 
-# Initialize session state for holding the generated SQL
+# Initialize session state: the backend session holds the generated SQL until it is executed
+if 'db_session_id' not in st.session_state:
+    st.session_state.db_session_id = db_backend.create_session()["state"]["session_id"]
 if 'sql_to_execute' not in st.session_state:
     st.session_state.sql_to_execute = ""
 
+def call_db_backend(method: str, *args):
+    """Calls the backend for this session, starting a new session if the old one has expired."""
+    try:
+        return getattr(db_backend, method)(st.session_state.db_session_id, *args)
+    except SessionNotFound:
+        st.session_state.db_session_id = db_backend.create_session()["state"]["session_id"]
+        return getattr(db_backend, method)(st.session_state.db_session_id, *args)
+
 # --- User Input ---
 placeholder_text = (
     "Try these commands:\n"
@@ -164,25 +252,33 @@ if st.button("Submit", use_container_width=True):
         st.session_state.sql_to_execute = ""
         with st.spinner("Agent is thinking..."):
             try:
-                response = asyncio.run(ask_generate(user_input))
+                generated = call_db_backend("generate", user_input)
+                response = generated["response"]
+                st.session_state.sql_to_execute = generated["state"]["pending_sql"] or ""
 
                 # Handle DDL: SQL was generated for review
-                if response and response.response_type == "ddl_generated":
-                    st.info(response.message)
-                    st.code(response.sql_query, language="sql")
-                    st.session_state.sql_to_execute = response.sql_query
+                if response and response["response_type"] == "ddl_generated":
+                    st.info(response["message"])
+                    st.code(response["sql_query"], language="sql")
 
                 # Handle DML: Action was performed directly
-                elif response and response.response_type == "dml_success":
-                    st.success(response.message)
-                    if response.note:
-                        st.json(response.note)
-                    if response.titles:
-                        st.json(response.titles)
+                elif response and response["response_type"] == "dml_success":
+                    st.success(response["message"])
+                    if response["note"]:
+                        st.json(response["note"])
+                    if response["results"]:
+                        st.dataframe(response["results"], use_container_width=True)
+                    elif response["titles"]:
+                        st.json(response["titles"])
+                    if response["items"]:
+                        st.dataframe(response["items"], use_container_width=True)
+                    if response["next_cursor"]:
+                        st.caption(f"Showing {len(response['titles'] or [])} results. "
+                                   f"Ask for the next page with cursor `{response['next_cursor']}`.")
 
                 # Handle errors
                 elif response:
-                    st.error(response.message)
+                    st.error(response["message"])
                 else:
                     st.error("Received an empty response from the agent.")
 
@@ -194,12 +290,13 @@ if st.session_state.sql_to_execute:
     st.warning("⚠️ Review the SQL command above. Execute it only if it's correct.")
     if st.button("Execute SQL Command", type="primary", use_container_width=True):
         with st.spinner("Executing command..."):
-            sql_to_run = st.session_state.sql_to_execute
             st.session_state.sql_to_execute = "" # Clear state immediately
 
-            result = asyncio.run(ask_execute(sql_to_run))
+            try:
+                result = call_db_backend("execute")["result"]
+            except Exception as e:
+                result = {"status": "FAILED", "message": str(e)}
             if result["status"] == "SUCCESS":
                 st.success(f"Execution successful: {result['message']}")
             else:
                 st.error(f"Execution failed: {result['message']}")
-
@@ -0,0 +1 @@
+"""Offline benchmarks for the agents, the database layer and the HTTP client. Run with `python -m bench`."""
@@ -0,0 +1,102 @@
+# bench/__main__.py
+
+"""
+Runs the benchmark scenarios against local stand-ins (a disposable Postgres, an ASGI stand-in API
+and a scripted model) and writes the results as JSON.
+
+    pip install -r bench/requirements.txt
+    python -m bench                                        # every scenario at concurrency 1..256
+    python -m bench -s db.search --rows 10000 100000 1000000
+    python -m bench --out bench/results/after.json --compare bench/results/before.json
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from contextlib import ExitStack
+from typing import List
+
+# The agents build their OpenAI models at import time; nothing is sent to OpenAI during a run.
+os.environ.setdefault("OPENAI_API_KEY", "bench-offline")
+
+from bench.harness import DEFAULT_REGRESSION_THRESHOLD, BenchResult, compare, load_results, save_results
+from bench.scenarios import SCENARIOS, BenchContext, shutdown
+from bench.servers import ServiceUnavailable, local_postgres, serve_asgi
+from bench.standin_api import StandinAPI
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.replace(",", " ").split()]
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Offline performance benchmarks.")
+    parser.add_argument("-s", "--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument("-c", "--concurrency", type=_ints, default=[1, 4, 16, 64, 256],
+                        help="Comma-separated concurrency levels (default: 1,4,16,64,256).")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="Measured calls per case.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000], help="Table sizes for db.search.")
+    parser.add_argument("--llm", choices=["function", "test"], default="function",
+                        help="Scripted model with latency, or pydantic-ai's TestModel.")
+    parser.add_argument("--spec", nargs="*", default=[], help="Extra OpenAPI JSON files for spec.compaction.")
+    parser.add_argument("--no-alloc", action="store_true", help="Skip tracemalloc allocation tracking.")
+    parser.add_argument("--out", default=os.path.join("bench", "results", time.strftime("%Y%m%d-%H%M%S") + ".json"))
+    parser.add_argument("--compare", help="Baseline results JSON; exits with status 1 on regressions.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="Allowed p95/throughput change before a case counts as a regression.")
+    return parser.parse_args(argv)
+
+async def run(ctx: BenchContext, names: List[str], available: set) -> List[BenchResult]:
+    results: List[BenchResult] = []
+    try:
+        for name in names:
+            scenario, needs = SCENARIOS[name]
+            missing = needs - available
+            if missing:
+                print(f"-- {name}: skipped (no {', '.join(sorted(missing))})")
+                continue
+            print(f"-- {name}")
+            for result in await scenario(ctx):
+                print(result.row())
+                results.append(result)
+    finally:
+        await shutdown()
+    return results
+
+def main(argv: List[str]) -> int:
+    logging.basicConfig(level=logging.WARNING)
+    args = parse_args(argv)
+    needs = set().union(*(SCENARIOS[name][1] for name in args.scenarios))
+    ctx = BenchContext(concurrency=args.concurrency, requests=args.requests, rows=args.rows, llm=args.llm,
+                       trace_alloc=not args.no_alloc, specs=args.spec)
+    available = set()
+    with ExitStack() as stack:
+        if "db" in needs:
+            try:
+                ctx.dsn = stack.enter_context(local_postgres(max_connections=max(args.concurrency) + 50))
+                available.add("db")
+            except ServiceUnavailable as e:
+                print(f"Postgres unavailable: {e}")
+        if "http" in needs:
+            ctx.standin = StandinAPI()
+            try:
+                ctx.api_url = stack.enter_context(serve_asgi(ctx.standin))
+                available.add("http")
+            except ServiceUnavailable as e:
+                print(f"Stand-in API unavailable: {e}")
+        results = asyncio.run(run(ctx, args.scenarios, available))
+
+    save_results(args.out, results, vars(args))
+    print(f"Results written to {args.out}")
+    if args.compare:
+        regressions = compare(load_results(args.compare), results, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,89 @@
+# bench/fake_llm.py
+
+import asyncio
+import json
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, TextPart, ToolCallPart, ToolReturnPart, UserPromptPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+from pydantic_ai.models.test import TestModel
+
+# Stand-ins for gpt-4o. FunctionModel scripts realistic single-tool-call turns; TestModel ("--llm test")
+# calls every tool with generated arguments. The latency approximates a hosted model's round trip.
+BENCH_LLM_LATENCY = float(os.getenv("BENCH_LLM_LATENCY", "0.05"))
+
+def _tool_call(tool_name: str, args: Dict[str, Any]) -> ToolCallPart:
+    # Older pydantic-ai releases build tool calls from raw args; newer ones take the dict directly.
+    if hasattr(ToolCallPart, "from_raw_args"):
+        return ToolCallPart.from_raw_args(tool_name, args)
+    return ToolCallPart(tool_name=tool_name, args=args)
+
+def _latest_prompt(messages: List[ModelMessage]) -> str:
+    for message in reversed(messages):
+        if isinstance(message, ModelRequest):
+            for part in message.parts:
+                if isinstance(part, UserPromptPart) and isinstance(part.content, str):
+                    return part.content
+    return ""
+
+def _result_tool_names(info: AgentInfo) -> List[str]:
+    tools = getattr(info, "result_tools", None) or getattr(info, "output_tools", None) or []
+    return [tool.name for tool in tools]
+
+# --- Notes Agent (main.main_agent) ---
+
+NoteScript = Callable[[str], Optional[Tuple[str, Dict[str, Any]]]]
+
+def notes_model(script: NoteScript, latency: float = BENCH_LLM_LATENCY) -> FunctionModel:
+    """
+    Plays the notes agent: the first model call picks the tool `script` returns for the prompt, the
+    second turns the tool's AgentResponse into the JSON text that ask_generate parses.
+    """
+
+    async def respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await asyncio.sleep(latency)
+        returns = [part for part in messages[-1].parts if isinstance(part, ToolReturnPart)]
+        if returns:
+            content = returns[0].content
+            text = content.model_dump_json() if isinstance(content, BaseModel) else json.dumps(content, default=str)
+            return ModelResponse(parts=[TextPart(content=text)])
+        call = script(_latest_prompt(messages)) or ("list_notes_tool", {})
+        return ModelResponse(parts=[_tool_call(*call)])
+
+    return FunctionModel(respond)
+
+# --- API Agent (src.llm_agent) ---
+
+_CUSTOMER = re.compile(r"customer\s+#?(\d+)", re.I)
+
+def api_decision_for(prompt: str) -> Tuple[str, Dict[str, Any]]:
+    """A deterministic decision for the benchmark prompts: ('APIRequest' | 'Question', arguments)."""
+    # The per-turn prompt may carry the retrieved spec ahead of the user's words.
+    text = prompt.rsplit("--- END OF SPECIFICATION ---", 1)[-1]
+    match = _CUSTOMER.search(text)
+    if "orders" in text.lower() and match:
+        return "APIRequest", {"method": "GET", "endpoint": f"/customers/{match.group(1)}/orders"}
+    if match:
+        return "APIRequest", {"method": "GET", "endpoint": f"/customers/{match.group(1)}"}
+    if "list" in text.lower():
+        return "APIRequest", {"method": "GET", "endpoint": "/customers", "params": {"limit": 20}}
+    return "Question", {"question_to_user": "Which customer do you mean?"}
+
+def api_model(latency: float = BENCH_LLM_LATENCY) -> FunctionModel:
+    """Plays the API agent, answering through the structured result tool for the chosen decision type."""
+
+    async def respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await asyncio.sleep(latency)
+        kind, args = api_decision_for(_latest_prompt(messages))
+        names = _result_tool_names(info)
+        name = next((n for n in names if n.endswith(kind)), names[0] if names else "final_result")
+        return ModelResponse(parts=[_tool_call(name, args)])
+
+    return FunctionModel(respond)
+
+def make_model(kind: str, function_model: Callable[[], FunctionModel]):
+    """The model for `--llm`: 'function' (scripted, with latency) or 'test' (pydantic-ai TestModel)."""
+    return TestModel() if kind == "test" else function_model()
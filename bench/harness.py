@@ -0,0 +1,167 @@
+# bench/harness.py
+
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# A regression is reported when p95 latency grows, or throughput drops, by more than this fraction.
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+Operation = Callable[[int], Awaitable[Any]]
+
+# --- Results ---
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(math.ceil(q / 100 * len(ordered)) - 1, 0))]
+
+@dataclass
+class BenchResult:
+    """One (scenario, case, concurrency) measurement. Latencies are in milliseconds."""
+    scenario: str
+    case: str
+    concurrency: int = 1
+    requests: int = 0
+    errors: int = 0
+    duration_s: float = 0.0
+    throughput_rps: float = 0.0
+    mean_ms: Optional[float] = None
+    p50_ms: Optional[float] = None
+    p90_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    p99_ms: Optional[float] = None
+    max_ms: Optional[float] = None
+    alloc_peak_kib: Optional[float] = None
+    alloc_net_kib: Optional[float] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        return f"{self.scenario}/{self.case}@c{self.concurrency}"
+
+    def row(self) -> str:
+        if self.p50_ms is None:
+            details = " ".join(f"{k}={v}" for k, v in self.extra.items())
+            return f"{self.key:<48} {details}"
+        return (
+            f"{self.key:<48} {self.throughput_rps:>9.1f} req/s  p50 {self.p50_ms:>8.2f}  p95 {self.p95_ms:>8.2f}  "
+            f"p99 {self.p99_ms:>8.2f} ms  err {self.errors:>4}"
+            + (f"  peak {self.alloc_peak_kib:>9.1f} KiB" if self.alloc_peak_kib is not None else "")
+        )
+
+# --- Load Generation ---
+
+async def run_load(scenario: str, case: str, op: Operation, concurrency: int, requests: int,
+                   warmup: int = 0, trace_alloc: bool = True, extra: Optional[Dict[str, Any]] = None) -> BenchResult:
+    """
+    Calls `op(i)` for i in range(requests) from `concurrency` workers and measures each call.
+    An exception counts as an error. `warmup` calls run first, unmeasured. Allocations are measured
+    with tracemalloc, which slows Python code down; pass trace_alloc=False for pure latency numbers.
+    """
+    for i in range(warmup):
+        try:
+            await op(-1 - i)
+        except Exception:
+            pass
+
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index, errors
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                await op(i)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    if trace_alloc:
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, requests)))))
+    duration = time.perf_counter() - started
+    peak = net = None
+    if trace_alloc:
+        current, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak, net = (peak_bytes - before) / 1024, (current - before) / 1024
+
+    ordered = sorted(latencies)
+
+    def ms(seconds: Optional[float]) -> Optional[float]:
+        return round(seconds * 1000, 3) if seconds is not None else None
+
+    return BenchResult(
+        scenario=scenario, case=case, concurrency=concurrency, requests=requests, errors=errors,
+        duration_s=round(duration, 4), throughput_rps=round(requests / duration, 2) if duration else 0.0,
+        mean_ms=ms(sum(ordered) / len(ordered)) if ordered else None,
+        p50_ms=ms(percentile(ordered, 50)), p90_ms=ms(percentile(ordered, 90)), p95_ms=ms(percentile(ordered, 95)),
+        p99_ms=ms(percentile(ordered, 99)), max_ms=ms(ordered[-1] if ordered else None),
+        alloc_peak_kib=round(peak, 1) if peak is not None else None,
+        alloc_net_kib=round(net, 1) if net is not None else None,
+        extra=dict(extra or {}),
+    )
+
+# --- Persistence and Comparison ---
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, timeout=5).stdout.strip()
+    except Exception:
+        return None
+
+def save_results(path: str, results: List[BenchResult], args: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    document = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": args,
+        },
+        "results": [asdict(r) for r in results],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+
+def load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        document = json.load(f)
+    return {BenchResult(**r).key: r for r in document["results"]}
+
+def compare(baseline: Dict[str, Dict[str, Any]], current: List[BenchResult],
+            threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> List[str]:
+    """Returns one line per regression: p95 latency up, or throughput down, by more than `threshold`."""
+    regressions = []
+    for result in current:
+        old = baseline.get(result.key)
+        if not old or result.p95_ms is None or not old.get("p95_ms"):
+            continue
+        p95_change = result.p95_ms / old["p95_ms"] - 1
+        rps_change = result.throughput_rps / old["throughput_rps"] - 1 if old.get("throughput_rps") else 0.0
+        if p95_change > threshold or rps_change < -threshold:
+            regressions.append(
+                f"{result.key}: p95 {old['p95_ms']:.2f} -> {result.p95_ms:.2f} ms ({p95_change:+.0%}), "
+                f"throughput {old['throughput_rps']:.1f} -> {result.throughput_rps:.1f} req/s ({rps_change:+.0%})"
+            )
+    return regressions
@@ -0,0 +1,363 @@
+# bench/scenarios.py
+
+import json
+import os
+import random
+import re
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import asyncpg
+
+from bench.fake_llm import api_model, make_model, notes_model
+from bench.harness import BenchResult, run_load
+from bench.standin_api import Faults, StandinAPI, build_spec
+from database import BULK_MAX_ITEMS, DatabaseConn, close_pool
+
+@dataclass
+class BenchContext:
+    """Run-wide settings and the services started for this run."""
+    concurrency: List[int]
+    requests: int
+    rows: List[int]
+    llm: str = "function"
+    trace_alloc: bool = True
+    dsn: Optional[str] = None
+    api_url: Optional[str] = None
+    standin: Optional[StandinAPI] = None
+    specs: List[str] = field(default_factory=list)
+
+    async def load(self, scenario: str, case: str, op: Callable[[int], Awaitable[Any]], concurrency: int,
+                   requests: Optional[int] = None, warmup: int = 0, **extra: Any) -> BenchResult:
+        return await run_load(scenario, case, op, concurrency, requests or self.requests, warmup=warmup,
+                              trace_alloc=self.trace_alloc, extra=extra)
+
+Scenario = Callable[[BenchContext], Awaitable[List[BenchResult]]]
+# name -> (scenario, services it needs: "db" and/or "http")
+SCENARIOS: Dict[str, Tuple[Scenario, Set[str]]] = {}
+
+def scenario(name: str, *needs: str) -> Callable[[Scenario], Scenario]:
+    def register(function: Scenario) -> Scenario:
+        SCENARIOS[name] = (function, set(needs))
+        return function
+    return register
+
+def _check(result: Any) -> Any:
+    """Turns a FAILED result dict into an exception so the harness counts it as an error."""
+    if isinstance(result, dict) and result.get("status") == "FAILED":
+        raise RuntimeError(result.get("message"))
+    return result
+
+async def _reset_notes(db: DatabaseConn) -> None:
+    _check(await db.execute_dynamic_ddl("TRUNCATE notes RESTART IDENTITY"))
+
+async def _seed_notes(db: DatabaseConn, count: int, text_for: Callable[[int], str] = lambda i: f"Bench note number {i}.") -> None:
+    for start in range(0, count, BULK_MAX_ITEMS):
+        await db.add_notes([(f"bench-{i}", text_for(i)) for i in range(start, min(start + BULK_MAX_ITEMS, count))])
+    _check(await db.execute_dynamic_ddl("ANALYZE notes"))
+
+# --- Database ---
+
+@scenario("db.pool", "db")
+async def db_pool(ctx: BenchContext) -> List[BenchResult]:
+    """Pooled DatabaseConn lookups against opening a fresh connection per call (the pre-pool behaviour)."""
+    db = DatabaseConn(ctx.dsn)
+    await _reset_notes(db)
+    await _seed_notes(db, 500)
+
+    async def pooled(i: int) -> None:
+        await db.get_note_by_title(f"bench-{i % 500}")
+
+    async def connect_per_call(i: int) -> None:
+        conn = await asyncpg.connect(ctx.dsn)
+        try:
+            await conn.fetchrow("SELECT id, title, text FROM notes WHERE title = $1", f"bench-{i % 500}")
+        finally:
+            await conn.close()
+
+    results = []
+    for c in ctx.concurrency:
+        results.append(await ctx.load("db.pool", "pooled", pooled, c, warmup=5))
+        results.append(await ctx.load("db.pool", "connect_per_call", connect_per_call, c))
+    return results
+
+@scenario("db.crud", "db")
+async def db_crud(ctx: BenchContext) -> List[BenchResult]:
+    """A create/read/update/delete cycle per call, and the bulk tools' batched writes."""
+    db = DatabaseConn(ctx.dsn)
+    await _reset_notes(db)
+    results = []
+    for c in ctx.concurrency:
+        async def cycle(i: int, c: int = c) -> None:
+            title = f"crud-{c}-{i}"
+            await db.add_note(title, "draft")
+            await db.update_note(title, "final")
+            await db.get_note_by_title(title)
+            await db.delete_note(title)
+
+        async def bulk(i: int, c: int = c) -> None:
+            titles = [f"bulk-{c}-{i}-{n}" for n in range(100)]
+            await db.add_notes([(t, "bulk text") for t in titles])
+            await db.update_notes([(t, "bulk text, revised") for t in titles])
+            await db.delete_notes(titles)
+
+        results.append(await ctx.load("db.crud", "single_note_cycle", cycle, c))
+        results.append(await ctx.load("db.crud", "bulk_100_cycle", bulk, c, requests=max(ctx.requests // 10, c)))
+    return results
+
+_WORDS = [f"{a}{b}" for a in ("al", "bo", "ca", "de", "ek", "fo", "gu", "ha", "in", "jo") for b in
+          ("ment", "tion", "ery", "ling", "ster", "ward", "ness", "ship", "dom", "hood")]
+
+@scenario("db.search", "db")
+async def db_search(ctx: BenchContext) -> List[BenchResult]:
+    """
+    Note search at each table size: the indexed full-text, substring (trigram) and fuzzy modes against
+    an unindexed ILIKE sequential scan, the query the search replaced.
+    """
+    db = DatabaseConn(ctx.dsn)
+    rng = random.Random(42)
+    results = []
+    for rows in ctx.rows:
+        await _reset_notes(db)
+        # About one note in a thousand mentions the rare 'quokkaship'.
+        await _seed_notes(db, rows, lambda i: " ".join(rng.choice(_WORDS) for _ in range(30))
+                          + (" quokkaship sighting" if i % 1000 == 0 else ""))
+
+        async def fulltext(i: int) -> None:
+            await db.search_notes("quokkaship", mode="fulltext", limit=20)
+
+        async def substring(i: int) -> None:
+            await db.search_notes("okkashi", mode="substring", limit=20)
+
+        async def fuzzy(i: int) -> None:
+            await db.search_notes("quokaship", mode="fuzzy", limit=20)
+
+        async def ilike_seqscan(i: int) -> None:
+            async with db._connect("bench_ilike") as conn:
+                async with conn.transaction():
+                    await conn.execute("SET LOCAL enable_bitmapscan = off; SET LOCAL enable_indexscan = off")
+                    await conn.fetch("SELECT title, text FROM notes WHERE text ILIKE $1 LIMIT 20", "%okkashi%")
+
+        cases = [("fulltext", fulltext), ("substring_trgm", substring), ("fuzzy_trgm", fuzzy), ("ilike_seqscan", ilike_seqscan)]
+        if not await db.trigram_available():
+            # Without pg_trgm the substring mode is the same sequential scan and fuzzy search is unavailable.
+            cases = [("fulltext", fulltext), ("substring_unindexed", substring), ("ilike_seqscan", ilike_seqscan)]
+        for c in ctx.concurrency:
+            for case, op in cases:
+                results.append(await ctx.load("db.search", f"{case}_{rows}", op, c, warmup=2, rows=rows))
+    return results
+
+# --- Notes Agent ---
+
+_TITLE = re.compile(r"bench-[\w-]+")
+
+def _note_script(prompt: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """What gpt-4o would call for the benchmark's notes prompts."""
+    title = _TITLE.search(prompt)
+    if prompt.lower().startswith("jot down") and title:
+        return "create_note_tool", {"title": title.group(0), "text": "Written by the benchmark."}
+    if title:
+        return "retrieve_note_tool", {"title": title.group(0)}
+    return None
+
+@scenario("agent.notes", "db")
+async def agent_notes(ctx: BenchContext) -> List[BenchResult]:
+    """main.ask_generate through the intent fast path, the decision cache and a (mocked) model turn, plus ask_execute."""
+    import main
+    # main's shared DatabaseConn was built with the default DSN at import time.
+    main._db = DatabaseConn(ctx.dsn)
+    await _reset_notes(main._db)
+    await _seed_notes(main._db, 50)
+
+    async def ask(prompt: str) -> None:
+        response = await main.ask_generate(prompt)
+        if response.response_type == "error":
+            raise RuntimeError(response.message)
+
+    results = []
+    with main.main_agent.override(model=make_model(ctx.llm, lambda: notes_model(_note_script))):
+        for c in ctx.concurrency:
+            results.append(await ctx.load("agent.notes", "fast_path", lambda i: ask(f"show note bench-{i % 50}"), c))
+            # Unique prompts, so every call is a model turn.
+            results.append(await ctx.load("agent.notes", "llm_read", lambda i, c=c: ask(
+                f"What did I write in bench-{i % 50}? (c{c} request {i})"), c))
+            results.append(await ctx.load("agent.notes", "llm_write", lambda i, c=c: ask(
+                f"Jot down a note titled bench-w{c}-{i} that says hello"), c))
+            # Ten repeated prompts, primed by the warmup, so every measured call replays a cached decision.
+            results.append(await ctx.load("agent.notes", "decision_cache", lambda i: ask(
+                f"What did I write in bench-{i % 10}?"), c, warmup=10))
+            results.append(await ctx.load("agent.notes", "ask_execute", lambda i: _check_async(
+                main.ask_execute("CREATE TABLE IF NOT EXISTS bench_ddl (id integer)")), c))
+    return results
+
+async def _check_async(awaitable: Awaitable[Any]) -> Any:
+    return _check(await awaitable)
+
+# --- HTTP Client ---
+
+@scenario("http.client", "http")
+async def http_client(ctx: BenchContext) -> List[BenchResult]:
+    """One pooled keep-alive ApiClient against a fresh client per call, the GET response cache, and spilling."""
+    from src.api_client import ApiClient
+    from src.response_cache import ResponseCache
+
+    ctx.standin.faults = Faults(latency_ms=2)
+    shared = ApiClient(ctx.api_url)
+    shared.response_cache = None
+    cached = ApiClient(ctx.api_url, response_cache=ResponseCache())
+
+    async def pooled(i: int) -> None:
+        _check(await shared.make_request("GET", f"/customers/{i % 500 + 1}"))
+
+    async def fresh(i: int) -> None:
+        client = ApiClient(ctx.api_url)
+        client.response_cache = None
+        try:
+            _check(await client.make_request("GET", f"/customers/{i % 500 + 1}"))
+        finally:
+            await client.aclose()
+
+    async def with_cache(i: int) -> None:
+        _check(await cached.make_request("GET", f"/customers/{i % 50 + 1}"))
+
+    async def spill(i: int) -> None:
+        result = _check(await shared.make_request("GET", "/export", params={"items": 100_000}))
+        if "spilled" in result:
+            os.remove(result["spilled"]["path"])
+
+    results = []
+    try:
+        for c in ctx.concurrency:
+            results.append(await ctx.load("http.client", "pooled_client", pooled, c, warmup=5))
+            results.append(await ctx.load("http.client", "fresh_client", fresh, c))
+            ctx.standin.faults.cache_max_age = 60
+            results.append(await ctx.load("http.client", "response_cache", with_cache, c))
+            ctx.standin.faults.cache_max_age = None
+        results.append(await ctx.load("http.client", "spill_100k_items", spill, 1, requests=5))
+    finally:
+        await shared.aclose()
+        await cached.aclose()
+    return results
+
+@scenario("http.resilience", "http")
+async def http_resilience(ctx: BenchContext) -> List[BenchResult]:
+    """Success rate and latency under injected faults with and without retries, and circuit breaker fast-fail."""
+    from src.api_client import ApiClient
+    from src.resilience import CircuitBreaker, RetryPolicy
+
+    cases = [
+        ("503s_no_retries", Faults(error_rate=0.2), RetryPolicy(max_retries=0), None),
+        ("503s_retries", Faults(error_rate=0.2), RetryPolicy(max_retries=3, base_delay=0.01, max_delay=0.2), None),
+        ("429_retry_after", Faults(error_rate=0.2, error_status=429, retry_after="0"), RetryPolicy(max_retries=3), None),
+        ("slow_reads_timeout", Faults(slow_rate=0.05, slow_ms=2000), RetryPolicy(max_retries=2, base_delay=0.01), 0.5),
+        ("down_circuit_breaker", Faults(error_rate=1.0), RetryPolicy(max_retries=0), None),
+    ]
+    results = []
+    for case, faults, retry, read_timeout in cases:
+        for c in ctx.concurrency:
+            client = ApiClient(ctx.api_url, retry=retry, **({"timeout": read_timeout} if read_timeout else {}))
+            client.response_cache = None
+            client.breaker = CircuitBreaker(threshold=1_000_000) if "breaker" not in case else CircuitBreaker(5, 60)
+            ctx.standin.faults = faults
+            ctx.standin.reset_counts()
+
+            async def op(i: int, client: ApiClient = client) -> None:
+                _check(await client.make_request("GET", f"/customers/{i % 500 + 1}"))
+
+            try:
+                result = await ctx.load("http.resilience", case, op, c)
+            finally:
+                await client.aclose()
+            result.extra["success_rate"] = round(1 - result.errors / result.requests, 4)
+            result.extra["server_statuses"] = dict(ctx.standin.status_counts)
+            results.append(result)
+    ctx.standin.faults = Faults()
+    return results
+
+# --- Spec Handling ---
+
+@scenario("spec.compaction")
+async def spec_compaction(ctx: BenchContext) -> List[BenchResult]:
+    """Prompt size of the raw, minified, compact and retrieved (top-k) spec, and the time to compact it."""
+    from src.spec_compact import compact_spec
+    from src.spec_index import SpecIndex, estimate_tokens
+
+    specs = {"standin": build_spec(), "standin_x50": build_spec(extra_resources=50)}
+    for path in ctx.specs:
+        with open(path, "r", encoding="utf-8") as f:
+            specs[os.path.basename(path)] = json.load(f)
+
+    results = []
+    for name, spec in specs.items():
+        raw = json.dumps(spec, indent=2)
+        compact = compact_spec(spec)
+        context, _ = SpecIndex(spec).build_context("show the orders of customer 42")
+        sizes = {
+            "raw_tokens": estimate_tokens(raw),
+            "minified_tokens": estimate_tokens(json.dumps(spec, separators=(",", ":"))),
+            "compact_tokens": estimate_tokens(compact),
+            "topk_tokens": estimate_tokens(context),
+        }
+        sizes["compact_reduction"] = round(1 - sizes["compact_tokens"] / sizes["raw_tokens"], 3)
+
+        async def compact_once(i: int, spec: Dict[str, Any] = spec) -> None:
+            compact_spec(spec)
+
+        results.append(await ctx.load("spec.compaction", name, compact_once, 1, requests=20, **sizes))
+    return results
+
+@scenario("spec.validation")
+async def spec_validation(ctx: BenchContext) -> List[BenchResult]:
+    """Local validation of agent decisions against the compiled operation model."""
+    from src.operation_model import get_operation_model
+
+    model = get_operation_model(json.dumps(build_spec(extra_resources=50)))
+    requests = [
+        ("GET", "/customers/42", None, None),
+        ("GET", "/resources49/7", None, None),
+        ("GET", "/customers", {"limit": "20"}, None),
+        ("POST", "/customers", None, {"name": "Ada", "email": "ada@example.com", "tier": "pro"}),
+        ("PATCH", "/customers/42", None, None),
+    ]
+
+    async def validate(i: int) -> None:
+        model.validate(*requests[i % len(requests)])
+
+    return [await ctx.load("spec.validation", "operation_model", validate, 1, requests=max(ctx.requests, 10_000),
+                           operations=model.operation_count)]
+
+# --- API Agent ---
+
+@scenario("agent.api", "http")
+async def agent_api(ctx: BenchContext) -> List[BenchResult]:
+    """A full API-agent turn: (mocked) model decision plus the API call, and decision-cache replays."""
+    from src.api_client import ApiClient
+    from src.llm_agent import get_cognitive_agent
+    from src.tools import APIRequest
+
+    client = ApiClient(ctx.api_url)
+    client.response_cache = None
+    spec = await client.get_api_spec()
+    agent = get_cognitive_agent(client.base_url, json.dumps(spec, separators=(",", ":")), client.spec_compact)
+
+    async def turn(prompt: str) -> None:
+        decision, _ = await agent.decide(prompt, [])
+        if isinstance(decision, APIRequest):
+            result = await client.make_request(decision.method, decision.endpoint, decision.json_payload, decision.params)
+            if ctx.llm == "function":
+                _check(result)
+
+    results = []
+    try:
+        with agent.agent.override(model=make_model(ctx.llm, api_model)):
+            for c in ctx.concurrency:
+                results.append(await ctx.load("agent.api", "llm_turn", lambda i, c=c: turn(
+                    f"Show customer {i % 500 + 1} (c{c} request {i})"), c))
+                results.append(await ctx.load("agent.api", "decision_cache", lambda i: turn(
+                    f"Show customer {i % 10 + 1}"), c, warmup=10))
+    finally:
+        await client.aclose()
+    return results
+
+async def shutdown() -> None:
+    await close_pool()
@@ -0,0 +1,104 @@
+# bench/servers.py
+
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Use an existing server instead of starting a throwaway one, e.g. postgresql://postgres@localhost/bench
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "")
+
+class ServiceUnavailable(RuntimeError):
+    """A scenario's backing service (e.g. Postgres) cannot be provided on this machine."""
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# --- ASGI Stand-in ---
+
+@contextmanager
+def serve_asgi(app, startup_timeout: float = 10.0) -> Iterator[str]:
+    """Serves `app` with uvicorn on a free local port in a background thread; yields its base URL."""
+    try:
+        import uvicorn
+    except ImportError as e:
+        raise ServiceUnavailable("uvicorn is required for the HTTP scenarios (pip install -r bench/requirements.txt)") from e
+
+    class _ThreadedServer(uvicorn.Server):
+        def install_signal_handlers(self) -> None:
+            pass  # only the main thread may install signal handlers
+
+    port = _free_port()
+    server = _ThreadedServer(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                            access_log=False, lifespan="on"))
+    thread = threading.Thread(target=server.run, name="standin-api", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + startup_timeout
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise ServiceUnavailable("The stand-in API did not start.")
+        time.sleep(0.02)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(startup_timeout)
+
+# --- Disposable Postgres ---
+
+def _pg_binary(name: str) -> Optional[str]:
+    found = shutil.which(name)
+    if found:
+        return found
+    # Debian/Ubuntu keep the server binaries out of PATH.
+    versions = sorted(os.listdir("/usr/lib/postgresql"), reverse=True) if os.path.isdir("/usr/lib/postgresql") else []
+    for version in versions:
+        candidate = os.path.join("/usr/lib/postgresql", version, "bin", name)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+@contextmanager
+def local_postgres(max_connections: int = 400) -> Iterator[str]:
+    """
+    Yields a DSN for a throwaway Postgres cluster (initdb + pg_ctl in a temp directory, trust auth,
+    Unix socket only), removed on exit. BENCH_DATABASE_URL is used instead when set.
+    """
+    if BENCH_DATABASE_URL:
+        yield BENCH_DATABASE_URL
+        return
+    initdb, pg_ctl = _pg_binary("initdb"), _pg_binary("pg_ctl")
+    if not (initdb and pg_ctl):
+        raise ServiceUnavailable("initdb/pg_ctl not found; install Postgres or set BENCH_DATABASE_URL")
+    root = tempfile.mkdtemp(prefix="bench-pg-")
+    data_dir, socket_dir = os.path.join(root, "data"), os.path.join(root, "sock")
+    os.makedirs(socket_dir)
+    port = _free_port()
+
+    def run(*args: str) -> None:
+        subprocess.run(args, check=True, capture_output=True, text=True)
+
+    try:
+        run(initdb, "-D", data_dir, "-U", "postgres", "-A", "trust", "--no-sync")
+        options = (f"-p {port} -k {socket_dir} -c listen_addresses='' -c max_connections={max_connections} "
+                   "-c fsync=off -c synchronous_commit=off -c full_page_writes=off")
+        run(pg_ctl, "-D", data_dir, "-o", options, "-l", os.path.join(root, "postgres.log"), "-w", "start")
+    except subprocess.CalledProcessError as e:
+        shutil.rmtree(root, ignore_errors=True)
+        raise ServiceUnavailable(f"Could not start a local Postgres: {e.stderr or e}") from e
+    logger.info(f"Started disposable Postgres in {root} (port {port})")
+    try:
+        yield f"postgresql://postgres@/postgres?host={socket_dir}&port={port}"
+    finally:
+        subprocess.run([pg_ctl, "-D", data_dir, "-m", "immediate", "-w", "stop"], capture_output=True)
+        shutil.rmtree(root, ignore_errors=True)
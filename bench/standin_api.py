@@ -0,0 +1,228 @@
+# bench/standin_api.py
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+# A dependency-free ASGI app standing in for the target API: a small customers/orders REST API
+# that serves its own OpenAPI document, with latency and error injection for resilience runs.
+
+@dataclass
+class Faults:
+    """What the stand-in does to each request. Rates are probabilities in [0, 1]."""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    retry_after: Optional[str] = None
+    slow_rate: float = 0.0  # requests that stall for `slow_ms`, e.g. to trip read timeouts
+    slow_ms: float = 0.0
+    cache_max_age: Optional[int] = None  # Cache-Control max-age on GET responses
+
+def build_spec(extra_resources: int = 0) -> Dict[str, Any]:
+    """The stand-in's OpenAPI 3 document. `extra_resources` adds CRUD paths to make the spec bigger."""
+    customer = {
+        "type": "object", "required": ["id", "name", "email"],
+        "properties": {
+            "id": {"type": "integer", "description": "Unique customer id."},
+            "name": {"type": "string", "description": "Full name of the customer."},
+            "email": {"type": "string", "format": "email", "description": "Contact e-mail address."},
+            "tier": {"type": "string", "enum": ["free", "pro", "enterprise"], "description": "Billing tier."},
+        },
+    }
+    order = {
+        "type": "object", "required": ["id", "customerId", "total"],
+        "properties": {
+            "id": {"type": "integer"}, "customerId": {"type": "integer"},
+            "total": {"type": "number", "description": "Order total in EUR."},
+            "items": {"type": "array", "items": {"type": "object", "properties": {
+                "sku": {"type": "string"}, "quantity": {"type": "integer"}}}},
+        },
+    }
+
+    def ref(name: str) -> Dict[str, str]:
+        return {"$ref": f"#/components/schemas/{name}"}
+
+    def json_content(schema: Dict[str, Any]) -> Dict[str, Any]:
+        return {"content": {"application/json": {"schema": schema}}}
+
+    id_param = {"name": "id", "in": "path", "required": True, "schema": {"type": "integer"}}
+    paging = [
+        {"name": "limit", "in": "query", "schema": {"type": "integer", "default": 50}},
+        {"name": "offset", "in": "query", "schema": {"type": "integer", "default": 0}},
+    ]
+    paths: Dict[str, Any] = {
+        "/customers": {
+            "get": {"summary": "List customers", "parameters": paging,
+                    "responses": {"200": {"description": "Customers", **json_content({"type": "array", "items": ref("Customer")})}}},
+            "post": {"summary": "Create a customer", "requestBody": {"required": True, **json_content(ref("NewCustomer"))},
+                     "responses": {"201": {"description": "Created", **json_content(ref("Customer"))}}},
+        },
+        "/customers/{id}": {
+            "get": {"summary": "Get a customer by id", "parameters": [id_param],
+                    "responses": {"200": {"description": "Customer", **json_content(ref("Customer"))}}},
+            "put": {"summary": "Replace a customer", "parameters": [id_param],
+                    "requestBody": {"required": True, **json_content(ref("NewCustomer"))},
+                    "responses": {"200": {"description": "Customer", **json_content(ref("Customer"))}}},
+            "delete": {"summary": "Delete a customer", "parameters": [id_param],
+                       "responses": {"204": {"description": "Deleted"}}},
+        },
+        "/customers/{id}/orders": {
+            "get": {"summary": "List a customer's orders", "parameters": [id_param],
+                    "responses": {"200": {"description": "Orders", **json_content({"type": "array", "items": ref("Order")})}}},
+        },
+        "/export": {
+            "get": {"summary": "Export many records at once",
+                    "parameters": [{"name": "items", "in": "query", "schema": {"type": "integer"}}],
+                    "responses": {"200": {"description": "Records", **json_content({"type": "array", "items": ref("Order")})}}},
+        },
+    }
+    schemas = {"Customer": customer, "Order": order,
+               "NewCustomer": {"type": "object", "required": ["name", "email"],
+                               "properties": {k: customer["properties"][k] for k in ("name", "email", "tier")}}}
+    for n in range(extra_resources):
+        name = f"Resource{n}"
+        schemas[name] = {"type": "object", "properties": {
+            "id": {"type": "integer"}, "label": {"type": "string", "description": f"Label of resource {n}."},
+            "owner": ref("Customer"), "createdAt": {"type": "string", "format": "date-time"}}}
+        paths[f"/resources{n}"] = {
+            "get": {"summary": f"List resource {n} records", "parameters": paging,
+                    "responses": {"200": {"description": "OK", **json_content({"type": "array", "items": ref(name)})}}},
+            "post": {"summary": f"Create a resource {n} record", "requestBody": json_content(ref(name)),
+                     "responses": {"201": {"description": "Created", **json_content(ref(name))}}},
+        }
+        paths[f"/resources{n}/{{id}}"] = {
+            "get": {"summary": f"Get a resource {n} record", "parameters": [id_param],
+                    "responses": {"200": {"description": "OK", **json_content(ref(name))}}},
+            "delete": {"summary": f"Delete a resource {n} record", "parameters": [id_param],
+                       "responses": {"204": {"description": "Deleted"}}},
+        }
+    return {"openapi": "3.0.3", "info": {"title": "Stand-in API", "version": "1.0"},
+            "paths": paths, "components": {"schemas": schemas}}
+
+class StandinAPI:
+    """The ASGI application. `faults` and the data can be changed between benchmark cases."""
+
+    def __init__(self, customers: int = 1000, extra_resources: int = 0, seed: int = 7):
+        self.faults = Faults()
+        self.random = random.Random(seed)
+        self.spec = build_spec(extra_resources)
+        self.spec_body = json.dumps(self.spec).encode()
+        self.spec_etag = '"' + hashlib.sha256(self.spec_body).hexdigest()[:16] + '"'
+        self.customers: Dict[int, Dict[str, Any]] = {
+            i: {"id": i, "name": f"Customer {i}", "email": f"customer{i}@example.com", "tier": "pro"}
+            for i in range(1, customers + 1)
+        }
+        self.next_id = customers + 1
+        self.status_counts: Dict[int, int] = {}
+
+    def reset_counts(self) -> None:
+        self.status_counts = {}
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        headers = {k.decode().lower(): v.decode() for k, v in scope.get("headers", [])}
+        query = {k: v[-1] for k, v in parse_qs(scope.get("query_string", b"").decode()).items()}
+
+        injected = await self._inject_faults()
+        if injected is not None:
+            status, extra_headers = injected
+            await self._send(send, status, {"error": "injected fault"}, extra_headers)
+            return
+        if scope["path"] == "/export" and scope["method"] == "GET":
+            await self._stream_export(send, int(query.get("items", "10000")))
+            return
+        status, payload, extra_headers = self._route(scope["method"], scope["path"], query, headers, body)
+        await self._send(send, status, payload, extra_headers)
+
+    async def _inject_faults(self) -> Optional[Tuple[int, Dict[str, str]]]:
+        f = self.faults
+        delay = f.latency_ms + (self.random.uniform(0, f.jitter_ms) if f.jitter_ms else 0.0)
+        if f.slow_rate and self.random.random() < f.slow_rate:
+            delay += f.slow_ms
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if f.error_rate and self.random.random() < f.error_rate:
+            return f.error_status, {"retry-after": f.retry_after} if f.retry_after else {}
+        return None
+
+    def _route(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str],
+               body: bytes) -> Tuple[int, Any, Dict[str, str]]:
+        if path in ("/openapi.json", "/v3/api-docs") and method == "GET":
+            if headers.get("if-none-match") == self.spec_etag:
+                return 304, None, {"etag": self.spec_etag}
+            return 200, self.spec, {"etag": self.spec_etag}
+        cache_headers = {"cache-control": f"max-age={self.faults.cache_max_age}"} if self.faults.cache_max_age else {}
+        if path == "/customers":
+            if method == "GET":
+                limit, offset = int(query.get("limit", "50")), int(query.get("offset", "0"))
+                page = list(self.customers.values())[offset:offset + limit]
+                return 200, page, cache_headers
+            if method == "POST":
+                data = json.loads(body or b"{}")
+                customer = {"id": self.next_id, "tier": "free", **data}
+                self.customers[self.next_id] = customer
+                self.next_id += 1
+                return 201, customer, {}
+        match = re.fullmatch(r"/customers/(\d+)(/orders)?", path)
+        if match:
+            customer_id = int(match.group(1))
+            customer = self.customers.get(customer_id)
+            if customer is None and method != "PUT":
+                return 404, {"error": f"Customer {customer_id} not found"}, {}
+            if match.group(2) and method == "GET":
+                orders = [{"id": customer_id * 10 + n, "customerId": customer_id, "total": 19.5 * (n + 1),
+                           "items": [{"sku": f"SKU-{n}", "quantity": n + 1}]} for n in range(3)]
+                return 200, orders, cache_headers
+            if method == "GET":
+                etag = '"' + hashlib.sha256(json.dumps(customer, sort_keys=True).encode()).hexdigest()[:16] + '"'
+                if headers.get("if-none-match") == etag:
+                    return 304, None, {"etag": etag, **cache_headers}
+                return 200, customer, {"etag": etag, **cache_headers}
+            if method == "PUT":
+                self.customers[customer_id] = {"id": customer_id, **json.loads(body or b"{}")}
+                return 200, self.customers[customer_id], {}
+            if method == "DELETE":
+                del self.customers[customer_id]
+                return 204, None, {}
+        return 404, {"error": f"No route for {method} {path}"}, {}
+
+    async def _send(self, send, status: int, payload: Any, extra_headers: Dict[str, str]) -> None:
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        body = b"" if payload is None or status in (204, 304) else json.dumps(payload).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        headers += [(k.encode(), v.encode()) for k, v in extra_headers.items()]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _stream_export(self, send, items: int, batch: int = 1000) -> None:
+        """A large JSON array sent in chunks, for the response spilling path."""
+        self.status_counts[200] = self.status_counts.get(200, 0) + 1
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        for start in range(0, items, batch):
+            records: List[str] = [
+                json.dumps({"id": i, "customerId": i % 1000, "total": i * 0.5, "items": [{"sku": f"SKU-{i}", "quantity": 1}]})
+                for i in range(start, min(start + batch, items))
+            ]
+            chunk = ("[" if start == 0 else ",") + ",".join(records)
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+        await send({"type": "http.response.body", "body": b"]" if items else b"[]", "more_body": False})
@@ -1,35 +1,49 @@
 import psycopg2
+import asyncio
 import asyncpg
-from typing import Optional, List, Dict
+import base64
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Optional, List, Dict, Tuple, Literal, AsyncIterator, Iterable
 
-DB_DSN = (
+from src.metrics import record_span, span
+
+logger = logging.getLogger(__name__)
+
+DB_DSN = os.getenv("DATABASE_URL") or (
     "postgresql://"
     "Username:password@"
     "server/"
     "postgres?sslmode=require"
 )
 
-class DatabaseConn:
-    def __init__(self):
-        self.dsn = DB_DSN
+# --- Pool Configuration ---
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "10"))
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
 
-    async def _connect(self):
-        return await asyncpg.connect(self.dsn)
+# --- Bulk Configuration ---
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "1000"))
 
-    async def execute_dynamic_ddl(self, query: str) -> Dict[str, str]:
-        """Executes a DDL query (e.g., CREATE TABLE, ALTER TABLE)."""
-        conn = await self._connect()
-        try:
-            await conn.execute(query)
-            return {"status": "SUCCESS", "message": "Command executed successfully."}
-        except Exception as e:
-            return {"status": "FAILED", "message": f"Database error: {e}"}
-        finally:
-            await conn.close()
+# --- Search Configuration ---
+SearchMode = Literal["fulltext", "substring", "fuzzy"]
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "200"))
+SNIPPET_CHARS = 160
 
-    async def _ensure_notes_table_exists(self):
-        """Creates the 'notes' table if it doesn't exist. Called by DML functions."""
-        query = """
+# --- Pagination Configuration ---
+LIST_MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "500"))
+STREAM_PREFETCH = 500
+
+# --- Schema Migrations ---
+# Applied in order, once per process, when the pool is first created. Never edit a
+# released migration; append a new version instead.
+NOTES_MIGRATIONS: List[Tuple[int, str]] = [
+    (1, """
         CREATE TABLE IF NOT EXISTS notes (
             id SERIAL PRIMARY KEY,
             title VARCHAR(200) UNIQUE NOT NULL,
@@ -37,68 +51,448 @@ class DatabaseConn:
             created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
             updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
         );
+    """),
+    (2, """
+        ALTER TABLE notes ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (to_tsvector('english', title || ' ' || text)) STORED;
+        CREATE INDEX IF NOT EXISTS notes_search_vector_idx ON notes USING GIN (search_vector);
+    """),
+    # Trigram index for substring and fuzzy search. Where pg_trgm cannot be installed the DO block
+    # only raises a warning: substring search then runs unindexed and fuzzy search is unavailable.
+    (3, """
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            CREATE INDEX IF NOT EXISTS notes_text_trgm_idx ON notes USING GIN (text gin_trgm_ops);
+        EXCEPTION WHEN OTHERS THEN
+            RAISE WARNING 'pg_trgm is unavailable, notes get no trigram index: %', SQLERRM;
+        END $$;
+    """),
+    (4, """
+        CREATE TABLE IF NOT EXISTS agent_sessions (
+            id TEXT PRIMARY KEY,
+            state JSONB NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        CREATE INDEX IF NOT EXISTS agent_sessions_updated_at_idx ON agent_sessions (updated_at);
+    """),
+    (5, """
+        CREATE TABLE IF NOT EXISTS agent_results (
+            session_id TEXT NOT NULL REFERENCES agent_sessions (id) ON DELETE CASCADE,
+            message_index INTEGER NOT NULL,
+            chunk INTEGER NOT NULL,
+            body JSONB NOT NULL,
+            PRIMARY KEY (session_id, message_index, chunk)
+        );
+    """),
+]
+
+# Arbitrary constant key so concurrent processes serialize their migration runs.
+_MIGRATION_LOCK_KEY = 727_001
+
+_schema_ready: set = set()
+# DSN -> whether pg_trgm is installed there (checked once, together with the migrations).
+_trigram_ready: Dict[str, bool] = {}
+
+
+async def _apply_migrations(conn: asyncpg.Connection) -> None:
+    """Brings the notes schema up to the latest version inside one transaction."""
+    async with conn.transaction():
+        await conn.execute("SELECT pg_advisory_xact_lock($1);", _MIGRATION_LOCK_KEY)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+        """)
+        current = await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_migrations;")
+        for version, ddl in NOTES_MIGRATIONS:
+            if version <= current:
+                continue
+            logger.info(f"Applying notes schema migration v{version}")
+            await conn.execute(ddl)
+            await conn.execute("INSERT INTO schema_migrations (version) VALUES ($1);", version)
+
+
+# --- Cursor Tokens ---
+# Opaque to callers: url-safe base64 of a small JSON state, e.g. {"after": "<last title>"}.
+# Cursors come back from the model, so every field is type-checked before it reaches a query.
+
+def encode_cursor(state: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(token: Optional[str]) -> dict:
+    if not token:
+        return {}
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception:
+        raise ValueError("Invalid pagination cursor.")
+    if not isinstance(state, dict):
+        raise ValueError("Invalid pagination cursor.")
+    if "after" in state and not isinstance(state["after"], str):
+        raise ValueError("Invalid pagination cursor.")
+    offset = state.get("offset", 0)
+    if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+        raise ValueError("Invalid pagination cursor.")
+    return state
+
+
+def list_page_size(page_size: int) -> int:
+    """The page size list_titles_page actually uses for a requested `page_size`."""
+    return max(1, min(page_size, LIST_MAX_PAGE_SIZE))
+
+
+def search_limit(limit: int) -> int:
+    """The page size search_notes actually uses for a requested `limit`."""
+    return max(1, min(limit, SEARCH_MAX_LIMIT))
+
+
+# --- Process-wide Pools ---
+# One pool per DSN. asyncpg pools are bound to the event loop they were created on, so a
+# pool is recreated if a caller shows up on a different loop (e.g. one asyncio.run per call).
+_pools: Dict[str, Tuple[asyncpg.Pool, asyncio.AbstractEventLoop]] = {}
+_pool_locks: Dict[str, Tuple[asyncio.Lock, asyncio.AbstractEventLoop]] = {}
+
+
+def _live_pool(dsn: str, loop: asyncio.AbstractEventLoop) -> Optional[asyncpg.Pool]:
+    pool, pool_loop = _pools.get(dsn, (None, None))
+    if pool is not None and pool_loop is loop and not pool.is_closing():
+        return pool
+    return None
+
+
+async def get_pool(dsn: str = DB_DSN) -> asyncpg.Pool:
+    """Returns the shared connection pool for `dsn`, creating (and migrating) it on first use."""
+    loop = asyncio.get_running_loop()
+    pool = _live_pool(dsn, loop)
+    if pool is not None:
+        return pool
+
+    lock, lock_loop = _pool_locks.get(dsn, (None, None))
+    if lock is None or lock_loop is not loop:
+        lock = asyncio.Lock()
+        _pool_locks[dsn] = (lock, loop)
+    async with lock:
+        pool = _live_pool(dsn, loop)
+        if pool is not None:
+            return pool
+        stale, stale_loop = _pools.pop(dsn, (None, None))
+        if stale is not None and stale_loop is not loop:
+            # The old loop is gone; its connections cannot be closed gracefully from here.
+            stale.terminate()
+        logger.info(f"Creating database pool (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE})")
+        pool = await asyncpg.create_pool(
+            dsn,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE_LIFETIME,
+            command_timeout=DB_COMMAND_TIMEOUT,
+        )
+        if dsn not in _schema_ready:
+            try:
+                async with pool.acquire(timeout=DB_POOL_ACQUIRE_TIMEOUT) as conn:
+                    await _apply_migrations(conn)
+                    _trigram_ready[dsn] = await conn.fetchval(
+                        "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm');"
+                    )
+            except Exception:
+                pool.terminate()
+                raise
+            if not _trigram_ready[dsn]:
+                logger.warning("The pg_trgm extension is not installed: substring search is unindexed "
+                               "and fuzzy search is disabled.")
+            _schema_ready.add(dsn)
+        _pools[dsn] = (pool, loop)
+        return pool
+
+
+async def close_pool() -> None:
+    """Shutdown hook: gracefully closes every shared pool that is open."""
+    pools = [pool for pool, _ in _pools.values()]
+    _pools.clear()
+    for pool in pools:
+        try:
+            await asyncio.wait_for(pool.close(), timeout=DB_POOL_ACQUIRE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Database pool did not close cleanly, terminating: {e}")
+            pool.terminate()
+
+
+class DatabaseConn:
+    def __init__(self, dsn: str = DB_DSN):
+        self.dsn = dsn
+
+    @asynccontextmanager
+    async def _connect(self, operation: str = "query"):
+        """
+        Acquires a pooled connection, released back to the pool on exit. The wait for a connection
+        and the work done with it are recorded as 'db.acquire' and 'db.query' spans.
         """
-        await self.execute_dynamic_ddl(query)
+        pool = await get_pool(self.dsn)
+        requested = time.time()
+        async with pool.acquire(timeout=DB_POOL_ACQUIRE_TIMEOUT) as conn:
+            record_span("db.acquire", requested, time.time(), operation=operation)
+            with span("db.query", operation=operation):
+                yield conn
+
+    async def health_check(self) -> bool:
+        """Returns True if a pooled connection can be acquired and answers a trivial query."""
+        try:
+            async with self._connect("health_check") as conn:
+                return await conn.fetchval("SELECT 1;") == 1
+        except Exception as e:
+            logger.warning(f"Database health check failed: {e}")
+            return False
+
+    async def trigram_available(self) -> bool:
+        """Whether the database has pg_trgm, which fuzzy search and the substring index need."""
+        await get_pool(self.dsn)
+        return _trigram_ready.get(self.dsn, False)
+
+    async def execute_dynamic_ddl(self, query: str) -> Dict[str, str]:
+        """Executes a DDL query (e.g., CREATE TABLE, ALTER TABLE)."""
+        try:
+            async with self._connect("execute_dynamic_ddl") as conn:
+                await conn.execute(query)
+            return {"status": "SUCCESS", "message": "Command executed successfully."}
+        except Exception as e:
+            return {"status": "FAILED", "message": f"Database error: {e}"}
 
     async def add_note(self, title: str, text: str) -> bool:
-        await self._ensure_notes_table_exists()
         query = "INSERT INTO notes (title, text) VALUES ($1, $2) ON CONFLICT (title) DO NOTHING;"
-        conn = await self._connect()
-        try:
+        async with self._connect("add_note") as conn:
             result = await conn.execute(query, title, text)
             return "INSERT 0 1" in result
-        finally:
-            await conn.close()
 
     async def get_note_by_title(self, title: str) -> Optional[dict]:
-        try:
-            conn = await self._connect()
+        async with self._connect("get_note_by_title") as conn:
             query = "SELECT title, text, created_at, updated_at FROM notes WHERE title = $1;"
             result = await conn.fetchrow(query, title)
-            await conn.close()
-            return dict(result) if result else None
-        except asyncpg.exceptions.UndefinedTableError:
-            return None
+        return dict(result) if result else None
 
-    async def list_all_titles(self) -> List[str]:
-        try:
-            conn = await self._connect()
-            query = "SELECT title FROM notes ORDER BY title;"
-            results = await conn.fetch(query)
-            await conn.close()
-            return [row["title"] for row in results]
-        except asyncpg.exceptions.UndefinedTableError:
+    # --- Bulk Operations ---
+    # Each runs as a single statement over unnest()-ed arrays: one round trip, one transaction.
+    # Results are per input item, in input order.
+
+    def _check_batch_size(self, items: list) -> None:
+        if len(items) > BULK_MAX_ITEMS:
+            raise ValueError(f"Batch of {len(items)} items exceeds the limit of {BULK_MAX_ITEMS}.")
+
+    async def add_notes(self, notes: List[Tuple[str, str]]) -> List[bool]:
+        """Creates many notes at once. An item fails if its title already exists or repeats earlier in the batch."""
+        if not notes:
+            return []
+        self._check_batch_size(notes)
+        query = """
+            INSERT INTO notes (title, text)
+            SELECT title, text FROM unnest($1::text[], $2::text[]) AS n(title, text)
+            ON CONFLICT (title) DO NOTHING
+            RETURNING title;
+        """
+        async with self._connect("add_notes") as conn:
+            rows = await conn.fetch(query, [t for t, _ in notes], [x for _, x in notes])
+        inserted = {row["title"] for row in rows}
+        results = []
+        for title, _ in notes:
+            results.append(title in inserted)
+            inserted.discard(title)
+        return results
+
+    async def update_notes(self, updates: List[Tuple[str, str]]) -> List[bool]:
+        """Updates many notes at once. If a title repeats, its last entry wins and earlier ones report failure."""
+        if not updates:
+            return []
+        self._check_batch_size(updates)
+        latest = {title: i for i, (title, _) in enumerate(updates)}
+        titles = list(latest)
+        texts = [updates[i][1] for i in latest.values()]
+        query = """
+            UPDATE notes SET text = u.text, updated_at = NOW()
+            FROM unnest($1::text[], $2::text[]) AS u(title, text)
+            WHERE notes.title = u.title
+            RETURNING notes.title;
+        """
+        async with self._connect("update_notes") as conn:
+            rows = await conn.fetch(query, titles, texts)
+        updated = {row["title"] for row in rows}
+        return [title in updated and latest[title] == i for i, (title, _) in enumerate(updates)]
+
+    async def delete_notes(self, titles: List[str]) -> List[bool]:
+        """Deletes many notes at once. A repeated title only succeeds on its first occurrence."""
+        if not titles:
             return []
+        self._check_batch_size(titles)
+        query = "DELETE FROM notes WHERE title = ANY($1::text[]) RETURNING title;"
+        async with self._connect("delete_notes") as conn:
+            rows = await conn.fetch(query, titles)
+        deleted = {row["title"] for row in rows}
+        results = []
+        for title in titles:
+            results.append(title in deleted)
+            deleted.discard(title)
+        return results
+
+    async def list_titles_page(self, page_size: int = 50,
+                               cursor: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """Returns one page of titles in title order plus the cursor for the next page (None at the end)."""
+        page_size = list_page_size(page_size)
+        after = decode_cursor(cursor).get("after")
+        # Keyset pagination on the unique title index; one extra row tells us whether a next page exists.
+        query = "SELECT title FROM notes WHERE ($1::text IS NULL OR title > $1) ORDER BY title LIMIT $2;"
+        async with self._connect("list_titles_page") as conn:
+            results = await conn.fetch(query, after, page_size + 1)
+        titles = [row["title"] for row in results[:page_size]]
+        next_cursor = encode_cursor({"after": titles[-1]}) if len(results) > page_size else None
+        return titles, next_cursor
+
+    async def iter_titles(self, prefetch: int = STREAM_PREFETCH) -> AsyncIterator[str]:
+        """Streams every title through a server-side cursor without loading the table into memory."""
+        async with self._connect("iter_titles") as conn:
+            async with conn.transaction():
+                async for row in conn.cursor("SELECT title FROM notes ORDER BY title;", prefetch=prefetch):
+                    yield row["title"]
+
+    async def list_all_titles(self) -> List[str]:
+        return [title async for title in self.iter_titles()]
 
     async def update_note(self, title: str, new_text: str) -> bool:
-        conn = await self._connect()
-        try:
+        async with self._connect("update_note") as conn:
             # This also updates the 'updated_at' timestamp via a trigger if it exists
             query = "UPDATE notes SET text = $1, updated_at = NOW() WHERE title = $2;"
             result = await conn.execute(query, new_text, title)
             return "UPDATE 1" in result
-        except asyncpg.exceptions.UndefinedTableError:
-            return False
-        finally:
-            await conn.close()
 
     async def delete_note(self, title: str) -> bool:
-        conn = await self._connect()
-        try:
+        async with self._connect("delete_note") as conn:
             query = "DELETE FROM notes WHERE title = $1;"
             result = await conn.execute(query, title)
             return "DELETE 1" in result
-        except asyncpg.exceptions.UndefinedTableError:
-            return False
-        finally:
-            await conn.close()
 
-    async def search_notes(self, search_term: str) -> List[str]:
-        try:
-            conn = await self._connect()
-            query = "SELECT title FROM notes WHERE text ILIKE $1 ORDER BY title;"
-            results = await conn.fetch(query, f"%{search_term}%")
-            await conn.close()
-            return [row["title"] for row in results]
-        except asyncpg.exceptions.UndefinedTableError:
-            return []
+    async def search_notes(self, search_term: str, mode: SearchMode = "substring", limit: int = 50,
+                           cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        Searches note contents and returns one page of ranked matches (dicts with 'title', 'rank'
+        and 'snippet') plus the cursor for the next page (None at the end).
+
+        - fulltext: word query against the GIN-indexed tsvector column, ranked with ts_rank_cd.
+        - substring: case-insensitive substring match, served by the pg_trgm GIN index.
+        - fuzzy: trigram word similarity, tolerant of typos. Raises ValueError without pg_trgm.
+        """
+        limit = search_limit(limit)
+        state = decode_cursor(cursor)
+        offset = state.get("offset", 0)
+        if mode == "fulltext":
+            # Rank and page first so ts_headline only runs on the rows that are returned.
+            query = """
+                SELECT title, rank, ts_headline('english', text, q,
+                       'MaxFragments=1, MaxWords=25, MinWords=8') AS snippet
+                FROM (
+                    SELECT title, text, q, ts_rank_cd(search_vector, q) AS rank
+                    FROM notes, websearch_to_tsquery('english', $1) AS q
+                    WHERE search_vector @@ q
+                    ORDER BY rank DESC, title
+                    LIMIT $2 OFFSET $3
+                ) AS ranked
+                ORDER BY rank DESC, title;
+            """
+            args = (search_term, limit + 1, offset)
+        elif mode == "substring":
+            # Ordered by title, so this mode pages with a keyset instead of an offset.
+            escaped = search_term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query = f"""
+                SELECT title, NULL::real AS rank,
+                       substr(text, greatest(strpos(lower(text), lower($2)) - 40, 1), {SNIPPET_CHARS}) AS snippet
+                FROM notes
+                WHERE text ILIKE $1 AND ($4::text IS NULL OR title > $4)
+                ORDER BY title
+                LIMIT $3;
+            """
+            args = (f"%{escaped}%", search_term, limit + 1, state.get("after"))
+        elif mode == "fuzzy":
+            if not await self.trigram_available():
+                raise ValueError("Fuzzy search needs the pg_trgm extension, which this database does not have; "
+                                 "use 'fulltext' or 'substring' mode instead.")
+            query = f"""
+                SELECT title, word_similarity($1, text) AS rank, left(text, {SNIPPET_CHARS}) AS snippet
+                FROM notes
+                WHERE $1 <% text
+                ORDER BY rank DESC, title
+                LIMIT $2 OFFSET $3;
+            """
+            args = (search_term, limit + 1, offset)
+        else:
+            raise ValueError(f"Unknown search mode: {mode}")
+
+        async with self._connect("search_notes") as conn:
+            rows = await conn.fetch(query, *args)
+        results = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            if mode == "substring":
+                next_cursor = encode_cursor({"after": results[-1]["title"]})
+            else:
+                next_cursor = encode_cursor({"offset": offset + limit})
+        return results, next_cursor
+
+    # --- Agent Sessions ---
+    # Server-side conversation state for the agent service, shared by all of its workers.
+    # `version` is bumped on every save so concurrent writers of one session are detected.
+    # Large results are stored once, in agent_results, and removed with their session.
+
+    async def load_session(self, session_id: str, max_idle: float) -> Optional[Tuple[dict, int]]:
+        """Returns (state, version), or None if the session does not exist or was idle for `max_idle` seconds."""
+        async with self._connect("load_session") as conn:
+            row = await conn.fetchrow(
+                "SELECT state, version FROM agent_sessions "
+                "WHERE id = $1 AND updated_at > NOW() - make_interval(secs => $2);",
+                session_id, max_idle,
+            )
+        return (json.loads(row["state"]), row["version"]) if row else None
+
+    async def save_session(self, session_id: str, state: dict, version: int,
+                           results: Optional[List[Tuple[int, Iterable[Any]]]] = None) -> bool:
+        """
+        Stores `state` as version `version` + 1, together with `results`: (message index, chunks)
+        for result data kept out of the state. Returns False, storing nothing, if the stored version
+        is no longer `version`, i.e. another request saved the session in the meantime.
+        """
+        async with self._connect("save_session") as conn:
+            async with conn.transaction():
+                result = await conn.execute("""
+                    INSERT INTO agent_sessions (id, state, version) VALUES ($1, $2::jsonb, $3 + 1)
+                    ON CONFLICT (id) DO UPDATE SET state = EXCLUDED.state, version = EXCLUDED.version, updated_at = NOW()
+                    WHERE agent_sessions.version = $3;
+                """, session_id, json.dumps(state, default=str), version)
+                if not result.endswith(" 1"):
+                    return False
+                for index, chunks in results or []:
+                    await conn.executemany("""
+                        INSERT INTO agent_results (session_id, message_index, chunk, body) VALUES ($1, $2, $3, $4::jsonb)
+                        ON CONFLICT DO NOTHING;
+                    """, ((session_id, index, n, json.dumps(chunk, default=str)) for n, chunk in enumerate(chunks)))
+                return True
+
+    async def load_result_chunks(self, session_id: str, index: int, first: int, last: int) -> List[Any]:
+        """Chunks `first`..`last` of the result stored for message `index`, in order."""
+        async with self._connect("load_result_chunks") as conn:
+            rows = await conn.fetch(
+                "SELECT body FROM agent_results WHERE session_id = $1 AND message_index = $2 "
+                "AND chunk BETWEEN $3 AND $4 ORDER BY chunk;",
+                session_id, index, first, last,
+            )
+        return [json.loads(row["body"]) for row in rows]
+
+    async def delete_session(self, session_id: str) -> bool:
+        async with self._connect("delete_session") as conn:
+            result = await conn.execute("DELETE FROM agent_sessions WHERE id = $1;", session_id)
+            return "DELETE 1" in result
+
+    async def delete_idle_sessions(self, max_idle: float) -> int:
+        async with self._connect("delete_idle_sessions") as conn:
+            result = await conn.execute(
+                "DELETE FROM agent_sessions WHERE updated_at <= NOW() - make_interval(secs => $1);", max_idle
+            )
+        return int(result.split()[-1])
@@ -0,0 +1,70 @@
+import re
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Pattern, Tuple
+
+# A small grammar for note commands that map one-to-one onto agent tools. Patterns are
+# anchored and strict on purpose: anything they do not fully match goes to the LLM agent.
+# A title must be quoted ('...', "..." or `...`) or a single word such as bench-7 or v1.2;
+# anything else ("note from Monday", "note Plan please") could name a different note.
+
+@dataclass
+class Intent:
+    tool_name: str
+    args: Dict[str, Any] = field(default_factory=dict)
+
+_POLITE = r"(?:please\s+|can you\s+|could you\s+)?"
+_NOTE = r"(?:the\s+|my\s+)?note\s+(?:titled\s+|called\s+|named\s+)?"
+_TITLE = r"""(?:'(?P<sq>[^']*)'|"(?P<dq>[^"]*)"|`(?P<bq>[^`]*)`|(?P<word>[\w-]+(?:\.[\w-]+)*))"""
+# Sentence punctuation after the command; never part of a title.
+_END = r"[.!?]*$"
+
+_PATTERNS: List[Tuple[str, Pattern]] = [
+    ("list_notes_tool", re.compile(
+        rf"^{_POLITE}(?:list|show|display|get)(?:\s+me)?\s+(?:all\s+)?(?:of\s+)?(?:the\s+|my\s+)?notes{_END}"
+        rf"|^what notes do i have{_END}", re.I)),
+    ("search_notes_tool", re.compile(
+        rf"^{_POLITE}(?:search|find)\s+(?:my\s+|the\s+)?notes\s+(?:for|about|containing|mentioning|with)\s+(?P<term>.+?){_END}",
+        re.I)),
+    ("retrieve_note_tool", re.compile(
+        rf"^{_POLITE}(?:show|get|open|read|display|retrieve)(?:\s+me)?\s+{_NOTE}{_TITLE}{_END}", re.I)),
+    ("delete_note_tool", re.compile(
+        rf"^{_POLITE}(?:delete|remove)\s+{_NOTE}{_TITLE}{_END}", re.I)),
+]
+
+_QUOTED = re.compile(r"^(['\"`])(?P<inner>.*)\1$")
+# Unquoted search terms containing these probably carry extra instructions.
+_AMBIGUOUS = re.compile(r",|;|\s(?:and|or|then|with|but)\s", re.I)
+
+def _clean_term(raw: str) -> Optional[str]:
+    """Strips quotes; returns None when a term is empty or, unquoted, too ambiguous to act on."""
+    value = raw.strip()
+    quoted = _QUOTED.match(value)
+    if quoted:
+        return quoted.group("inner").strip() or None
+    if _AMBIGUOUS.search(value):
+        return None
+    return value or None
+
+def _title(groups: Dict[str, Optional[str]]) -> Optional[str]:
+    """The matched title, or None if it is empty."""
+    for name in ("sq", "dq", "bq", "word"):
+        if groups[name] is not None:
+            return groups[name].strip() or None
+    return None
+
+def parse_intent(query: str) -> Optional[Intent]:
+    """Returns the tool call for a high-confidence note command, or None to defer to the agent."""
+    text = re.sub(r"\s+", " ", query).strip()
+    for tool_name, pattern in _PATTERNS:
+        match = pattern.match(text)
+        if not match:
+            continue
+        groups = match.groupdict()
+        if "term" in groups:
+            term = _clean_term(groups["term"])
+            return Intent(tool_name, {"search_term": term}) if term else None
+        if "word" in groups:
+            title = _title(groups)
+            return Intent(tool_name, {"title": title}) if title else None
+        return Intent(tool_name)
+    return None
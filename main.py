@@ -1,15 +1,21 @@
 from dataclasses import dataclass
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from pydantic_ai import Agent, RunContext, Tool
-from typing import Optional, List, Literal, Dict
+from typing import Optional, List, Literal, Dict, Tuple, Any, get_type_hints
+import hashlib
+import inspect
 import json # Import the json library
 import os
 
-from database import DatabaseConn
+from database import DatabaseConn, SearchMode, close_pool, list_page_size, search_limit
+from src.decision_cache import get_decision_cache
+from src.metrics import record_usage, span, traced
+from intent_router import parse_intent
 from dotenv import load_dotenv
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() in ("1", "true", "yes")
 
 from pydantic_ai.models.openai import OpenAIModel
 
@@ -21,6 +27,14 @@ class AgentResponse(BaseModel):
     sql_query: Optional[str] = None
     note: Optional[dict] = None
     titles: Optional[List[str]] = None
+    results: Optional[List[dict]] = None
+    page_size: Optional[int] = None
+    next_cursor: Optional[str] = None
+    items: Optional[List[dict]] = None
+
+class NoteInput(BaseModel):
+    title: str = Field(..., description="The title of the note.")
+    text: str = Field(..., description="The text of the note.")
 
 class Column(BaseModel):
     name: str = Field(..., description="The name of the column.")
@@ -38,9 +52,10 @@ class Dependencies:
     db: DatabaseConn
 
 # --- TOOLS ---
-# All functions decorated with @Tool are available for the agent to use.
+# All functions decorated with @Tool are available for the agent to use; each call is timed as a 'tool.<name>' span.
 
 @Tool
+@traced("tool")
 def generate_ddl_sql(intent: DDLIntent) -> AgentResponse:
     """Generates a DDL SQL query for creating or altering tables."""
     try:
@@ -66,6 +81,7 @@ def generate_ddl_sql(intent: DDLIntent) -> AgentResponse:
         return AgentResponse(response_type="error", message=str(e))
 
 @Tool
+@traced("tool")
 async def create_note_tool(ctx: RunContext[Dependencies], title: str, text: str) -> AgentResponse:
     """Creates a new note with a given title and text."""
     success = await ctx.deps.db.add_note(title, text)
@@ -73,6 +89,7 @@ async def create_note_tool(ctx: RunContext[Dependencies], title: str, text: str)
     return AgentResponse(response_type="dml_success", message=msg)
 
 @Tool
+@traced("tool")
 async def retrieve_note_tool(ctx: RunContext[Dependencies], title: str) -> AgentResponse:
     """Retrieves a single note by its title."""
     note = await ctx.deps.db.get_note_by_title(title)
@@ -80,12 +97,23 @@ async def retrieve_note_tool(ctx: RunContext[Dependencies], title: str) -> Agent
     return AgentResponse(response_type="dml_success", message=msg, note=note)
 
 @Tool
-async def list_notes_tool(ctx: RunContext[Dependencies]) -> AgentResponse:
-    """Lists the titles of all available notes."""
-    titles = await ctx.deps.db.list_all_titles()
-    return AgentResponse(response_type="dml_success", message="Retrieved all note titles.", titles=titles)
+@traced("tool")
+async def list_notes_tool(ctx: RunContext[Dependencies], page_size: int = 50,
+                          cursor: Optional[str] = None) -> AgentResponse:
+    """
+    Lists note titles one page at a time, in title order.
+    Pass the `next_cursor` of a previous response as `cursor` to get the following page.
+    """
+    try:
+        titles, next_cursor = await ctx.deps.db.list_titles_page(page_size, cursor)
+    except ValueError as e:
+        return AgentResponse(response_type="error", message=str(e))
+    msg = f"Retrieved {len(titles)} note titles." + (" More are available." if next_cursor else "")
+    return AgentResponse(response_type="dml_success", message=msg, titles=titles,
+                         page_size=list_page_size(page_size), next_cursor=next_cursor)
 
 @Tool
+@traced("tool")
 async def update_note_tool(ctx: RunContext[Dependencies], title: str, new_text: str) -> AgentResponse:
     """Updates the text of an existing note."""
     success = await ctx.deps.db.update_note(title, new_text)
@@ -93,49 +121,185 @@ async def update_note_tool(ctx: RunContext[Dependencies], title: str, new_text:
     return AgentResponse(response_type="dml_success", message=msg)
 
 @Tool
+@traced("tool")
 async def delete_note_tool(ctx: RunContext[Dependencies], title: str) -> AgentResponse:
     """Deletes a note by its title."""
     success = await ctx.deps.db.delete_note(title)
     msg = f"Note '{title}' deleted successfully." if success else f"Failed to delete note '{title}' (not found?)."
     return AgentResponse(response_type="dml_success", message=msg)
 
+def _bulk_response(action: str, titles: List[str], outcomes: List[bool]) -> AgentResponse:
+    items = [{"title": t, "success": ok} for t, ok in zip(titles, outcomes)]
+    succeeded = sum(outcomes)
+    msg = f"{action} {succeeded} of {len(items)} notes."
+    if succeeded < len(items):
+        msg += " Failed: " + ", ".join(f"'{i['title']}'" for i in items if not i["success"]) + "."
+    return AgentResponse(response_type="dml_success", message=msg, items=items)
+
+@Tool
+@traced("tool")
+async def create_notes_tool(ctx: RunContext[Dependencies], notes: List[NoteInput]) -> AgentResponse:
+    """Creates several notes in one call. Use this instead of repeated create_note_tool calls."""
+    outcomes = await ctx.deps.db.add_notes([(n.title, n.text) for n in notes])
+    return _bulk_response("Created", [n.title for n in notes], outcomes)
+
 @Tool
-async def search_notes_tool(ctx: RunContext[Dependencies], search_term: str) -> AgentResponse:
-    """Searches for notes containing a specific term in their content."""
-    titles = await ctx.deps.db.search_notes(search_term)
-    msg = f"Found {len(titles)} notes containing '{search_term}'."
-    return AgentResponse(response_type="dml_success", message=msg, titles=titles)
+@traced("tool")
+async def update_notes_tool(ctx: RunContext[Dependencies], updates: List[NoteInput]) -> AgentResponse:
+    """Replaces the text of several existing notes in one call."""
+    outcomes = await ctx.deps.db.update_notes([(n.title, n.text) for n in updates])
+    return _bulk_response("Updated", [n.title for n in updates], outcomes)
+
+@Tool
+@traced("tool")
+async def delete_notes_tool(ctx: RunContext[Dependencies], titles: List[str]) -> AgentResponse:
+    """Deletes several notes by title in one call."""
+    outcomes = await ctx.deps.db.delete_notes(titles)
+    return _bulk_response("Deleted", titles, outcomes)
+
+@Tool
+@traced("tool")
+async def search_notes_tool(ctx: RunContext[Dependencies], search_term: str,
+                            mode: SearchMode = "substring", limit: int = 20,
+                            cursor: Optional[str] = None) -> AgentResponse:
+    """
+    Searches for notes containing a specific term in their content.
+    Use mode 'fulltext' for word/phrase queries, 'substring' for exact text fragments
+    and 'fuzzy' for misspelled or approximate terms. `limit` caps the number of results;
+    pass the `next_cursor` of a previous search as `cursor` to get the following page.
+    """
+    try:
+        results, next_cursor = await ctx.deps.db.search_notes(search_term, mode=mode, limit=limit, cursor=cursor)
+    except ValueError as e:
+        return AgentResponse(response_type="error", message=str(e))
+    titles = [r["title"] for r in results]
+    msg = f"Found {len(titles)} notes matching '{search_term}' ({mode} search)."
+    if next_cursor:
+        msg += " More results are available."
+    return AgentResponse(response_type="dml_success", message=msg, titles=titles, results=results,
+                         page_size=search_limit(limit), next_cursor=next_cursor)
 
 # --- Main Agent Definition ---
 
+AGENT_TOOLS = [
+    generate_ddl_sql,
+    create_note_tool,
+    retrieve_note_tool,
+    list_notes_tool,
+    update_note_tool,
+    delete_note_tool,
+    search_notes_tool,
+    create_notes_tool,
+    update_notes_tool,
+    delete_notes_tool,
+]
+
 main_agent = Agent(
     model=OpenAIModel('gpt-4o'),
-    tools=[
-        generate_ddl_sql,
-        create_note_tool,
-        retrieve_note_tool,
-        list_notes_tool,
-        update_note_tool,
-        delete_note_tool,
-        search_notes_tool,
-    ],
+    tools=AGENT_TOOLS,
     system_prompt=(
         "You are a tool-calling engine. Based on the user's input, you MUST call one of the available tools. "
         "DO NOT respond with conversational text. Your sole purpose is to translate user requests into tool calls. "
         "For table creation or modification, use `generate_ddl_sql`. "
-        "For note management, use the appropriate note tool (`Notes_tool`, `delete_note_tool`, etc.)."
+        "For note management, use the appropriate note tool (`Notes_tool`, `delete_note_tool`, etc.). "
+        "When a request covers several notes, make ONE call to the bulk tool "
+        "(`create_notes_tool`, `update_notes_tool`, `delete_notes_tool`) instead of one call per note."
     )
 )
 
 # --- Handler and Executor Functions ---
 
+# A single DatabaseConn is shared by every request; it draws connections from the process-wide pool.
+_db = DatabaseConn()
+
+async def shutdown():
+    """Shutdown hook for hosts of this module: closes the shared database pool."""
+    await close_pool()
+
+# --- Direct Tool Dispatch (fast path and decision cache replay) ---
+
+_TOOLS_BY_NAME = {tool.name: tool for tool in AGENT_TOOLS}
+# Replaying these has no side effects, so only their calls are cached. Every other tool writes and
+# always goes through the model.
+IDEMPOTENT_TOOLS = {"generate_ddl_sql", "retrieve_note_tool", "list_notes_tool", "search_notes_tool"}
+# Changing the toolset invalidates every cached decision.
+_TOOLSET_KEY = hashlib.sha256(",".join(sorted(_TOOLS_BY_NAME)).encode()).hexdigest()
+
+@dataclass
+class _ReplayContext:
+    """Stands in for RunContext when a cached tool call is replayed; the tools only read `deps`."""
+    deps: Dependencies
+
+def _recorded_tool_call(run_result) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """The single tool call made during a run, or None if the run made zero or several calls."""
+    calls = [part for message in run_result.all_messages() for part in getattr(message, "parts", [])
+             if getattr(part, "part_kind", None) == "tool-call"]
+    if len(calls) != 1 or calls[0].tool_name not in _TOOLS_BY_NAME:
+        return None
+    return calls[0].tool_name, calls[0].args_as_dict()
+
+async def _call_tool(tool_name: str, args: Dict[str, Any], deps: Dependencies) -> AgentResponse:
+    """Invokes a tool directly, outside an agent run, validating `args` against its signature."""
+    tool = _TOOLS_BY_NAME[tool_name]
+    hints = get_type_hints(tool.function)
+    kwargs = {name: TypeAdapter(hints[name]).validate_python(value) if name in hints else value
+              for name, value in args.items()}
+    result = tool.function(_ReplayContext(deps), **kwargs) if tool.takes_ctx else tool.function(**kwargs)
+    return await result if inspect.isawaitable(result) else result
+
 async def ask_generate(query: str) -> AgentResponse:
-    """The main entry point called by the UI. It runs the agent to get a response."""
-    deps = Dependencies(db=DatabaseConn())
+    """
+    The main entry point called by the UI. It runs the agent to get a response.
+    Simple note commands recognised by the intent router skip the model entirely, and a repeated
+    read-only command is answered by replaying its cached tool call without calling the model.
+    The whole turn is recorded as a 'turn' span whose `path` says which of these routes answered.
+    """
+    with span("turn", agent="db") as turn:
+        response = await _generate(query, turn)
+        if turn is not None:
+            turn.set(response_type=response.response_type)
+        return response
+
+async def _generate(query: str, turn) -> AgentResponse:
+    deps = Dependencies(db=_db)
+
+    # Fast path: plain note commands go straight to their tool without a model call.
+    intent = parse_intent(query) if FAST_PATH_ENABLED else None
+    if intent is not None:
+        if turn is not None:
+            turn.set(path="fast_path", tool=intent.tool_name)
+        try:
+            return await _call_tool(intent.tool_name, intent.args, deps)
+        except Exception as e:
+            print(f"Fast-path dispatch of {intent.tool_name} failed: {e}")
+            return AgentResponse(response_type="error", message=f"Sorry, an error occurred: {e}")
+
+    cache = get_decision_cache()
+    cache_key = cache.make_key(query, _TOOLSET_KEY) if cache else None
+    if cache:
+        hit = cache.get(cache_key)
+        if hit is not None and hit.idempotent:
+            if turn is not None:
+                turn.set(path="decision_cache", tool=hit.payload["tool"])
+            try:
+                return await _call_tool(hit.payload["tool"], hit.payload["args"], deps)
+            except Exception as e:
+                print(f"Replaying cached decision failed, falling back to the agent: {e}")
+
+    if turn is not None:
+        turn.set(path="agent")
     try:
-        run_result = await main_agent.run(query, deps=deps)
+        with span("llm.call", mode="run"):
+            run_result = await main_agent.run(query, deps=deps)
+            record_usage(run_result)
         agent_output = run_result.data
 
+        if cache:
+            recorded = _recorded_tool_call(run_result)
+            if recorded and recorded[0] in IDEMPOTENT_TOOLS:
+                tool_name, args = recorded
+                cache.put(cache_key, {"tool": tool_name, "args": args}, idempotent=True)
+
         # Ideal case: agent returns the Pydantic object directly.
         if isinstance(agent_output, AgentResponse):
             return agent_output
@@ -168,5 +332,5 @@ async def ask_generate(query: str) -> AgentResponse:
 
 async def ask_execute(sql: str):
     """The secondary entry point to execute confirmed SQL."""
-    deps = Dependencies(db=DatabaseConn())
+    deps = Dependencies(db=_db)
     return await deps.db.execute_dynamic_ddl(sql)
\ No newline at end of file
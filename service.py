@@ -0,0 +1,248 @@
+# service.py
+
+"""
+Headless ASGI service for both agents. Conversation state lives server-side in sessions; API
+clients, agents and the database pool are shared by all sessions of a worker.
+
+    uvicorn service:app --workers 4      # or: python service.py (SERVICE_WORKERS, SERVICE_PORT)
+
+With more than one worker, set SESSION_STORE=postgres so any worker can serve any session, including
+pages of its large results and spilled responses (stored in the database rather than on local disk).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+load_dotenv()
+
+from src.decision_cache import get_decision_cache
+from src.metrics import registry
+from src.resilience import ConcurrencyLimiter
+from src.response_cache import get_response_cache
+from src.session import SESSION_STORE, SessionConflict, SessionManager, SessionNotFound, close_resources
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8000"))
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "1"))
+# --- Backpressure (per worker) ---
+# Up to SERVICE_MAX_CONCURRENCY requests run at once; up to SERVICE_MAX_QUEUE more wait at most
+# SERVICE_QUEUE_TIMEOUT seconds for a slot. Everything beyond that is answered 503 + Retry-After.
+SERVICE_MAX_CONCURRENCY = int(os.getenv("SERVICE_MAX_CONCURRENCY", "32"))
+SERVICE_MAX_QUEUE = int(os.getenv("SERVICE_MAX_QUEUE", "64"))
+SERVICE_QUEUE_TIMEOUT = float(os.getenv("SERVICE_QUEUE_TIMEOUT", "5"))
+SERVICE_RETRY_AFTER = int(os.getenv("SERVICE_RETRY_AFTER", "1"))
+
+# --- Admission Control ---
+
+class AdmissionControl:
+    """Bounds in-flight and queued requests so overload turns into fast 503s instead of growing latency."""
+
+    def __init__(self, limit: int = SERVICE_MAX_CONCURRENCY, max_queue: int = SERVICE_MAX_QUEUE,
+                 queue_timeout: float = SERVICE_QUEUE_TIMEOUT):
+        self.limiter = ConcurrencyLimiter(limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self.in_flight = 0
+
+    async def acquire(self) -> bool:
+        semaphore = self.limiter.semaphore()
+        if semaphore.locked() and self.waiting >= self.max_queue:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+            self.in_flight += 1
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self.limiter.semaphore().release()
+
+    def stats(self) -> Dict[str, int]:
+        return {"limit": self.limiter.limit, "in_flight": self.in_flight, "waiting": self.waiting}
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying AdmissionControl to every request except health checks and metrics.
+    The slot is held until the response body is fully sent, so streamed chats count while they run.
+    """
+
+    def __init__(self, app, control: AdmissionControl, exempt: tuple = ("/healthz", "/metrics")):
+        self.app = app
+        self.control = control
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            await self.app(scope, receive, send)
+            return
+        if not await self.control.acquire():
+            registry.inc("service_rejections")
+            body = json.dumps({"detail": "The service is busy; retry later."}).encode()
+            await send({"type": "http.response.start", "status": 503, "headers": [
+                (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(SERVICE_RETRY_AFTER).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.control.release()
+            registry.observe("service_request_seconds", time.perf_counter() - started, method=scope["method"])
+
+# --- Application ---
+
+admission = AdmissionControl()
+sessions = SessionManager()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    logger.info(f"Agent service worker started (pid {os.getpid()}, session store: {SESSION_STORE})")
+    yield
+    await close_resources()
+
+app = FastAPI(title="Cognitive API Agent Service", lifespan=lifespan)
+app.add_middleware(AdmissionMiddleware, control=admission)
+
+@app.exception_handler(SessionNotFound)
+async def session_not_found(request: Request, exc: SessionNotFound) -> JSONResponse:
+    return JSONResponse({"detail": f"Session {exc.args[0]} not found or expired."}, status_code=404)
+
+@app.exception_handler(SessionConflict)
+async def session_conflict(request: Request, exc: SessionConflict) -> JSONResponse:
+    return JSONResponse({"detail": str(exc)}, status_code=409)
+
+class ChatRequest(BaseModel):
+    prompt: str
+    stream: bool = False
+
+class GenerateRequest(BaseModel):
+    query: str
+
+@app.get("/healthz")
+async def healthz() -> Dict[str, str]:
+    return {"status": "ok"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> str:
+    return registry.prometheus()
+
+@app.get("/stats")
+async def stats() -> Dict[str, Any]:
+    decision_cache, response_cache = get_decision_cache(), get_response_cache()
+    return {
+        "decision_cache": decision_cache.stats() if decision_cache else None,
+        "response_cache": response_cache.stats() if response_cache else None,
+        "admission": admission.stats(),
+    }
+
+# --- Sessions ---
+
+@app.post("/sessions", status_code=201)
+async def create_session() -> Dict[str, Any]:
+    session = await sessions.create()
+    return {"messages": session.messages, "state": session.summary()}
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str) -> Dict[str, Any]:
+    async with sessions.open(session_id, save=False) as session:
+        return {"messages": session.messages, "state": session.summary()}
+
+@app.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str) -> None:
+    if not await sessions.delete(session_id):
+        raise SessionNotFound(session_id)
+
+@app.get("/sessions/{session_id}/spec")
+async def get_spec(session_id: str) -> Dict[str, Any]:
+    async with sessions.open(session_id, save=False) as session:
+        return {"base_url": session.base_url, "spec": await session.spec()}
+
+@app.get("/sessions/{session_id}/messages/{index}/data")
+async def get_data_page(session_id: str, index: int, page: int = Query(0, ge=0),
+                        page_size: int = Query(100, ge=1, le=1000)) -> Dict[str, Any]:
+    rows = await sessions.data_page(session_id, index, page, page_size)
+    if rows is None:
+        raise HTTPException(status_code=410, detail="The stored response is no longer available.")
+    return {"rows": rows}
+
+# --- API Agent ---
+
+@app.post("/sessions/{session_id}/chat")
+async def chat(session_id: str, body: ChatRequest):
+    if not body.stream:
+        async with sessions.open(session_id) as session:
+            messages = await session.chat(body.prompt)
+            return {"messages": messages, "state": session.summary()}
+
+    # The session is opened (loaded once) before the response starts, so a missing one is still a 404;
+    # the stream then owns it and saves it when the turn completes.
+    opened = AsyncExitStack()
+    session = await opened.enter_async_context(sessions.open(session_id))
+
+    async def events() -> AsyncIterator[bytes]:
+        """Newline-delimited JSON: partial decisions, then a 'done' event with the new messages and state."""
+        try:
+            async with opened:
+                async for event in session.stream_chat(body.prompt):
+                    if event["type"] == "done":
+                        event["state"] = session.summary()
+                    yield (json.dumps(event, default=str) + "\n").encode()
+        except Exception as e:
+            logger.error(f"Streamed chat failed: {e}", exc_info=True)
+            yield (json.dumps({"type": "error", "message": str(e)}) + "\n").encode()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/sessions/{session_id}/confirm")
+async def confirm(session_id: str) -> Dict[str, Any]:
+    async with sessions.open(session_id) as session:
+        messages = await session.confirm()
+        return {"messages": messages, "state": session.summary()}
+
+@app.post("/sessions/{session_id}/cancel")
+async def cancel(session_id: str) -> Dict[str, Any]:
+    async with sessions.open(session_id) as session:
+        messages = session.cancel()
+        return {"messages": messages, "state": session.summary()}
+
+# --- Database Agent ---
+
+@app.post("/sessions/{session_id}/generate")
+async def generate(session_id: str, body: GenerateRequest) -> Dict[str, Any]:
+    async with sessions.open(session_id) as session:
+        response = await session.generate(body.query)
+        return {"response": response.model_dump(), "state": session.summary()}
+
+@app.post("/sessions/{session_id}/execute")
+async def execute(session_id: str) -> Dict[str, Any]:
+    async with sessions.open(session_id) as session:
+        result = await session.execute()
+        return {"result": result, "state": session.summary()}
+
+if __name__ == "__main__":
+    import uvicorn
+
+    if SERVICE_WORKERS > 1 and SESSION_STORE == "memory":
+        logger.warning("Several workers with SESSION_STORE=memory: sessions are only found on the worker that created them.")
+    uvicorn.run("service:app", host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS)
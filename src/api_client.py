@@ -1,53 +1,502 @@
 # src/api_client.py
 
+import asyncio
+import copy
 import httpx
+import importlib.util
+import json
 import logging
-from typing import Dict, Any, Optional
+import os
+import re
+import time
+from typing import Dict, Any, Mapping, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from src.metrics import record_span, registry, span
+from src.resilience import (
+    IDEMPOTENT_METHODS, RETRY_STATUSES, RetryPolicy, get_circuit_breaker, get_concurrency_limiter,
+)
+from src.response_cache import ResponseCache, get_response_cache
+from src.spec_cache import CachedSpec, SpecCache, SPEC_CACHE_ENABLED
+from src.spec_compact import compact_spec
+from src.spill import SpillWriter, SPILL_DIR
+from src.tools import APIPlan, PlanStep
 
 logger = logging.getLogger(__name__)
 
+# --- Connection Pool Defaults ---
+API_MAX_CONNECTIONS = int(os.getenv("API_MAX_CONNECTIONS", "20"))
+API_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("API_MAX_KEEPALIVE_CONNECTIONS", "10"))
+API_KEEPALIVE_EXPIRY = float(os.getenv("API_KEEPALIVE_EXPIRY", "30"))
+API_HTTP2 = os.getenv("API_HTTP2", "false").lower() in ("1", "true", "yes")
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "30"))  # read/write/pool timeout
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+# Response bodies above this size are streamed to a spill file instead of being returned inline.
+API_MAX_RESPONSE_BYTES = int(os.getenv("API_MAX_RESPONSE_BYTES", str(2 * 1024 * 1024)))
+ERROR_BODY_MAX_BYTES = 64 * 1024
+
+# --- Plan Execution Defaults ---
+PLAN_MAX_CONCURRENCY = int(os.getenv("PLAN_MAX_CONCURRENCY", "8"))
+API_RATE_LIMIT = float(os.getenv("API_RATE_LIMIT", "0"))  # requests/second per host; 0 disables
+API_RATE_BURST = int(os.getenv("API_RATE_BURST", "10"))
+
+SPEC_PATHS = ["/v3/api-docs", "/openapi.json", "/swagger.json"]
+SPEC_PROBE_TIMEOUT = 10.0
+
+# httpx trace events recorded as spans: connection setup and the wait for response headers (TTFB).
+_TRACE_SPANS = {
+    "connection.connect_tcp": "http.connect",
+    "connection.start_tls": "http.tls",
+    "http11.receive_response_headers": "http.wait_response",
+    "http2.receive_response_headers": "http.wait_response",
+}
+
+def _trace_hook():
+    """An httpx 'trace' extension callback that turns connection and response phases into spans."""
+    started: Dict[str, float] = {}
+
+    async def trace(event_name: str, info: Dict[str, Any]) -> None:
+        phase, _, state = event_name.rpartition(".")
+        if phase not in _TRACE_SPANS:
+            return
+        if state == "started":
+            started[phase] = time.time()
+        elif phase in started:
+            record_span(_TRACE_SPANS[phase], started.pop(phase), time.time(), failed=state == "failed")
+
+    return trace
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+def _parse_spec(response: httpx.Response) -> Optional[Dict[str, Any]]:
+    """Returns the response body if it looks like an OpenAPI/Swagger document, else None."""
+    if response.status_code != 200:
+        return None
+    try:
+        spec = response.json()
+    except Exception:
+        return None
+    if isinstance(spec, dict) and ("openapi" in spec or "swagger" in spec or "paths" in spec):
+        return spec
+    return None
+
+# --- Per-host Rate Limiting ---
+
+class RateLimiter:
+    """Token bucket: allows `rate` requests per second with bursts of up to `burst`. Its lock is rebuilt if the event loop changes."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    async def acquire(self) -> None:
+        async with self._get_lock():
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+
+def _rate_limiter_for(url: str) -> Optional[RateLimiter]:
+    if API_RATE_LIMIT <= 0:
+        return None
+    host = urlsplit(url).netloc
+    if host not in _rate_limiters:
+        _rate_limiters[host] = RateLimiter(API_RATE_LIMIT, API_RATE_BURST)
+    return _rate_limiters[host]
+
+# --- Plan Placeholders ---
+
+_PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z0-9_-]+)((?:\.[^.}\s]+)*)\s*\}\}")
+
+def _lookup_output(outputs: Dict[str, Any], step_id: str, path: str) -> Any:
+    if step_id not in outputs:
+        raise ValueError(f"Placeholder refers to step '{step_id}', which has no output yet.")
+    value = outputs[step_id]
+    for key in filter(None, path.split(".")):
+        if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        elif isinstance(value, dict) and key in value:
+            value = value[key]
+        else:
+            raise ValueError(f"Step '{step_id}' output has no field '{path.lstrip('.')}'.")
+    return value
+
+def resolve_placeholders(value: Any, outputs: Dict[str, Any]) -> Any:
+    """Substitutes '{{step.path}}' references. A value that is exactly one placeholder keeps its type."""
+    if isinstance(value, str):
+        whole = _PLACEHOLDER.fullmatch(value.strip())
+        if whole:
+            return _lookup_output(outputs, whole.group(1), whole.group(2))
+        return _PLACEHOLDER.sub(lambda m: str(_lookup_output(outputs, m.group(1), m.group(2))), value)
+    if isinstance(value, dict):
+        return {k: resolve_placeholders(v, outputs) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve_placeholders(v, outputs) for v in value]
+    return value
+
+def resolve_path(endpoint: str, outputs: Dict[str, Any]) -> str:
+    """Substitutes '{{step.path}}' references in an endpoint path, percent-encoding each value as one segment."""
+    return _PLACEHOLDER.sub(lambda m: quote(str(_lookup_output(outputs, m.group(1), m.group(2))), safe=""), endpoint)
+
+def _failed(result: Any) -> bool:
+    return isinstance(result, dict) and result.get("status") in ("FAILED", "SKIPPED")
+
 class ApiClient:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, max_connections: int = API_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = API_MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = API_KEEPALIVE_EXPIRY, http2: bool = API_HTTP2,
+                 timeout: float = API_TIMEOUT, connect_timeout: float = API_CONNECT_TIMEOUT,
+                 spec_cache: Optional[SpecCache] = None, max_response_bytes: int = API_MAX_RESPONSE_BYTES,
+                 spill_dir: str = SPILL_DIR, retry: Optional[RetryPolicy] = None,
+                 response_cache: Optional[ResponseCache] = None):
         if not base_url or not base_url.startswith("http"):
             raise ValueError("A valid API base URL is required.")
         self.base_url = base_url.rstrip('/')
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        if http2 and not _http2_available():
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed; falling back to HTTP/1.1.")
+            http2 = False
+        self.http2 = http2
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.retry = retry or RetryPolicy()
+        self.breaker = get_circuit_breaker(self.base_url)
+        self.concurrency = get_concurrency_limiter(self.base_url)
+        self.response_cache = response_cache if response_cache is not None else get_response_cache()
+        self.max_response_bytes = max_response_bytes
+        self.spill_dir = spill_dir
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        if spec_cache is None and SPEC_CACHE_ENABLED:
+            spec_cache = SpecCache()
+        self.spec_cache = spec_cache
+        self.spec_compact: Optional[str] = None
         logger.info(f"ApiClient initialized with base URL: {self.base_url}")
 
+    # --- Client Lifecycle ---
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Returns the long-lived AsyncClient, creating it lazily on the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            if self._client is not None and not self._client.is_closed:
+                # Pooled connections belong to a previous event loop and cannot be reused there.
+                logger.debug("Event loop changed; replacing the HTTP client.")
+            self._client = httpx.AsyncClient(limits=self.limits, http2=self.http2, timeout=self.timeout)
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        """Closes the underlying HTTP client and its pooled connections."""
+        client, self._client, self._client_loop = self._client, None, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+    async def __aenter__(self) -> "ApiClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+    # --- Requests ---
+
     async def get_api_spec(self) -> Optional[Dict[str, Any]]:
-        spec_paths = ["/v3/api-docs", "/openapi.json", "/swagger.json"]
-        for path in spec_paths:
-            try:
-                url = f"{self.base_url}{path}"
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(url, timeout=10.0)
-                if response.status_code == 200:
-                    logger.info(f"Successfully fetched API spec from {url}")
-                    return response.json()
-            except Exception as e:
-                logger.warning(f"Could not fetch spec from {url}: {e}")
+        """
+        Returns the API spec, served from the on-disk cache while fresh. Stale entries are
+        revalidated with a conditional request; if the API is unreachable the stale copy is used.
+        The compact prompt rendering is cached next to the raw spec and exposed as `spec_compact`.
+        """
+        cached = await asyncio.to_thread(self.spec_cache.load, self.base_url) if self.spec_cache else None
+        if cached and cached.is_fresh(self.spec_cache.ttl):
+            logger.info(f"Using cached API spec for {self.base_url}")
+            return await self._use_entry(cached)
+        if cached:
+            entry = await self._revalidate_spec(cached)
+            if entry is not None:
+                return await self._use_entry(entry)
+
+        found = await self._discover_spec()
+        if found:
+            spec_url, response, spec = found
+            entry = CachedSpec(
+                base_url=self.base_url, spec_url=spec_url, spec=spec,
+                etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"),
+                fetched_at=time.time(),
+            )
+            return await self._use_entry(entry, save=True)
+        if cached:
+            logger.warning(f"Spec discovery failed; using stale cached spec for {self.base_url}")
+            return await self._use_entry(cached)
         logger.error("Could not find or fetch the API specification.")
         return None
 
-    async def make_request(self, method: str, endpoint: str, json_payload: Optional[Dict] = None, params: Optional[Dict] = None) -> Dict[str, Any]:
-        async with httpx.AsyncClient() as client:
+    async def _use_entry(self, entry: CachedSpec, save: bool = False) -> Dict[str, Any]:
+        """Makes `entry` the active spec, compacting it (and persisting the result) if needed."""
+        if entry.compact is None:
+            entry.compact = await asyncio.to_thread(compact_spec, entry.spec)
+            save = True
+        if save and self.spec_cache:
+            await asyncio.to_thread(self.spec_cache.save, entry)
+        self.spec_compact = entry.compact
+        return entry.spec
+
+    async def _revalidate_spec(self, cached: CachedSpec) -> Optional[CachedSpec]:
+        """Conditionally re-fetches a stale cached spec. Returns None if it must be rediscovered."""
+        client = self._get_client()
+        try:
+            response = await client.get(cached.spec_url, headers=cached.conditional_headers(),
+                                        timeout=SPEC_PROBE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Could not revalidate spec at {cached.spec_url}, working offline: {e}")
+            return cached
+        if response.status_code == 304:
+            logger.info(f"Cached API spec for {self.base_url} is still valid")
+            await asyncio.to_thread(self.spec_cache.touch, cached)
+            return cached
+        spec = _parse_spec(response)
+        if spec is None:
+            return None
+        cached.spec = spec
+        cached.compact = None
+        cached.etag = response.headers.get("ETag")
+        cached.last_modified = response.headers.get("Last-Modified")
+        cached.fetched_at = time.time()
+        logger.info(f"Refreshed API spec from {cached.spec_url}")
+        return cached
+
+    async def _probe_spec(self, path: str) -> Optional[Tuple[str, httpx.Response, Dict[str, Any]]]:
+        url = f"{self.base_url}{path}"
+        try:
+            response = await self._get_client().get(url, timeout=SPEC_PROBE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Could not fetch spec from {url}: {e}")
+            return None
+        spec = _parse_spec(response)
+        return (url, response, spec) if spec is not None else None
+
+    async def _discover_spec(self) -> Optional[Tuple[str, httpx.Response, Dict[str, Any]]]:
+        """Probes all well-known spec paths concurrently; the first valid spec wins and the rest are cancelled."""
+        probes = [asyncio.create_task(self._probe_spec(path)) for path in SPEC_PATHS]
+        try:
+            for next_done in asyncio.as_completed(probes):
+                found = await next_done
+                if found:
+                    logger.info(f"Successfully fetched API spec from {found[0]}")
+                    return found
+            return None
+        finally:
+            for probe in probes:
+                probe.cancel()
+            await asyncio.gather(*probes, return_exceptions=True)
+
+    async def make_request(self, method: str, endpoint: str, json_payload: Optional[Dict] = None, params: Optional[Dict] = None,
+                           max_response_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Sends a request with retries. Idempotent methods are retried on timeouts, dropped connections
+        and 429/502/503/504 (honouring Retry-After); failed connects are retried for any method since
+        nothing reached the server. While the API keeps failing, the circuit breaker fails calls fast.
+
+        GET results are served from the response cache while fresh and revalidated with ETag /
+        Last-Modified once stale; any other method invalidates cached results for the same path.
+
+        Bodies up to `max_response_bytes` are parsed and returned inline; larger ones are written to a
+        spill file and returned as {"status", "message", "spilled": {...}} with a preview.
+        """
+        cap = self.max_response_bytes if max_response_bytes is None else max_response_bytes
+        method = method.upper()
+        url = f"{self.base_url}{endpoint}"
+        cache = self.response_cache
+        if cache is not None and method not in ("GET", "HEAD", "OPTIONS"):
+            try:
+                return (await self._request(method, url, json_payload, params, cap))[2]
+            finally:
+                cache.invalidate(self.base_url, endpoint)
+        if cache is None or method != "GET":
+            return (await self._request(method, url, json_payload, params, cap))[2]
+
+        key = cache.make_key(method, url, params)
+        entry = cache.get(key)
+        if entry is not None and entry.is_fresh():
+            cache.record_hit(entry)
+            registry.inc("response_cache_lookups", result="hit")
+            registry.inc("response_cache_saved_seconds", entry.elapsed)
+            logger.info(f"Response cache hit for GET {url} (saved ~{entry.elapsed * 1000:.0f}ms)")
+            return copy.deepcopy(entry.result)
+
+        started = time.perf_counter()
+        headers = entry.conditional_headers() if entry is not None else None
+        status_code, response_headers, result = await self._request(method, url, json_payload, params, cap, headers)
+        elapsed = time.perf_counter() - started
+        if status_code == 304 and entry is not None:
+            cache.refresh(key, entry, response_headers)
+            cache.record_hit(entry, revalidated=True)
+            registry.inc("response_cache_lookups", result="revalidated")
+            logger.info(f"Response cache revalidated GET {url} (304 after {elapsed * 1000:.0f}ms)")
+            return copy.deepcopy(entry.result)
+        registry.inc("response_cache_lookups", result="miss")
+        if status_code == 200 and not (isinstance(result, dict) and "spilled" in result):
+            cache.store(key, self.base_url, endpoint, result, response_headers, elapsed)
+        return result
+
+    async def _request(self, method: str, url: str, json_payload: Optional[Dict], params: Optional[Dict], cap: int,
+                       headers: Optional[Dict[str, str]] = None) -> Tuple[Optional[int], Mapping[str, str], Any]:
+        """
+        The retry loop behind make_request. Returns (status code, response headers, result); the status
+        is None when no response was received.
+        """
+        idempotent = method in IDEMPOTENT_METHODS
+        attempts = self.retry.max_attempts
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                logger.warning(f"Circuit open for {self.base_url}; not sending {method} {url}")
+                registry.inc("http_circuit_rejections")
+                return None, {}, {"status": "FAILED", "message": (
+                    f"The API at {self.base_url} is failing repeatedly; calls are paused for "
+                    f"another {self.breaker.retry_in():.0f}s."
+                )}
+            last = attempt == attempts - 1
             try:
-                url = f"{self.base_url}{endpoint}"
-                logger.info(f"Making {method} request to {url} with JSON: {json_payload} and Params: {params}")
-                
-                response = await client.request(method.upper(), url, json=json_payload, params=params, timeout=30.0)
-                response.raise_for_status()
-
-                if not response.content:
-                    return {"status": "SUCCESS", "message": f"Request successful with status {response.status_code}."}
-                
-                try:
-                    return response.json()
-                except Exception:
-                    return {"status": "SUCCESS", "data": response.text}
-            except httpx.HTTPStatusError as e:
-                error_text = e.response.text
-                logger.error(f"API request failed with status {e.response.status_code}: {error_text}")
-                return {"status": "FAILED", "message": f"API Error ({e.response.status_code}): {error_text}"}
+                # Wait for a rate token first, so requests held back by the rate limit do not occupy
+                # concurrency slots that other requests could use.
+                limiter = _rate_limiter_for(url)
+                if limiter is not None:
+                    await limiter.acquire()
+                async with self.concurrency.semaphore():
+                    logger.info(f"Making {method} request to {url} with JSON: {json_payload} and Params: {params}")
+                    status_code, response_headers, result = await self._send(method, url, json_payload, params, cap, headers)
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                retryable = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)) or idempotent
+                if last or not retryable:
+                    logger.error(f"API request to {url} failed: {e!r}")
+                    return None, {}, {"status": "FAILED", "message": f"Could not complete the request to {url}: {e!r}"}
+                delay, reason = self.retry.backoff(attempt), repr(e)
             except Exception as e:
                 logger.error(f"An unexpected error occurred during API request: {e}", exc_info=True)
-                return {"status": "FAILED", "message": f"An unexpected client-side error occurred: {e}"}
\ No newline at end of file
+                return None, {}, {"status": "FAILED", "message": f"An unexpected client-side error occurred: {e}"}
+            else:
+                if status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if last or not idempotent or status_code not in RETRY_STATUSES:
+                    return status_code, response_headers, result
+                retry_after = response_headers.get("Retry-After")
+                delay, reason = self.retry.delay_for(attempt, retry_after), f"status {status_code}"
+                if delay is None:
+                    logger.warning(f"Not retrying {method} {url}: Retry-After ({retry_after}) exceeds the retry budget")
+                    return status_code, response_headers, result
+            registry.inc("http_retries", method=method)
+            logger.warning(f"Retrying {method} {url} in {delay:.2f}s (attempt {attempt + 2}/{attempts}) after {reason}")
+            await asyncio.sleep(delay)
+
+    async def _send(self, method: str, url: str, json_payload: Optional[Dict], params: Optional[Dict], cap: int,
+                    headers: Optional[Dict[str, str]] = None) -> Tuple[int, Mapping[str, str], Any]:
+        """One attempt: returns (status code, response headers, result). Transport errors propagate."""
+        client = self._get_client()
+        spill: Optional[SpillWriter] = None
+        with span("http.request", method=method, url=url) as request_span:
+            try:
+                async with client.stream(method, url, json=json_payload, params=params, headers=headers,
+                                         extensions={"trace": _trace_hook()}) as response:
+                    response_headers = response.headers
+                    if request_span is not None:
+                        request_span.set(status_code=response.status_code, http_version=response.http_version)
+                    if response.is_error:
+                        error_text = await _read_prefix(response, ERROR_BODY_MAX_BYTES)
+                        logger.error(f"API request failed with status {response.status_code}: {error_text}")
+                        return response.status_code, response_headers, {
+                            "status": "FAILED", "message": f"API Error ({response.status_code}): {error_text}",
+                        }
+
+                    body = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        if spill is None and len(body) + len(chunk) <= cap:
+                            body.extend(chunk)
+                            continue
+                        if spill is None:
+                            spill = SpillWriter(response.headers.get("content-type", ""), self.spill_dir)
+                            spill.write(bytes(body))
+                            body = bytearray()
+                        spill.write(chunk)
+                    status_code = response.status_code
+            except BaseException:
+                if spill is not None:
+                    spill.discard()
+                raise
+
+        if spill is not None:
+            info = spill.finish()
+            size = f"{info['items']} items" if info["items"] is not None else f"{info['bytes']} bytes"
+            return status_code, response_headers, {"status": "SUCCESS", "message": f"Large response ({size}) saved to disk.", "spilled": info}
+
+        if not body:
+            return status_code, response_headers, {"status": "SUCCESS", "message": f"Request successful with status {status_code}."}
+
+        try:
+            return status_code, response_headers, json.loads(body)
+        except Exception:
+            return status_code, response_headers, {"status": "SUCCESS", "data": body.decode("utf-8", errors="replace")}
+
+    async def execute_plan(self, plan: APIPlan, max_concurrency: int = PLAN_MAX_CONCURRENCY) -> Dict[str, Any]:
+        """
+        Runs every step of a plan and returns {step_id: result}. Steps start as soon as their
+        dependencies finish, at most `max_concurrency` at a time; a step whose dependency failed
+        is skipped rather than sent.
+        """
+        semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+        outputs: Dict[str, Any] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(step: PlanStep) -> Any:
+            if step.depends_on:
+                await asyncio.gather(*(tasks[dep] for dep in step.depends_on))
+            failed = [dep for dep in step.depends_on if _failed(outputs[dep])]
+            if failed:
+                outputs[step.id] = {"status": "SKIPPED", "message": f"Skipped because step(s) {failed} failed."}
+                return outputs[step.id]
+            try:
+                endpoint = resolve_path(step.endpoint, outputs)
+                payload = resolve_placeholders(step.json_payload, outputs)
+                params = resolve_placeholders(step.params, outputs)
+            except ValueError as e:
+                outputs[step.id] = {"status": "FAILED", "message": str(e)}
+                return outputs[step.id]
+            async with semaphore:
+                outputs[step.id] = await self.make_request(step.method, endpoint, payload, params)
+            return outputs[step.id]
+
+        for step in plan.steps:
+            tasks[step.id] = asyncio.create_task(run_step(step))
+        await asyncio.gather(*tasks.values())
+        return {step.id: outputs[step.id] for step in plan.steps}
+
+async def _read_prefix(response: httpx.Response, limit: int) -> str:
+    """Reads at most `limit` bytes of a streamed body as text."""
+    data = bytearray()
+    async for chunk in response.aiter_bytes():
+        data.extend(chunk[:limit - len(data)])
+        if len(data) >= limit:
+            break
+    return data.decode(response.encoding or "utf-8", errors="replace")
@@ -0,0 +1,187 @@
+# src/backend.py
+
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+import httpx
+
+from src.decision_cache import get_decision_cache
+from src.resilience import parse_retry_after
+from src.response_cache import get_response_cache
+from src.runtime import AsyncRunner
+from src.session import SessionManager, SessionNotFound, close_resources
+
+logger = logging.getLogger(__name__)
+
+# When set, the Streamlit scripts are thin clients of the agent service (service.py) at this URL;
+# otherwise they host the sessions in-process.
+AGENT_SERVICE_URL = os.getenv("AGENT_SERVICE_URL", "")
+SERVICE_CLIENT_TIMEOUT = float(os.getenv("SERVICE_CLIENT_TIMEOUT", "120"))
+SERVICE_CLIENT_RETRIES = 3
+
+# Both backends expose the same synchronous calls. Each returns the JSON the service would:
+# {"messages": [new messages], "state": {...}} for chat-like calls.
+
+class LocalBackend:
+    """Runs sessions in this process on a background event loop."""
+
+    def __init__(self, runner: AsyncRunner, sessions: Optional[SessionManager] = None):
+        self.runner = runner
+        self.sessions = sessions or SessionManager()
+        runner.add_shutdown_hook(close_resources)
+
+    def _call(self, session_id: str, method: str, *args: Any, save: bool = True) -> Any:
+        async def call():
+            async with self.sessions.open(session_id, save=save) as session:
+                result = getattr(session, method)(*args)
+                if inspect.isawaitable(result):
+                    result = await result
+                return result, session.summary()
+        return self.runner.run(call())
+
+    def create_session(self) -> Dict[str, Any]:
+        session = self.runner.run(self.sessions.create())
+        return {"messages": session.messages, "state": session.summary()}
+
+    def chat(self, session_id: str, prompt: str) -> Dict[str, Any]:
+        messages, state = self._call(session_id, "chat", prompt)
+        return {"messages": messages, "state": state}
+
+    def stream_chat(self, session_id: str, prompt: str) -> Iterator[Dict[str, Any]]:
+        async def events():
+            async with self.sessions.open(session_id) as session:
+                async for event in session.stream_chat(prompt):
+                    if event["type"] == "done":
+                        event["state"] = session.summary()
+                    yield event
+        return self.runner.stream(events())
+
+    def confirm(self, session_id: str) -> Dict[str, Any]:
+        messages, state = self._call(session_id, "confirm")
+        return {"messages": messages, "state": state}
+
+    def cancel(self, session_id: str) -> Dict[str, Any]:
+        messages, state = self._call(session_id, "cancel")
+        return {"messages": messages, "state": state}
+
+    def spec(self, session_id: str) -> Optional[str]:
+        spec, _ = self._call(session_id, "spec", save=False)
+        return spec
+
+    def data_page(self, session_id: str, index: int, page: int, page_size: int) -> Any:
+        return self.runner.run(self.sessions.data_page(session_id, index, page, page_size))
+
+    def generate(self, session_id: str, query: str) -> Dict[str, Any]:
+        response, state = self._call(session_id, "generate", query)
+        return {"response": response.model_dump(), "state": state}
+
+    def execute(self, session_id: str) -> Dict[str, Any]:
+        result, state = self._call(session_id, "execute")
+        return {"result": result, "state": state}
+
+    def stats(self) -> Dict[str, Any]:
+        decision_cache, response_cache = get_decision_cache(), get_response_cache()
+        return {
+            "decision_cache": decision_cache.stats() if decision_cache else None,
+            "response_cache": response_cache.stats() if response_cache else None,
+        }
+
+class ServiceBackend:
+    """A client of the agent service. Requests rejected with 503 + Retry-After (backpressure) are retried."""
+
+    def __init__(self, base_url: str, timeout: float = SERVICE_CLIENT_TIMEOUT, retries: int = SERVICE_CLIENT_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self._client = httpx.Client(base_url=self.base_url, timeout=httpx.Timeout(timeout, connect=5.0))
+
+    def _send(self, method: str, path: str, stream: bool = False, **kwargs: Any) -> httpx.Response:
+        """Sends a request, waiting out 503 + Retry-After responses up to `retries` times."""
+        for attempt in range(max(self.retries, 0) + 1):
+            response = self._client.send(self._client.build_request(method, path, **kwargs), stream=stream)
+            retry_after = parse_retry_after(response.headers.get("retry-after"))
+            if response.status_code != 503 or retry_after is None or attempt == self.retries:
+                return response
+            response.close()
+            logger.info(f"Agent service busy; retrying in {retry_after:.1f}s")
+            time.sleep(retry_after)
+
+    @staticmethod
+    def _check(response: httpx.Response, path: str) -> None:
+        if response.status_code == 404 and path.startswith("/sessions/"):
+            raise SessionNotFound(path.split("/")[2])
+        response.raise_for_status()
+
+    def _request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        response = self._send(method, path, **kwargs)
+        self._check(response, path)
+        return response
+
+    def create_session(self) -> Dict[str, Any]:
+        return self._request("POST", "/sessions").json()
+
+    def chat(self, session_id: str, prompt: str) -> Dict[str, Any]:
+        return self._request("POST", f"/sessions/{session_id}/chat", json={"prompt": prompt}).json()
+
+    def stream_chat(self, session_id: str, prompt: str) -> Iterator[Dict[str, Any]]:
+        path = f"/sessions/{session_id}/chat"
+        response = self._send("POST", path, stream=True, json={"prompt": prompt, "stream": True})
+        try:
+            self._check(response, path)
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "error":
+                    raise RuntimeError(event["message"])
+                yield event
+        finally:
+            response.close()
+
+    def confirm(self, session_id: str) -> Dict[str, Any]:
+        return self._request("POST", f"/sessions/{session_id}/confirm").json()
+
+    def cancel(self, session_id: str) -> Dict[str, Any]:
+        return self._request("POST", f"/sessions/{session_id}/cancel").json()
+
+    def spec(self, session_id: str) -> Optional[str]:
+        return self._request("GET", f"/sessions/{session_id}/spec").json()["spec"]
+
+    def data_page(self, session_id: str, index: int, page: int, page_size: int) -> Any:
+        path = f"/sessions/{session_id}/messages/{index}/data"
+        response = self._send("GET", path, params={"page": page, "page_size": page_size})
+        if response.status_code == 410:
+            return None
+        self._check(response, path)
+        return response.json()["rows"]
+
+    def generate(self, session_id: str, query: str) -> Dict[str, Any]:
+        return self._request("POST", f"/sessions/{session_id}/generate", json={"query": query}).json()
+
+    def execute(self, session_id: str) -> Dict[str, Any]:
+        return self._request("POST", f"/sessions/{session_id}/execute").json()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._request("GET", "/stats").json()
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """
+    The process-wide backend for the Streamlit scripts: a client of the agent service if
+    AGENT_SERVICE_URL is set, else sessions hosted in-process on one shared background loop.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if AGENT_SERVICE_URL:
+                logger.info(f"Using the agent service at {AGENT_SERVICE_URL}")
+                _backend = ServiceBackend(AGENT_SERVICE_URL)
+            else:
+                _backend = LocalBackend(AsyncRunner(name="agent-backend"))
+        return _backend
@@ -0,0 +1,43 @@
+# src/debug_panel.py
+
+import json
+
+import pandas as pd
+import streamlit as st
+
+from src.metrics import registry
+
+def render_debug_panel(root_span: str = "turn") -> None:
+    """Sidebar panel with the last turn's latency breakdown, latency percentiles and metric exports."""
+    if not st.sidebar.checkbox("Show debug panel", value=False, key="debug_panel"):
+        return
+    with st.sidebar.expander("Last turn", expanded=True):
+        spans = registry.last_trace(root_span)
+        if not spans:
+            st.caption("No completed turn yet.")
+        else:
+            root = spans[0]
+            depth = {root.span_id: 0}
+            rows = []
+            for s in spans:
+                depth[s.span_id] = depth.get(s.parent_id, 0) + 1 if s.parent_id else 0
+                rows.append({
+                    "span": "  " * depth[s.span_id] + s.name,
+                    "start_ms": round((s.start - root.start) * 1000, 1),
+                    "duration_ms": round(s.duration * 1000, 1),
+                    "detail": ", ".join(f"{k}={v}" for k, v in s.attributes.items() if v is not None),
+                })
+            st.dataframe(pd.DataFrame(rows), hide_index=True)
+    with st.sidebar.expander("Latency percentiles"):
+        summary = registry.summary()
+        if summary:
+            st.dataframe(pd.DataFrame(summary), hide_index=True)
+        counters = registry.counters()
+        if counters:
+            st.json(counters)
+    with st.sidebar.expander("Export"):
+        st.download_button("Prometheus metrics", registry.prometheus(), file_name="metrics.prom")
+        st.download_button("OTLP traces (JSON)", json.dumps(registry.otlp()), file_name="traces.otlp.json")
+        if st.button("Write to metrics directory"):
+            paths = registry.write_exports()
+            st.caption("Wrote " + ", ".join(f"`{p}`" for p in paths))
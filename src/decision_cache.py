@@ -0,0 +1,145 @@
+# src/decision_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DECISION_CACHE_ENABLED = os.getenv("DECISION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+DECISION_CACHE_SIZE = int(os.getenv("DECISION_CACHE_SIZE", "512"))
+DECISION_CACHE_TTL = float(os.getenv("DECISION_CACHE_TTL", "900"))
+DECISION_CACHE_SQLITE = os.getenv("DECISION_CACHE_SQLITE", "")
+
+@dataclass
+class CachedDecision:
+    """A model decision recorded for replay. Non-idempotent decisions need confirmation before replay."""
+    payload: Dict[str, Any]
+    idempotent: bool
+    created_at: float
+
+class DecisionCache:
+    """
+    LRU + TTL cache of model decisions keyed on the normalized prompt and a context hash.
+    An optional SQLite file backs the in-memory tier so decisions survive restarts and
+    are shared between processes.
+    """
+
+    def __init__(self, max_entries: int = DECISION_CACHE_SIZE, ttl: float = DECISION_CACHE_TTL,
+                 sqlite_path: str = DECISION_CACHE_SQLITE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedDecision]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS decisions ("
+                "key TEXT PRIMARY KEY, payload TEXT NOT NULL, idempotent INTEGER NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    # --- Keys ---
+
+    @staticmethod
+    def normalize(prompt: str) -> str:
+        """Case-folds, collapses whitespace and drops trailing punctuation."""
+        return re.sub(r"\s+", " ", prompt).strip().rstrip(".!?").strip().casefold()
+
+    def make_key(self, prompt: str, *context: str) -> str:
+        material = "\x1f".join((self.normalize(prompt),) + context)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    # --- Lookup and Store ---
+
+    def get(self, key: str) -> Optional[CachedDecision]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                entry = self._load(key)
+                if entry is not None:
+                    self._remember(key, entry)
+            if entry is not None and now - entry.created_at >= self.ttl:
+                self._forget(key)
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry
+
+    def put(self, key: str, payload: Dict[str, Any], idempotent: bool) -> None:
+        entry = CachedDecision(payload=payload, idempotent=idempotent, created_at=time.time())
+        with self._lock:
+            self._remember(key, entry)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO decisions (key, payload, idempotent, created_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(payload), int(idempotent), entry.created_at),
+                )
+                self._db.execute("DELETE FROM decisions WHERE created_at < ?", (entry.created_at - self.ttl,))
+                self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM decisions")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+    # --- Internals (callers hold the lock) ---
+
+    def _remember(self, key: str, entry: CachedDecision) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _forget(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM decisions WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _load(self, key: str) -> Optional[CachedDecision]:
+        row = self._db.execute(
+            "SELECT payload, idempotent, created_at FROM decisions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return CachedDecision(payload=json.loads(row[0]), idempotent=bool(row[1]), created_at=row[2])
+
+_default_cache: Optional[DecisionCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_decision_cache() -> Optional[DecisionCache]:
+    """The process-wide decision cache, or None when disabled via DECISION_CACHE_ENABLED."""
+    global _default_cache
+    if not DECISION_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = DecisionCache()
+    return _default_cache
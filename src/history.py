@@ -0,0 +1,129 @@
+# src/history.py
+
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.spec_index import estimate_tokens
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+HISTORY_DATA_PREVIEW_CHARS = int(os.getenv("HISTORY_DATA_PREVIEW_CHARS", "1500"))
+HISTORY_MAX_RECORDS = 500
+
+# --- Data Summaries ---
+
+def _truncated_json(value: Any, max_chars: int) -> str:
+    """JSON for `value`, cut at `max_chars`. Lists are encoded item by item so huge ones are never dumped whole."""
+    if not isinstance(value, list):
+        text = json.dumps(value, default=str, separators=(",", ":"))
+        return text if len(text) <= max_chars else text[:max_chars] + "...(truncated)"
+    parts, used = [], 2
+    for item in value:
+        encoded = json.dumps(item, default=str, separators=(",", ":"))
+        if used + len(encoded) + 1 > max_chars:
+            if not parts:
+                return f"[{encoded[:max_chars]}...(truncated)"
+            return f"[{','.join(parts)},...] ({len(value) - len(parts)} more items not shown)"
+        parts.append(encoded)
+        used += len(encoded) + 1
+    return "[" + ",".join(parts) + "]"
+
+def summarize_data(data: Any, max_chars: int = HISTORY_DATA_PREVIEW_CHARS) -> str:
+    """A bounded description of an API result for the model: its shape plus a truncated preview."""
+    spilled = data.get("spilled") if isinstance(data, dict) else None
+    if spilled:
+        header = f"{data.get('message', 'Large response saved to disk.')} First items:"
+        sample = spilled.get("preview") or []
+    elif isinstance(data, list):
+        header = f"A list of {len(data)} items"
+        if data and isinstance(data[0], dict):
+            header += f" with fields {', '.join(map(str, list(data[0])[:20]))}"
+        header += "."
+        sample = data
+    else:
+        header, sample = "", data
+    return f"{header} {_truncated_json(sample, max_chars)}".strip()
+
+# --- History ---
+
+class HistoryRecord:
+    """One chat message as the model sees it. The text and its token estimate are computed once."""
+    __slots__ = ("role", "content", "text", "tokens")
+
+    def __init__(self, role: str, content: Optional[str], data: Any = None):
+        self.role = role
+        self.content = content or ""
+        self.text = self.content
+        if data is not None:
+            self.text += f"\nResult data: {summarize_data(data)}"
+        self.tokens = estimate_tokens(self.text)
+
+    def __repr__(self) -> str:
+        return f"HistoryRecord(role={self.role!r}, tokens={self.tokens})"
+
+    def to_list(self) -> List[Any]:
+        return [self.role, self.content, self.text, self.tokens]
+
+    @classmethod
+    def from_list(cls, values: List[Any]) -> "HistoryRecord":
+        """A record restored from to_list(), without summarizing its data again."""
+        record = cls.__new__(cls)
+        record.role, record.content, record.text, record.tokens = values
+        return record
+
+class ChatHistory:
+    """
+    The compact, model-facing side of a conversation. The UI keeps full messages (with result data);
+    this keeps only bounded summaries and selects the most recent records that fit a token budget.
+    """
+
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET, max_records: int = HISTORY_MAX_RECORDS):
+        self.token_budget = token_budget
+        self.max_records = max_records
+        self._records: List[HistoryRecord] = []
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[Dict[str, Any]], **kwargs) -> "ChatHistory":
+        history = cls(**kwargs)
+        for message in messages:
+            history.append(message.get("role", "user"), message.get("content"), message.get("data"))
+        return history
+
+    @classmethod
+    def from_records(cls, records: Iterable[List[Any]], **kwargs) -> "ChatHistory":
+        history = cls(**kwargs)
+        history._records = [HistoryRecord.from_list(values) for values in records][-history.max_records:]
+        return history
+
+    def to_records(self) -> List[List[Any]]:
+        """The records in JSON-friendly form, so a stored session does not rebuild them from its messages."""
+        return [record.to_list() for record in self._records]
+
+    def append(self, role: str, content: Optional[str], data: Any = None) -> HistoryRecord:
+        record = HistoryRecord(role, content, data)
+        self._records.append(record)
+        if len(self._records) > self.max_records:
+            del self._records[:len(self._records) - self.max_records]
+        return record
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def context(self, token_budget: Optional[int] = None, skip_last: int = 0) -> List[HistoryRecord]:
+        """
+        The newest records (oldest first) whose combined size fits `token_budget`, ignoring the last
+        `skip_last` records (e.g. the prompt being answered). The newest record is always included.
+        """
+        budget = self.token_budget if token_budget is None else token_budget
+        end = len(self._records) - skip_last
+        selected: List[HistoryRecord] = []
+        used = 0
+        for record in reversed(self._records[:max(end, 0)]):
+            if not record.text:
+                continue
+            if selected and used + record.tokens > budget:
+                break
+            selected.append(record)
+            used += record.tokens
+        selected.reverse()
+        return selected
@@ -1,32 +1,319 @@
 # src/llm_agent.py
 
 from pydantic_ai import Agent
+from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, SystemPromptPart, UserPromptPart, TextPart
 from pydantic_ai.models.openai import OpenAIModel
-from src.tools import AgentDecision # Import the new Union type
+from src.tools import AgentDecision, APIRequest, APIPlan, Question # Import the new Union type
+from src.decision_cache import get_decision_cache
+from src.history import HistoryRecord
+from src.metrics import record_usage, registry, span
+from src.operation_model import OperationModel, get_operation_model
+from src.spec_index import get_spec_index, spec_hash, estimate_tokens, DEFAULT_TOP_K
+from pydantic import ValidationError
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, List, Optional, Sequence, Tuple
+import hashlib
 import json
+import logging
+import os
+import time
 
-def get_cognitive_agent(api_spec: str, chat_history: str):
+logger = logging.getLogger(__name__)
+
+# Specs whose compact form fits this budget are embedded whole in the (cacheable) system prompt;
+# larger ones are retrieved per turn and sent with the user prompt instead.
+SPEC_PROMPT_TOKEN_BUDGET = int(os.getenv("SPEC_PROMPT_TOKEN_BUDGET", "6000"))
+AGENT_CACHE_SIZE = 16
+# How many earlier messages take part in the decision-cache key.
+DECISION_HISTORY_MESSAGES = 2
+# Decisions that fail validation against the spec go back to the model at most this many times.
+DECISION_REPAIR_TURNS = int(os.getenv("DECISION_REPAIR_TURNS", "2"))
+
+INSTRUCTIONS = (
+    "You are an expert AI assistant that translates user requests into structured actions. "
+    "You have three possible actions: ask a question, formulate an API call, or formulate a plan of several API calls.\n\n"
+    "1.  **Analyze the Conversation**: Review the user's latest request in the context of the previous messages and the API specification.\n"
+    "2.  **Check for Completeness**: Does the user's request contain ALL the necessary information (e.g., all required fields for a JSON payload) to make a valid API call according to the spec?\n"
+    "3.  **DECIDE YOUR ACTION**:\n"
+    "    -   If the request is INCOMPLETE, you MUST respond with a `Question` object. Ask for the specific missing fields.\n"
+    "    -   If the request is COMPLETE and needs one call, you MUST respond with an `APIRequest` object.\n"
+    "    -   If the request is COMPLETE and needs several calls, respond with an `APIPlan` object. Give each step a short `id`; "
+    "list in `depends_on` the steps whose output it uses and reference that output as `{{step_id.field}}` "
+    "(e.g. `{{create_user.id}}` or `{{users.0.id}}`). Steps without dependencies run concurrently.\n\n"
+    "Never make up data for fields. Always ask if information is missing.\n\n"
+    "The API specification is given as one signature per operation: `METHOD /path path(...) query(...) body(Type) -> ResponseType`. "
+    "Fields and parameters marked with `?` are optional; shared schemas are listed once under SCHEMAS.\n"
+)
+
+_model: Optional[OpenAIModel] = None
+
+def _get_model() -> OpenAIModel:
+    global _model
+    if _model is None:
+        _model = OpenAIModel('gpt-4o')
+    return _model
+
+def select_spec_context(api_spec: str, query: str, top_k: int = DEFAULT_TOP_K) -> str:
     """
-    Initializes the main cognitive agent with the API spec and conversation history.
+    Returns the spec fragments relevant to this turn: the top-k operations retrieved for the
+    query, so the prompt stays bounded however large the spec is.
     """
-    system_prompt = (
-        "You are an expert AI assistant that translates user requests into structured actions. "
-        "You have two possible actions: ask a question, or formulate an API call.\n\n"
-        "1.  **Analyze the Conversation**: Review the user's latest request in the context of the recent chat history and the API specification provided below.\n"
-        "2.  **Check for Completeness**: Does the user's request contain ALL the necessary information (e.g., all required fields for a JSON payload) to make a valid API call according to the spec?\n"
-        "3.  **DECIDE YOUR ACTION**:\n"
-        "    -   If the request is INCOMPLETE, you MUST respond with a `Question` object. Ask for the specific missing fields.\n"
-        "    -   If the request is COMPLETE, you MUST respond with an `APIRequest` object.\n\n"
-        "Never make up data for fields. Always ask if information is missing.\n\n"
-        "--- RECENT CHAT HISTORY ---\n"
-        f"{chat_history}\n\n"
-        "--- API SPECIFICATION ---\n"
-        f"{api_spec}\n"
-        "--- END OF CONTEXT ---"
+    index = get_spec_index(api_spec)
+    if index is None:
+        return api_spec
+    context, stats = index.build_context(query, k=top_k)
+    logger.info(
+        f"Spec context: {stats['operations_selected']}/{stats['operations_total']} operations, "
+        f"~{stats['context_tokens']} tokens (saved ~{stats['tokens_saved']} of {stats['full_spec_tokens']})"
     )
-    
-    return Agent(
-        model=OpenAIModel('gpt-4o'),
+    return context
+
+def _history_hash(history: Sequence[HistoryRecord]) -> str:
+    recent = [(r.role, r.content) for r in history[-DECISION_HISTORY_MESSAGES:]]
+    return hashlib.sha256(json.dumps(recent).encode()).hexdigest()
+
+_DECISION_TYPES = {"APIRequest": APIRequest, "APIPlan": APIPlan, "Question": Question}
+
+def _is_idempotent(decision: Any) -> bool:
+    if isinstance(decision, APIRequest):
+        return decision.method == "GET"
+    if isinstance(decision, APIPlan):
+        return all(step.method == "GET" for step in decision.steps)
+    return True
+
+def _repair_prompt(errors: List[str]) -> str:
+    return (
+        "Your last decision does not match the API specification:\n- " + "\n- ".join(errors) + "\n"
+        "Return a corrected decision that uses only the operations, parameters and fields in the specification. "
+        "If the user has not given the information needed, respond with a `Question` instead."
+    )
+
+def _fallback_question(errors: List[str]) -> Question:
+    """Asked instead of a decision that could not be made valid, so nothing invalid is sent or confirmed."""
+    return Question(question_to_user=(
+        "I could not put together a valid API call for this:\n- " + "\n- ".join(errors)
+        + "\nCould you clarify or give the missing details?"
+    ))
+
+def _output_errors(error: ValidationError, limit: int = 5) -> List[str]:
+    """The first problems with a structured answer that is not a valid decision, for a repair turn."""
+    return [f"{'.'.join(map(str, e['loc'])) or 'answer'}: {e['msg']}" for e in error.errors()[:limit]]
+
+@dataclass
+class DecisionUpdate:
+    """One step of a streamed turn: a partial decision while `done` is False, then the final one."""
+    decision: Optional[AgentDecision]
+    done: bool = False
+    from_cache: bool = False
+    ttft: Optional[float] = None  # seconds until the first partial decision was available
+    total: Optional[float] = None  # seconds for the whole turn, set on the final update
+
+@dataclass
+class CognitiveAgent:
+    """A long-lived agent for one (base URL, spec) pair with a stable, cache-friendly system prompt."""
+    agent: Agent
+    system_prompt: str
+    api_spec: str
+    spec_key: str
+    spec_inline: bool
+    operations: Optional[OperationModel] = None
+
+    def build_prompt(self, user_prompt: str, history: Sequence[HistoryRecord]) -> str:
+        """The per-turn user prompt; carries the retrieved operations when the spec is not inlined."""
+        if self.spec_inline:
+            return user_prompt
+        recent_user_text = " ".join(r.content for r in history[-4:] if r.role == "user")
+        # The current prompt is repeated so it outweighs older turns in retrieval.
+        spec_context = select_spec_context(self.api_spec, f"{user_prompt} {user_prompt} {recent_user_text}")
+        return (
+            "--- API SPECIFICATION (relevant operations) ---\n"
+            f"{spec_context}\n"
+            "--- END OF SPECIFICATION ---\n\n"
+            f"{user_prompt}"
+        )
+
+    def message_history(self, history: Sequence[HistoryRecord]) -> List[ModelMessage]:
+        """Converts history records into model messages, led by the agent's system prompt."""
+        messages: List[ModelMessage] = [ModelRequest(parts=[SystemPromptPart(content=self.system_prompt)])]
+        for record in history:
+            if not record.text:
+                continue
+            if record.role == "user":
+                messages.append(ModelRequest(parts=[UserPromptPart(content=record.text)]))
+            else:
+                messages.append(ModelResponse(parts=[TextPart(content=record.text)]))
+        return messages
+
+    async def run(self, user_prompt: str, history: Sequence[HistoryRecord]):
+        """Runs one turn; `history` holds the earlier chat records selected for context, oldest first."""
+        with span("llm.call", mode="run", spec_inline=self.spec_inline):
+            result = await self.agent.run(
+                self.build_prompt(user_prompt, history),
+                message_history=self.message_history(history),
+            )
+            record_usage(result)
+        return result
+
+    def validate(self, decision: Any) -> List[str]:
+        """Problems with an API call or plan against the spec, found locally before anything is sent."""
+        return self.operations.validate_decision(decision) if self.operations is not None else []
+
+    async def _repair(self, errors: List[str], messages: List[ModelMessage]) -> Tuple[AgentDecision, bool]:
+        """
+        Sends validation errors back to the model, continuing the same conversation, until it returns
+        a valid decision. Returns (decision, valid). A decision that is still invalid after
+        DECISION_REPAIR_TURNS is replaced by a Question, so it is neither sent nor put up for confirmation.
+        """
+        for attempt in range(1, DECISION_REPAIR_TURNS + 1):
+            registry.inc("decision_repairs")
+            logger.info(f"Decision failed validation ({'; '.join(errors)}); repair turn {attempt}")
+            with span("llm.call", mode="repair", attempt=attempt):
+                result = await self.agent.run(_repair_prompt(errors), message_history=messages)
+                record_usage(result)
+            decision, messages = result.data, result.all_messages()
+            errors = self.validate(decision)
+            if not errors:
+                return decision, True
+        registry.inc("decision_repair_failures")
+        return _fallback_question(errors), False
+
+    def _cache_key(self, user_prompt: str, history: Sequence[HistoryRecord]) -> Optional[str]:
+        cache = get_decision_cache()
+        return cache.make_key(user_prompt, self.spec_key, _history_hash(history)) if cache else None
+
+    @staticmethod
+    def _cached_decision(key: Optional[str]) -> Optional[AgentDecision]:
+        cache = get_decision_cache()
+        hit = cache.get(key) if cache and key else None
+        if hit is None:
+            return None
+        registry.inc("decision_cache_hits")
+        logger.info(f"Decision cache hit ({hit.payload['type']}); skipping the model")
+        return _DECISION_TYPES[hit.payload["type"]].model_validate(hit.payload["data"])
+
+    @staticmethod
+    def _store_decision(key: Optional[str], decision: Any) -> None:
+        cache = get_decision_cache()
+        if cache and key and type(decision).__name__ in _DECISION_TYPES:
+            cache.put(key, {"type": type(decision).__name__, "data": decision.model_dump()}, _is_idempotent(decision))
+
+    async def decide(self, user_prompt: str, history: Sequence[HistoryRecord]) -> Tuple[AgentDecision, bool]:
+        """
+        Returns (decision, from_cache). Repeated prompts in the same context are answered from the
+        decision cache without calling the model; callers must confirm replayed non-GET requests.
+        """
+        key = self._cache_key(user_prompt, history)
+        cached = self._cached_decision(key)
+        if cached is not None:
+            return cached, True
+
+        result = await self.run(user_prompt, history)
+        decision, valid = result.data, True
+        errors = self.validate(decision)
+        if errors:
+            decision, valid = await self._repair(errors, result.all_messages())
+        if valid:
+            self._store_decision(key, decision)
+        return decision, False
+
+    async def stream_decide(self, user_prompt: str, history: Sequence[HistoryRecord]) -> AsyncIterator[DecisionUpdate]:
+        """
+        Like decide(), but yields partially validated decisions as the model streams its structured
+        output (e.g. a Question's text growing token by token), then a final update with timings.
+        """
+        started = time.perf_counter()
+        key = self._cache_key(user_prompt, history)
+        cached = self._cached_decision(key)
+        if cached is not None:
+            elapsed = time.perf_counter() - started
+            yield DecisionUpdate(cached, done=True, from_cache=True, ttft=elapsed, total=elapsed)
+            return
+
+        ttft = None
+        decision = None
+        final_errors: List[str] = []
+        with span("llm.call", mode="stream", spec_inline=self.spec_inline) as llm_span:
+            async with self.agent.run_stream(
+                self.build_prompt(user_prompt, history),
+                message_history=self.message_history(history),
+            ) as result:
+                async for message, last in result.stream_structured(debounce_by=0.05):
+                    try:
+                        decision = await result.validate_structured_result(message, allow_partial=not last)
+                    except ValidationError as e:
+                        # A partial that does not validate yet is skipped; the final message must.
+                        if last:
+                            decision = None
+                            final_errors = _output_errors(e)
+                        continue
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                        registry.observe("llm_ttft_seconds", ttft)
+                    if not last:
+                        yield DecisionUpdate(decision, ttft=ttft)
+                record_usage(result)
+                messages = result.all_messages()
+            if llm_span is not None:
+                llm_span.set(ttft_s=ttft)
+
+        # The partial updates may have shown an invalid call; the final update carries the repaired one.
+        valid = True
+        if final_errors:
+            decision, valid = await self._repair(final_errors, messages)
+        elif decision is None:
+            # The model streamed no output at all, so there is nothing to repair.
+            registry.inc("decision_repair_failures")
+            decision, valid = _fallback_question(["the model's answer was not a valid API call, plan or question"]), False
+        else:
+            errors = self.validate(decision)
+            if errors:
+                decision, valid = await self._repair(errors, messages)
+        total = time.perf_counter() - started
+        logger.info(f"Agent turn streamed: ttft={ttft if ttft is not None else total:.3f}s total={total:.3f}s")
+        if valid:
+            self._store_decision(key, decision)
+        yield DecisionUpdate(decision, done=True, ttft=ttft if ttft is not None else total, total=total)
+
+_agents: "OrderedDict[Tuple[str, str], CognitiveAgent]" = OrderedDict()
+
+def get_cognitive_agent(base_url: str, api_spec: str, spec_compact: Optional[str] = None) -> CognitiveAgent:
+    """
+    Returns the agent for this API, built once per (base URL, spec hash). The system prompt holds
+    only the instructions and, when it fits the budget, the compact spec, so it stays identical
+    across turns and can be served from the provider's prompt cache. Pass the compact form cached
+    with the spec (ApiClient.spec_compact) as `spec_compact`; it is only rendered here if missing.
+    """
+    key = (base_url, spec_hash(api_spec))
+    cached = _agents.get(key)
+    if cached is not None:
+        _agents.move_to_end(key)
+        return cached
+
+    compact = spec_compact
+    if compact is None:
+        index = get_spec_index(api_spec)
+        compact = index.compactor.render() if index is not None else api_spec
+    spec_inline = estimate_tokens(compact) <= SPEC_PROMPT_TOKEN_BUDGET
+    if spec_inline:
+        system_prompt = INSTRUCTIONS + "\n--- API SPECIFICATION ---\n" + compact + "\n--- END OF SPECIFICATION ---"
+    else:
+        system_prompt = INSTRUCTIONS + "\nThe operations relevant to each request are provided with the request."
+    logger.info(f"Creating agent for {base_url} (spec inlined: {spec_inline})")
+
+    cognitive = CognitiveAgent(
+        agent=Agent(
+            model=_get_model(),
+            system_prompt=system_prompt,
+            result_type=AgentDecision # The agent must choose between an APIRequest, an APIPlan or a Question
+        ),
         system_prompt=system_prompt,
-        result_type=AgentDecision # The agent must choose between an APIRequest or a Question
-    )
\ No newline at end of file
+        api_spec=api_spec,
+        spec_key=key[1],
+        spec_inline=spec_inline,
+        operations=get_operation_model(api_spec),
+    )
+    _agents[key] = cognitive
+    if len(_agents) > AGENT_CACHE_SIZE:
+        _agents.popitem(last=False)
+    return cognitive
@@ -0,0 +1,318 @@
+# src/metrics.py
+
+import functools
+import inspect
+import json
+import logging
+import math
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_SPAN_BUFFER = int(os.getenv("METRICS_SPAN_BUFFER", "5000"))
+METRICS_EXPORT_DIR = os.getenv("METRICS_EXPORT_DIR", "metrics")
+# Recent observations kept per histogram for exact percentiles; the buckets cover all of them.
+HISTOGRAM_SAMPLES = 2048
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SERVICE_NAME = "cognitive-api-agent"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# --- Spans ---
+
+@dataclass
+class Span:
+    """One timed operation. Times are epoch seconds so spans can be exported as OpenTelemetry data."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start: float = 0.0
+    end: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return max(self.end - self.start, 0.0)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def _new_span(name: str, attributes: Dict[str, Any], start: float) -> Span:
+    parent = _current_span.get()
+    return Span(
+        name=name,
+        trace_id=parent.trace_id if parent else secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        start=start,
+        attributes=attributes,
+    )
+
+# --- Histograms ---
+
+class Histogram:
+    """Prometheus-style cumulative buckets plus a window of recent samples for percentiles."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.samples: Deque[float] = deque(maxlen=HISTOGRAM_SAMPLES)
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, max(math.ceil(q / 100 * len(ordered)) - 1, 0))]
+
+# --- Registry ---
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class MetricsRegistry:
+    """Process-wide store of counters, histograms and recently finished spans."""
+
+    def __init__(self, span_buffer: int = METRICS_SPAN_BUFFER):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._spans: Deque[Span] = deque(maxlen=span_buffer)
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def record_span(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+        self.observe("span_duration_seconds", span.duration, span=span.name)
+        if span.error:
+            self.inc("span_errors", span=span.name)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._spans.clear()
+
+    # --- Queries ---
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        with self._lock:
+            return [s for s in self._spans if trace_id is None or s.trace_id == trace_id]
+
+    def last_trace(self, root_name: str) -> List[Span]:
+        """The spans of the most recent finished trace whose root span is `root_name`, in start order."""
+        with self._lock:
+            root = next((s for s in reversed(self._spans) if s.name == root_name and s.parent_id is None), None)
+            if root is None:
+                return []
+            return sorted((s for s in self._spans if s.trace_id == root.trace_id), key=lambda s: s.start)
+
+    def counters(self) -> Dict[str, float]:
+        with self._lock:
+            return {name + _format_labels(labels): value for (name, labels), value in sorted(self._counters.items())}
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """One row per histogram with count, mean and p50/p95/p99 in milliseconds."""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            rows = []
+            for (name, labels), h in items:
+                row: Dict[str, Any] = {"metric": name + _format_labels(labels), "count": h.count,
+                                       "mean_ms": round(h.sum / h.count * 1000, 2) if h.count else None}
+                for q in (50, 95, 99):
+                    p = h.percentile(q)
+                    row[f"p{q}_ms"] = round(p * 1000, 2) if p is not None else None
+                rows.append(row)
+        return rows
+
+    # --- Export ---
+
+    def prometheus(self) -> str:
+        """The Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name}_total counter")
+                    seen.add(name)
+                lines.append(f"{name}_total{_format_labels(labels)} {value:g}")
+            for (name, labels), h in sorted(self._histograms.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} histogram")
+                    seen.add(name)
+                cumulative = 0
+                for bound, count in zip(h.buckets + (math.inf,), h.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else f"{bound:g}"
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {h.sum:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def otlp(self) -> Dict[str, Any]:
+        """Finished spans in the OTLP/JSON trace format, e.g. for `otel-cli` or a collector's file receiver."""
+
+        def attribute(key: str, value: Any) -> Dict[str, Any]:
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        spans = []
+        for s in self.spans():
+            span = {
+                "traceId": s.trace_id, "spanId": s.span_id, "name": s.name, "kind": 1,
+                "startTimeUnixNano": str(int(s.start * 1e9)), "endTimeUnixNano": str(int(s.end * 1e9)),
+                "attributes": [attribute(k, v) for k, v in s.attributes.items() if v is not None],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            }
+            if s.parent_id:
+                span["parentSpanId"] = s.parent_id
+            spans.append(span)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": spans}],
+        }]}
+
+    def write_exports(self, directory: str = METRICS_EXPORT_DIR) -> Tuple[str, str]:
+        """Writes metrics.prom and traces.otlp.json to `directory` and returns their paths."""
+        os.makedirs(directory, exist_ok=True)
+        prom_path = os.path.join(directory, "metrics.prom")
+        otlp_path = os.path.join(directory, "traces.otlp.json")
+        with open(prom_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        with open(otlp_path, "w", encoding="utf-8") as f:
+            json.dump(self.otlp(), f)
+        return prom_path, otlp_path
+
+registry = MetricsRegistry()
+
+# --- Instrumentation Helpers ---
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Times the enclosed block as a child of the current span. Works in sync and async code; the
+    current span follows contextvars, so it carries over into tasks and AsyncRunner calls.
+    """
+    if not METRICS_ENABLED:
+        yield None
+        return
+    s = _new_span(name, attributes, time.time())
+    started = time.perf_counter()
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            pass  # an async generator finalized from another context; nothing to restore there
+        s.end = s.start + (time.perf_counter() - started)
+        registry.record_span(s)
+
+def record_span(name: str, start: float, end: float, **attributes: Any) -> None:
+    """Records an already finished operation (epoch start/end) as a child of the current span."""
+    if not METRICS_ENABLED:
+        return
+    s = _new_span(name, attributes, start)
+    s.end = end
+    registry.record_span(s)
+
+def traced(kind: str) -> Callable[[Callable], Callable]:
+    """Decorator that wraps each call of a sync or async function in a span named '<kind>.<function>'."""
+
+    def decorate(function: Callable) -> Callable:
+        name = f"{kind}.{function.__name__}"
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+def record_usage(run_result: Any, **labels: Any) -> None:
+    """Adds the token usage of a pydantic-ai run (or streamed run) to the counters and the current span."""
+    if not METRICS_ENABLED:
+        return
+    usage_fn = getattr(run_result, "usage", None) or getattr(run_result, "cost", None)
+    try:
+        usage = usage_fn() if callable(usage_fn) else None
+    except Exception as e:
+        logger.debug(f"Could not read token usage: {e}")
+        return
+    if usage is None:
+        return
+    tokens = {
+        "input": getattr(usage, "request_tokens", None),
+        "output": getattr(usage, "response_tokens", None),
+    }
+    for kind, value in tokens.items():
+        if value:
+            registry.inc("llm_tokens", value, kind=kind, **labels)
+    registry.inc("llm_requests", getattr(usage, "requests", None) or 1, **labels)
+    s = current_span()
+    if s is not None:
+        s.set(input_tokens=tokens["input"], output_tokens=tokens["output"])
@@ -0,0 +1,416 @@
+# src/operation_model.py
+
+import difflib
+import json
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+from src.spec_index import split_operations, spec_hash
+from src.tools import APIRequest, APIPlan
+
+logger = logging.getLogger(__name__)
+
+MODEL_CACHE_SIZE = 16
+MAX_ERRORS = 10
+
+# --- Schema Validators ---
+# A JSON Schema subset (type, enum, bounds, pattern, properties/required/additionalProperties, items,
+# allOf/anyOf/oneOf, nullable) compiled once into closures. Each appends readable messages to
+# `errors` and returns False when later checks on the same value would be meaningless.
+
+Check = Callable[[Any, str, List[str]], bool]
+Validator = Callable[[Any, str, List[str]], None]
+
+def _accept(value: Any, where: str, errors: List[str]) -> None:
+    return None
+
+def _is_placeholder(value: Any) -> bool:
+    """Plan steps reference earlier outputs as '{{step.field}}'; those are only known at run time."""
+    return isinstance(value, str) and "{{" in value
+
+def _type_matches(value: Any, type_name: str) -> bool:
+    if type_name == "integer":
+        return (isinstance(value, int) and not isinstance(value, bool)) or (isinstance(value, float) and value.is_integer())
+    if type_name == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if type_name == "string":
+        return isinstance(value, str)
+    if type_name == "boolean":
+        return isinstance(value, bool)
+    if type_name == "array":
+        return isinstance(value, list)
+    if type_name == "object":
+        return isinstance(value, dict)
+    return True
+
+def _coerce(value: Any, type_name: str) -> Any:
+    """Query and path values travel as text; '20' is a fine integer there."""
+    if not isinstance(value, str):
+        return value
+    try:
+        if type_name == "integer":
+            return int(value)
+        if type_name == "number":
+            return float(value)
+    except ValueError:
+        return value
+    if type_name == "boolean" and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    return value
+
+def _short(value: Any) -> str:
+    text = json.dumps(value, default=str)
+    return text if len(text) <= 40 else text[:37] + "..."
+
+def compile_schema(schema: Any, coerce: bool = False) -> Validator:
+    """Compiles a (resolved) schema. With `coerce`, string values are read as the schema's scalar type."""
+    if not isinstance(schema, dict) or "$ref" in schema:
+        return _accept  # unresolvable or recursive reference: nothing to check against
+    checks: List[Check] = []
+    raw_type = schema.get("type")
+    types = [t for t in raw_type if t != "null"] if isinstance(raw_type, list) else ([raw_type] if raw_type else [])
+    nullable = bool(schema.get("nullable")) or (isinstance(raw_type, list) and "null" in raw_type)
+
+    if types:
+        def check_type(value: Any, where: str, errors: List[str]) -> bool:
+            if any(_type_matches(_coerce(value, t) if coerce else value, t) for t in types):
+                return True
+            errors.append(f"{where}: expected {' or '.join(types)}, got {_short(value)}")
+            return False
+        checks.append(check_type)
+
+    def scalar(value: Any) -> Any:
+        return _coerce(value, types[0]) if coerce and types else value
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+
+        def check_enum(value: Any, where: str, errors: List[str]) -> bool:
+            if scalar(value) not in allowed and value not in allowed:
+                errors.append(f"{where}: must be one of {allowed[:10]}, got {_short(value)}")
+            return True
+        checks.append(check_enum)
+
+    minimum, maximum = schema.get("minimum"), schema.get("maximum")
+    if minimum is not None or maximum is not None:
+        def check_range(value: Any, where: str, errors: List[str]) -> bool:
+            number = scalar(value)
+            if isinstance(number, (int, float)) and not isinstance(number, bool):
+                if minimum is not None and number < minimum:
+                    errors.append(f"{where}: must be >= {minimum}, got {number}")
+                if maximum is not None and number > maximum:
+                    errors.append(f"{where}: must be <= {maximum}, got {number}")
+            return True
+        checks.append(check_range)
+
+    min_length, max_length = schema.get("minLength"), schema.get("maxLength")
+    pattern = None
+    if isinstance(schema.get("pattern"), str):
+        try:
+            pattern = re.compile(schema["pattern"])
+        except re.error:
+            pattern = None
+    if min_length is not None or max_length is not None or pattern is not None:
+        def check_string(value: Any, where: str, errors: List[str]) -> bool:
+            if isinstance(value, str):
+                if min_length is not None and len(value) < min_length:
+                    errors.append(f"{where}: must be at least {min_length} characters")
+                if max_length is not None and len(value) > max_length:
+                    errors.append(f"{where}: must be at most {max_length} characters")
+                if pattern is not None and not pattern.search(value):
+                    errors.append(f"{where}: must match pattern {pattern.pattern!r}")
+            return True
+        checks.append(check_string)
+
+    properties = {name: compile_schema(sub) for name, sub in (schema.get("properties") or {}).items()}
+    # (A Swagger 2 parameter used as its own schema has a boolean 'required'.)
+    required = [name for name in schema["required"] if isinstance(name, str)] \
+        if isinstance(schema.get("required"), list) else []
+    additional = schema.get("additionalProperties", True)
+    extra = compile_schema(additional) if isinstance(additional, dict) else None
+    if properties or required or additional is False or extra is not None:
+        def check_object(value: Any, where: str, errors: List[str]) -> bool:
+            if not isinstance(value, dict):
+                return True
+            for name in required:
+                if name not in value:
+                    errors.append(f"{where}: missing required field '{name}'")
+            for name, item in value.items():
+                validator = properties.get(name)
+                if validator is not None:
+                    validator(item, f"{where}.{name}", errors)
+                elif additional is False:
+                    known = ", ".join(properties) or "none"
+                    errors.append(f"{where}: unknown field '{name}' (known fields: {known})")
+                elif extra is not None:
+                    extra(item, f"{where}.{name}", errors)
+            return True
+        checks.append(check_object)
+
+    if isinstance(schema.get("items"), dict):
+        item_validator = compile_schema(schema["items"])
+
+        def check_items(value: Any, where: str, errors: List[str]) -> bool:
+            if isinstance(value, list):
+                for i, item in enumerate(value):
+                    item_validator(item, f"{where}[{i}]", errors)
+            return True
+        checks.append(check_items)
+
+    for name in ("allOf", "anyOf", "oneOf"):
+        branches = [compile_schema(sub) for sub in schema.get(name) or [] if isinstance(sub, dict)]
+        if not branches:
+            continue
+        if name == "allOf":
+            def check_all(value: Any, where: str, errors: List[str], branches=branches) -> bool:
+                for branch in branches:
+                    branch(value, where, errors)
+                return True
+            checks.append(check_all)
+        else:
+            def check_any(value: Any, where: str, errors: List[str], branches=branches) -> bool:
+                attempts = []
+                for branch in branches:
+                    branch_errors: List[str] = []
+                    branch(value, where, branch_errors)
+                    if not branch_errors:
+                        return True
+                    attempts.append(branch_errors)
+                # Report the alternative that came closest.
+                errors.extend(min(attempts, key=len))
+                return True
+            checks.append(check_any)
+
+    def validate(value: Any, where: str, errors: List[str]) -> None:
+        if value is None:
+            if types and not nullable:
+                errors.append(f"{where}: must not be null")
+            return
+        if _is_placeholder(value):
+            return
+        for check in checks:
+            if not check(value, where, errors):
+                return
+
+    return validate if checks else _accept
+
+# --- Operations ---
+
+@dataclass
+class CompiledOperation:
+    """One (method, path) with validators for its path parameters, query parameters and JSON body."""
+    method: str
+    path: str
+    path_params: Dict[str, Validator] = field(default_factory=dict)
+    query_params: Dict[str, Tuple[bool, Validator]] = field(default_factory=dict)  # name -> (required, validator)
+    body: Optional[Validator] = None
+    body_required: bool = False
+    accepts_body: bool = False
+
+    @classmethod
+    def from_fragment(cls, method: str, path: str, fragment: Dict[str, Any]) -> "CompiledOperation":
+        op = cls(method=method.upper(), path=path)
+        for param in fragment.get("parameters") or []:
+            if not isinstance(param, dict) or not param.get("name"):
+                continue
+            location = param.get("in")
+            # OpenAPI 3 puts the schema under 'schema'; Swagger 2 describes it on the parameter itself.
+            schema = param.get("schema") if isinstance(param.get("schema"), dict) else param
+            if location == "path":
+                op.path_params[param["name"]] = compile_schema(schema, coerce=True)
+            elif location == "query":
+                op.query_params[param["name"]] = (bool(param.get("required")), compile_schema(schema, coerce=True))
+            elif location == "body":
+                op.accepts_body = True
+                op.body_required = bool(param.get("required"))
+                op.body = compile_schema(param.get("schema"))
+        request_body = fragment.get("requestBody")
+        if isinstance(request_body, dict):
+            op.accepts_body = True
+            op.body_required = bool(request_body.get("required"))
+            content = request_body.get("content") or {}
+            json_media = next((media for media_type, media in content.items() if "json" in media_type), None)
+            if isinstance(json_media, dict):
+                op.body = compile_schema(json_media.get("schema"))
+        return op
+
+    def validate(self, path_values: Dict[str, str], params: Optional[Dict[str, Any]],
+                 payload: Optional[Dict[str, Any]]) -> List[str]:
+        errors: List[str] = []
+        for name, value in path_values.items():
+            if re.fullmatch(r"\{[^{}]*\}", value):
+                errors.append(f"path parameter '{name}' is not filled in; put its value in the endpoint")
+                continue
+            validator = self.path_params.get(name)
+            if validator is not None:
+                validator(value, f"path parameter '{name}'", errors)
+
+        params = params or {}
+        for name, (required, validator) in self.query_params.items():
+            if name in params:
+                validator(params[name], f"query parameter '{name}'", errors)
+            elif required:
+                errors.append(f"missing required query parameter '{name}'")
+        unknown = [name for name in params if name not in self.query_params]
+        if unknown:
+            known = ", ".join(self.query_params) or "none"
+            errors.append(f"unknown query parameters {unknown} (known: {known})")
+
+        if payload is not None and not self.accepts_body:
+            errors.append(f"{self.method} {self.path} takes no request body")
+        elif payload is None and self.body_required:
+            errors.append(f"{self.method} {self.path} requires a JSON body")
+        elif payload is not None and self.body is not None:
+            self.body(payload, "body", errors)
+        return errors
+
+class _PathTemplate:
+    """A spec path compiled to a regex; '{name}' segments capture one path segment each."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.names: List[str] = []
+        parts = []
+        for segment in path.strip("/").split("/") if path.strip("/") else []:
+            pieces = re.split(r"(\{[^/{}]+\})", segment)
+            regex = ""
+            for piece in pieces:
+                if piece.startswith("{") and piece.endswith("}"):
+                    self.names.append(piece[1:-1])
+                    regex += "([^/]+)"
+                else:
+                    regex += re.escape(piece)
+            parts.append(regex)
+        self.segment_count = len(parts)
+        first = path.strip("/").split("/")[0]
+        self.first_literal = first if parts and "{" not in first else None
+        self.literal_segments = sum(1 for segment in path.strip("/").split("/") if "{" not in segment)
+        self.regex = re.compile("^/" + "/".join(parts) + "$")
+        self.operations: Dict[str, CompiledOperation] = {}
+
+    def match(self, path: str) -> Optional[Dict[str, str]]:
+        found = self.regex.match(path)
+        return dict(zip(self.names, found.groups())) if found else None
+
+def _normalize_path(endpoint: str) -> Tuple[str, Dict[str, str]]:
+    """The path of an endpoint (which may be a full URL or carry a query string) and its inline query params."""
+    parsed = urlparse(endpoint)
+    path = parsed.path or "/"
+    if not path.startswith("/"):
+        path = "/" + path
+    if len(path) > 1:
+        path = path.rstrip("/")
+    return path, dict(parse_qsl(parsed.query))
+
+class OperationModel:
+    """
+    Every operation of one spec, parsed once: static paths in a dict, templated paths grouped by
+    segment count and first segment (most literal segments first). validate() checks a request
+    without any I/O.
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        self._static: Dict[str, _PathTemplate] = {}
+        self._templated: Dict[Tuple[int, Optional[str]], List[_PathTemplate]] = {}
+        templates: Dict[str, _PathTemplate] = {}
+        for operation in split_operations(spec):
+            template = templates.get(operation.path)
+            if template is None:
+                template = templates[operation.path] = _PathTemplate(operation.path)
+            template.operations[operation.method.upper()] = CompiledOperation.from_fragment(
+                operation.method, operation.path, operation.fragment)
+        for template in templates.values():
+            if template.names:
+                self._templated.setdefault((template.segment_count, template.first_literal), []).append(template)
+            else:
+                self._static[_normalize_path(template.path)[0]] = template
+        self.paths = sorted(templates)
+        self.operation_count = sum(len(t.operations) for t in templates.values())
+        # Spec paths are relative to the server URL; the agent may include its path prefix.
+        self.base_paths = self._base_paths(spec)
+
+    @staticmethod
+    def _base_paths(spec: Dict[str, Any]) -> List[str]:
+        prefixes = [urlparse(server.get("url", "")).path for server in spec.get("servers") or [] if isinstance(server, dict)]
+        prefixes.append(spec.get("basePath") or "")
+        return sorted({p.rstrip("/") for p in prefixes if p and p.rstrip("/")}, key=len, reverse=True)
+
+    def _candidates(self, path: str) -> List[Tuple[_PathTemplate, Dict[str, str]]]:
+        static = self._static.get(path)
+        matches = [(static, {})] if static else []
+        segments = path.strip("/").split("/") if path.strip("/") else []
+        templates = self._templated.get((len(segments), segments[0] if segments else None), []) \
+            + self._templated.get((len(segments), None), [])
+        for template in sorted(templates, key=lambda t: -t.literal_segments):
+            values = template.match(path)
+            if values is not None:
+                matches.append((template, values))
+        return matches
+
+    def resolve(self, method: str, path: str) -> Tuple[Optional[CompiledOperation], Dict[str, str], Optional[str]]:
+        """Returns (operation, path parameter values, error) for a normalized path."""
+        candidates = self._candidates(path)
+        for prefix in self.base_paths:
+            if not candidates and path.startswith(prefix + "/"):
+                candidates = self._candidates(path[len(prefix):])
+        for template, values in candidates:
+            operation = template.operations.get(method.upper())
+            if operation is not None:
+                return operation, values, None
+        if candidates:
+            allowed = sorted({m for template, _ in candidates for m in template.operations})
+            return None, {}, f"{method.upper()} is not supported on {path} (allowed: {', '.join(allowed)})"
+        close = difflib.get_close_matches(path, self.paths, n=3, cutoff=0.5)
+        hint = f" Did you mean: {', '.join(close)}?" if close else ""
+        return None, {}, f"No operation matches {path}.{hint}"
+
+    def validate(self, method: str, endpoint: str, params: Optional[Dict[str, Any]] = None,
+                 json_payload: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Problems with a request against the spec; empty if it looks valid."""
+        path, inline_params = _normalize_path(endpoint)
+        operation, path_values, error = self.resolve(method, path)
+        if error:
+            return [error]
+        errors = operation.validate(path_values, {**inline_params, **(params or {})}, json_payload)
+        return errors[:MAX_ERRORS]
+
+    def validate_decision(self, decision: Any) -> List[str]:
+        """Validates an APIRequest, or every step of an APIPlan; other decisions are always valid."""
+        if isinstance(decision, APIRequest):
+            return [f"{decision.method} {decision.endpoint}: {e}"
+                    for e in self.validate(decision.method, decision.endpoint, decision.params, decision.json_payload)]
+        if isinstance(decision, APIPlan):
+            errors = []
+            for step in decision.steps:
+                errors.extend(f"step '{step.id}' ({step.method} {step.endpoint}): {e}"
+                              for e in self.validate(step.method, step.endpoint, step.params, step.json_payload))
+            return errors[:MAX_ERRORS]
+        return []
+
+_model_cache: "OrderedDict[str, OperationModel]" = OrderedDict()
+
+def get_operation_model(api_spec: Optional[str]) -> Optional[OperationModel]:
+    """Returns the (cached) operation model for a JSON spec string, or None if it is not a spec with paths."""
+    if not api_spec:
+        return None
+    key = spec_hash(api_spec)
+    model = _model_cache.get(key)
+    if model is not None:
+        _model_cache.move_to_end(key)
+        return model
+    try:
+        spec = json.loads(api_spec)
+    except (TypeError, json.JSONDecodeError):
+        return None
+    if not isinstance(spec, dict) or not spec.get("paths"):
+        return None
+    model = OperationModel(spec)
+    _model_cache[key] = model
+    if len(_model_cache) > MODEL_CACHE_SIZE:
+        _model_cache.popitem(last=False)
+    logger.info(f"Compiled {model.operation_count} API operations for request validation")
+    return model
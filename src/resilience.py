@@ -0,0 +1,135 @@
+# src/resilience.py
+
+import asyncio
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "3"))
+API_RETRY_BASE_DELAY = float(os.getenv("API_RETRY_BASE_DELAY", "0.5"))
+API_RETRY_MAX_DELAY = float(os.getenv("API_RETRY_MAX_DELAY", "10"))
+API_BREAKER_THRESHOLD = int(os.getenv("API_BREAKER_THRESHOLD", "5"))
+API_BREAKER_RESET = float(os.getenv("API_BREAKER_RESET", "30"))
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "10"))  # in-flight requests per base URL
+
+# Methods that may be sent twice without changing the outcome (RFC 9110, section 9.2.2).
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# --- Retries ---
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header given as delay-seconds or an HTTP date; None if absent or invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Exponential backoff with full jitter, honouring the server's Retry-After up to `max_delay`."""
+    max_retries: int = API_MAX_RETRIES
+    base_delay: float = API_RETRY_BASE_DELAY
+    max_delay: float = API_RETRY_MAX_DELAY
+
+    @property
+    def max_attempts(self) -> int:
+        return max(self.max_retries, 0) + 1
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number `attempt + 1`; attempt 0 is the first try."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def delay_for(self, attempt: int, retry_after: Optional[str] = None) -> Optional[float]:
+        """The wait before the next attempt, or None if the server asked for a longer pause than we allow."""
+        requested = parse_retry_after(retry_after)
+        if requested is None:
+            return self.backoff(attempt)
+        return requested if requested <= self.max_delay else None
+
+# --- Circuit Breaker ---
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and then fails calls fast. Once `reset_timeout`
+    has passed it lets one trial call through (half-open); its outcome closes or re-opens it.
+    """
+
+    def __init__(self, threshold: int = API_BREAKER_THRESHOLD, reset_timeout: float = API_BREAKER_RESET):
+        self.threshold = max(threshold, 1)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if now - self._opened_at >= self.reset_timeout:
+            # One trial call per reset period; the timer restarts in case it never reports back.
+            self.state = "half_open"
+            self._opened_at = now
+            return True
+        return False
+
+    def retry_in(self) -> float:
+        return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info("Circuit closed; the API is healthy again")
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_circuit_breaker(base_url: str) -> CircuitBreaker:
+    """The breaker shared by every client talking to `base_url`."""
+    if base_url not in _breakers:
+        _breakers[base_url] = CircuitBreaker()
+    return _breakers[base_url]
+
+# --- Concurrency Limits ---
+
+class ConcurrencyLimiter:
+    """Caps in-flight requests with a semaphore, rebuilt if the event loop changes."""
+
+    def __init__(self, limit: int = API_MAX_CONCURRENCY):
+        self.limit = max(limit, 1)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.limit)
+            self._loop = loop
+        return self._semaphore
+
+_limiters: Dict[str, ConcurrencyLimiter] = {}
+
+def get_concurrency_limiter(base_url: str) -> ConcurrencyLimiter:
+    """The in-flight cap shared by every client talking to `base_url`."""
+    if base_url not in _limiters:
+        _limiters[base_url] = ConcurrencyLimiter()
+    return _limiters[base_url]
@@ -0,0 +1,267 @@
+# src/response_cache.py
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Mapping, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Off unless enabled: the cache is shared by every session of the process, so it only holds
+# responses the API marks as shareable (not 'private' or 'no-store').
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+# Freshness for responses that carry no Cache-Control max-age or Expires header. At 0 they are
+# only kept when they have a validator (ETag/Last-Modified), and revalidated on every use.
+RESPONSE_CACHE_DEFAULT_TTL = float(os.getenv("RESPONSE_CACHE_DEFAULT_TTL", "0"))
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(256 * 1024)))
+RESPONSE_CACHE_SQLITE = os.getenv("RESPONSE_CACHE_SQLITE", "")
+
+# --- HTTP Caching Rules ---
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp() if value else None
+    except (TypeError, ValueError):
+        return None
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    directives: Dict[str, Optional[str]] = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip().strip('"') or None
+    return directives
+
+def freshness_lifetime(headers: Mapping[str, str], default_ttl: float = RESPONSE_CACHE_DEFAULT_TTL) -> Optional[float]:
+    """
+    Seconds the response may be served without revalidation, or None if it must not be stored.
+    This is a shared cache, so 'private' responses are not stored, like 'no-store' ones. 'no-cache'
+    gives 0 (store, but always revalidate); without explicit freshness the default applies.
+    """
+    directives = parse_cache_control(headers.get("cache-control"))
+    if "no-store" in directives or "private" in directives or headers.get("vary", "").strip() == "*":
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    age_header = headers.get("age") or ""
+    age = float(age_header) if age_header.isdigit() else 0.0
+    if directives.get("max-age", "") and directives["max-age"].isdigit():
+        return max(float(directives["max-age"]) - age, 0.0)
+    expires = _http_date(headers.get("expires"))
+    if expires is not None:
+        date = _http_date(headers.get("date")) or time.time()
+        return max(expires - date - age, 0.0)
+    return default_ttl
+
+def _segments(path: str) -> List[str]:
+    return [s for s in urlsplit(path).path.split("/") if s]
+
+# --- Cache ---
+
+@dataclass
+class CachedResponse:
+    """A parsed GET result plus the validators and lifetime needed to serve or revalidate it."""
+    base_url: str
+    path: str
+    result: Any
+    stored_at: float
+    max_age: float
+    elapsed: float  # seconds the original request took; what a hit saves
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    segments: List[str] = field(default_factory=list)
+
+    def is_fresh(self) -> bool:
+        return time.time() - self.stored_at < self.max_age
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+class ResponseCache:
+    """
+    LRU cache of GET results following Cache-Control/Expires and ETag/Last-Modified. Entries are
+    dropped when a write (POST/PUT/PATCH/DELETE) hits the same resource path, its parent or a child.
+    An optional SQLite file backs the in-memory tier.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, default_ttl: float = RESPONSE_CACHE_DEFAULT_TTL,
+                 max_entry_bytes: int = RESPONSE_CACHE_MAX_ENTRY_BYTES, sqlite_path: str = RESPONSE_CACHE_SQLITE):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "invalidations": 0,
+                       "evictions": 0, "saved_seconds": 0.0}
+        self._db: Optional[sqlite3.Connection] = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, base_url TEXT NOT NULL, entry TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_base_url ON responses (base_url)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(method: str, url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        material = "\x1f".join((method.upper(), url, json.dumps(params or {}, sort_keys=True, default=str)))
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    # --- Lookup and Store ---
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Returns the entry, fresh or stale; callers check is_fresh() and revalidate stale ones."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                entry = self._load(key)
+                if entry is not None:
+                    self._remember(key, entry)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def record_hit(self, entry: CachedResponse, revalidated: bool = False) -> None:
+        with self._lock:
+            self._stats["revalidated" if revalidated else "hits"] += 1
+            if not revalidated:
+                self._stats["saved_seconds"] += entry.elapsed
+
+    def store(self, key: str, base_url: str, path: str, result: Any, headers: Mapping[str, str],
+              elapsed: float) -> Optional[CachedResponse]:
+        """
+        Stores a copy of a 200 response if its headers and size allow it; returns the entry or None.
+        The caller keeps `result`: it is only copied once it is known to fit.
+        """
+        max_age = freshness_lifetime(headers, self.default_ttl)
+        etag, last_modified = headers.get("etag"), headers.get("last-modified")
+        if max_age is None or (max_age <= 0 and not (etag or last_modified)):
+            return None
+        encoded = json.dumps(result, separators=(",", ":"), default=str)
+        if len(encoded) > self.max_entry_bytes:
+            return None
+        entry = CachedResponse(
+            base_url=base_url, path=urlsplit(path).path, result=copy.deepcopy(result), stored_at=time.time(), max_age=max_age,
+            elapsed=elapsed, etag=etag, last_modified=last_modified, segments=_segments(path),
+        )
+        with self._lock:
+            self._remember(key, entry)
+            self._stats["stores"] += 1
+            self._persist(key, entry)
+        return entry
+
+    def refresh(self, key: str, entry: CachedResponse, headers: Mapping[str, str]) -> None:
+        """Restarts an entry's lifetime after a 304 Not Modified."""
+        max_age = freshness_lifetime(headers, self.default_ttl)
+        with self._lock:
+            if max_age is None:
+                self._forget(key)
+                return
+            entry.stored_at = time.time()
+            entry.max_age = max_age
+            entry.etag = headers.get("etag") or entry.etag
+            self._persist(key, entry)
+
+    def invalidate(self, base_url: str, path: str) -> int:
+        """
+        Drops entries for `path`, its ancestors (e.g. the collection listing) and its descendants.
+        Returns how many were removed.
+        """
+        written = _segments(path)
+        if not written:
+            return 0
+
+        def related(entry: CachedResponse) -> bool:
+            shorter = min(len(written), len(entry.segments))
+            return entry.base_url == base_url and shorter > 0 and entry.segments[:shorter] == written[:shorter]
+
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if related(entry)]
+            if self._db is not None:
+                rows = self._db.execute("SELECT key, entry FROM responses WHERE base_url = ?", (base_url,)).fetchall()
+                stale += [key for key, raw in rows
+                          if key not in self._entries and related(CachedResponse(**json.loads(raw)))]
+            for key in stale:
+                self._forget(key)
+            self._stats["invalidations"] += len(stale)
+        if stale:
+            logger.info(f"Response cache: write to {path} invalidated {len(stale)} entries")
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries))
+        lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["revalidated"]) / lookups, 3) if lookups else 0.0
+        stats["saved_seconds"] = round(stats["saved_seconds"], 3)
+        return stats
+
+    # --- Internals (callers hold the lock) ---
+
+    def _remember(self, key: str, entry: CachedResponse) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _forget(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _persist(self, key: str, entry: CachedResponse) -> None:
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses (key, base_url, entry, stored_at) VALUES (?, ?, ?, ?)",
+            (key, entry.base_url, json.dumps(asdict(entry), default=str), entry.stored_at),
+        )
+        self._db.execute(
+            "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY stored_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+        self._db.commit()
+
+    def _load(self, key: str) -> Optional[CachedResponse]:
+        row = self._db.execute("SELECT entry FROM responses WHERE key = ?", (key,)).fetchone()
+        return CachedResponse(**json.loads(row[0])) if row else None
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """The process-wide response cache, or None when disabled via RESPONSE_CACHE_ENABLED."""
+    global _default_cache
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+    return _default_cache
@@ -0,0 +1,94 @@
+# src/results.py
+
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.spill import SPILL_PREVIEW_ITEMS
+
+# --- Stored Results ---
+# Sessions kept in a database do not carry large API results in their state. A result whose JSON
+# exceeds RESULT_INLINE_CHARS, or a response spilled to a local file, is stored once, in chunks,
+# next to the session; the message keeps a stand-in shaped like a spilled response (format, bytes,
+# items, preview) but without a path. Pages are then read from the stored chunks, the same way
+# read_spill_page reads a spill file, by whichever worker serves the request.
+
+RESULT_INLINE_CHARS = int(os.getenv("SESSION_RESULT_INLINE_CHARS", "20000"))
+RESULT_CHUNK_ITEMS = 500
+RESULT_CHUNK_CHARS = 50_000
+# A page of a raw (non-array) result is page_size * 100 characters, as for spill files.
+RAW_PAGE_CHARS_PER_ROW = 100
+
+def offload_result(data: Any) -> Optional[Tuple[Dict[str, Any], Iterator[Any]]]:
+    """
+    The stand-in for `data` and the chunks to store, or None if `data` is small enough to stay in
+    the message (or is already stored).
+    """
+    if data is None:
+        return None
+    spilled = data.get("spilled") if isinstance(data, dict) else None
+    if spilled is not None:
+        if not spilled.get("path") or not os.path.exists(spilled["path"]):
+            return None
+        stand_in = {**data, "spilled": {key: value for key, value in spilled.items() if key != "path"}}
+        return stand_in, _spill_chunks(spilled)
+    text = json.dumps(data, default=str, separators=(",", ":"))
+    if len(text) <= RESULT_INLINE_CHARS:
+        return None
+    if isinstance(data, list):
+        info = {"format": "jsonl", "bytes": len(text), "items": len(data), "preview": data[:SPILL_PREVIEW_ITEMS]}
+        chunks = (data[i:i + RESULT_CHUNK_ITEMS] for i in range(0, len(data), RESULT_CHUNK_ITEMS))
+    else:
+        info = {"format": "raw", "bytes": len(text), "items": None, "preview": []}
+        chunks = (text[i:i + RESULT_CHUNK_CHARS] for i in range(0, len(text), RESULT_CHUNK_CHARS))
+    status = data.get("status", "SUCCESS") if isinstance(data, dict) else "SUCCESS"
+    stand_in = {"status": status, "message": f"Large result ({len(text)} bytes) stored with the session.",
+                "spilled": info}
+    return stand_in, chunks
+
+def _spill_chunks(spilled: Dict[str, Any]) -> Iterator[Any]:
+    """A spill file in stored-result chunks. There is always at least one, possibly empty."""
+    if spilled.get("format") == "jsonl":
+        chunk: List[Any] = []
+        with open(spilled["path"], "rb") as f:
+            for line in f:
+                chunk.append(json.loads(line))
+                if len(chunk) == RESULT_CHUNK_ITEMS:
+                    yield chunk
+                    chunk = []
+        if chunk or not spilled.get("items"):
+            yield chunk
+        return
+    with open(spilled["path"], encoding="utf-8", errors="replace") as f:
+        text = f.read(RESULT_CHUNK_CHARS)
+        yield text
+        while text:
+            text = f.read(RESULT_CHUNK_CHARS)
+            if text:
+                yield text
+
+def is_stored(data: Any) -> bool:
+    """Whether `data` is the stand-in of a result stored with the session."""
+    spilled = data.get("spilled") if isinstance(data, dict) else None
+    return bool(spilled) and not spilled.get("path")
+
+def _page_bounds(info: Dict[str, Any], page: int, page_size: int) -> Tuple[int, int, int]:
+    """(start, end, chunk size) of a page, in items for JSON Lines and in characters for raw text."""
+    if info.get("format") == "jsonl":
+        return page * page_size, (page + 1) * page_size, RESULT_CHUNK_ITEMS
+    rows = page_size * RAW_PAGE_CHARS_PER_ROW
+    return page * rows, (page + 1) * rows, RESULT_CHUNK_CHARS
+
+def chunk_span(info: Dict[str, Any], page: int, page_size: int) -> Tuple[int, int]:
+    """The first and last chunk numbers holding a page."""
+    start, end, size = _page_bounds(info, max(page, 0), page_size)
+    return start // size, (end - 1) // size
+
+def page_from_chunks(info: Dict[str, Any], chunks: List[Any], page: int, page_size: int) -> Any:
+    """One page, cut from the chunks chunk_span() named (in order): a list of items, or a text slice."""
+    start, end, size = _page_bounds(info, max(page, 0), page_size)
+    offset = (start // size) * size
+    if info.get("format") == "jsonl":
+        items = [item for chunk in chunks for item in chunk]
+        return items[start - offset:end - offset]
+    return "".join(chunks)[start - offset:end - offset]
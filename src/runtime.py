@@ -0,0 +1,124 @@
+# src/runtime.py
+
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Coroutine, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CALL_TIMEOUT = float(os.getenv("APP_CALL_TIMEOUT", "120"))
+
+ShutdownHook = Callable[[], Awaitable[Any]]
+
+class AsyncRunner:
+    """
+    Owns one asyncio event loop running in a daemon thread for the lifetime of the process.
+    Synchronous callers (e.g. Streamlit scripts) submit coroutines to it, so loop-bound
+    resources such as the asyncpg pool, httpx clients and agents survive across calls.
+    """
+
+    def __init__(self, name: str = "async-runner"):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name=name, daemon=True)
+        self._shutdown_hooks: List[ShutdownHook] = []
+        self._closed = False
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Schedules `coro` on the runner's loop and returns a thread-safe future."""
+        if self._closed:
+            coro.close()
+            raise RuntimeError("AsyncRunner has been shut down.")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = DEFAULT_CALL_TIMEOUT) -> Any:
+        """Runs `coro` to completion and returns its result; cancels it if `timeout` expires."""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Operation did not finish within {timeout:g}s and was cancelled.")
+        except BaseException:
+            # e.g. Streamlit stopping the script thread mid-call: do not leave the coroutine running.
+            future.cancel()
+            raise
+
+    def stream(self, agen: AsyncIterator[Any], timeout: Optional[float] = DEFAULT_CALL_TIMEOUT) -> Iterator[Any]:
+        """
+        Iterates an async generator on the runner's loop from a synchronous caller. `timeout`
+        bounds the whole iteration; closing the returned iterator early cancels the generator.
+        """
+        items: "queue.Queue" = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put((True, item))
+            except BaseException as e:
+                items.put((False, e))
+                raise
+            finally:
+                items.put((True, done))
+
+        future = self.submit(pump())
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    ok, item = items.get(timeout=remaining)
+                except queue.Empty:
+                    raise TimeoutError(f"Operation did not finish within {timeout:g}s and was cancelled.")
+                if not ok:
+                    raise item
+                if item is done:
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    # --- Lifecycle ---
+
+    def add_shutdown_hook(self, hook: ShutdownHook) -> None:
+        """Registers an async callable to be awaited (in reverse order) when the runner shuts down."""
+        self._shutdown_hooks.append(hook)
+
+    def remove_shutdown_hook(self, hook: ShutdownHook) -> None:
+        if hook in self._shutdown_hooks:
+            self._shutdown_hooks.remove(hook)
+
+    async def _run_shutdown_hooks(self) -> None:
+        for hook in reversed(self._shutdown_hooks):
+            try:
+                await hook()
+            except Exception as e:
+                logger.warning(f"Shutdown hook {hook!r} failed: {e}")
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Runs the shutdown hooks, then stops the loop and joins its thread. Safe to call twice."""
+        if self._closed:
+            return
+        try:
+            self.run(self._run_shutdown_hooks(), timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Shutdown hooks did not complete: {e}")
+        self._closed = True
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
@@ -0,0 +1,508 @@
+# src/session.py
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from database import DatabaseConn, close_pool
+from src.api_client import ApiClient
+from src.history import ChatHistory
+from src.llm_agent import get_cognitive_agent
+from src.metrics import span
+from src.results import chunk_span, is_stored, offload_result, page_from_chunks
+from src.spill import read_spill_page
+from src.tools import APIRequest, APIPlan, Question
+
+logger = logging.getLogger(__name__)
+
+# Where conversations live between requests: "memory" (one process) or "postgres" (shared by all workers).
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+ENDPOINT_CACHE_SIZE = 32
+MAX_TURN_METRICS = 100
+
+GREETING = "Hello! Please provide an API endpoint to begin."
+_URL = re.compile(r'https?://[^\s/]+(?::\d+)?')
+
+class SessionNotFound(KeyError):
+    """The session does not exist or has expired."""
+
+class SessionConflict(RuntimeError):
+    """Another request changed the session while this one was using it."""
+
+# --- Shared Endpoints ---
+# One ApiClient (connection pool, response cache) and loaded spec per API base URL, shared by
+# every session in the process. Requests hold an endpoint through use_endpoint(); one evicted
+# from the cache while in use is closed when its last user is done with it.
+
+@dataclass
+class Endpoint:
+    client: ApiClient
+    api_spec: Optional[str] = None
+    api_spec_compact: Optional[str] = None
+    users: int = 0
+    evicted: bool = False
+
+_endpoints: "OrderedDict[str, Endpoint]" = OrderedDict()
+_endpoint_locks: Dict[str, asyncio.Lock] = {}
+
+async def _release_endpoint(endpoint: Endpoint) -> None:
+    endpoint.users -= 1
+    if endpoint.evicted and endpoint.users == 0:
+        await endpoint.client.aclose()
+
+async def _evict_endpoints() -> None:
+    while len(_endpoints) > ENDPOINT_CACHE_SIZE:
+        evicted_url, evicted = _endpoints.popitem(last=False)
+        _endpoint_locks.pop(evicted_url, None)
+        evicted.evicted = True
+        if evicted.users == 0:
+            await evicted.client.aclose()
+
+@asynccontextmanager
+async def use_endpoint(base_url: str, reload: bool = False) -> AsyncIterator[Endpoint]:
+    """
+    Yields the shared endpoint for `base_url`, fetching its spec on first use (or when `reload` is
+    set). The endpoint is counted as in use until the block exits.
+    """
+    endpoint = _endpoints.get(base_url)
+    if endpoint is not None and not reload:
+        _endpoints.move_to_end(base_url)
+        endpoint.users += 1
+    else:
+        lock = _endpoint_locks.setdefault(base_url, asyncio.Lock())
+        async with lock:
+            endpoint = _endpoints.get(base_url)
+            fetch = endpoint is None or reload
+            if endpoint is None:
+                endpoint = Endpoint(ApiClient(base_url))
+            endpoint.users += 1
+            if fetch:
+                try:
+                    spec = await endpoint.client.get_api_spec()
+                except BaseException:
+                    await _release_endpoint(endpoint)
+                    raise
+                if spec:
+                    endpoint.api_spec = json.dumps(spec, separators=(",", ":"))
+                    endpoint.api_spec_compact = endpoint.client.spec_compact
+            endpoint.evicted = False
+            _endpoints[base_url] = endpoint
+            _endpoints.move_to_end(base_url)
+    try:
+        await _evict_endpoints()
+        yield endpoint
+    finally:
+        await _release_endpoint(endpoint)
+
+async def close_endpoints() -> None:
+    """Shutdown hook: closes the shared API clients."""
+    while _endpoints:
+        _, endpoint = _endpoints.popitem()
+        await endpoint.client.aclose()
+    _endpoint_locks.clear()
+
+async def close_resources() -> None:
+    """Shutdown hook for hosts of sessions: closes the shared API clients and the database pool."""
+    await close_endpoints()
+    await close_pool()
+
+# --- Session ---
+
+class Session:
+    """
+    One user's conversation with both agents: the chat messages (with their result data), the compact
+    history the API agent sees, and whatever is waiting for the user's confirmation. This is the
+    logic the Streamlit scripts used to run inline; hosts load a session, call one method, save it.
+    """
+
+    def __init__(self, session_id: Optional[str] = None, messages: Optional[List[Dict[str, Any]]] = None,
+                 base_url: Optional[str] = None, pending_api_request: Optional[APIRequest] = None,
+                 pending_api_plan: Optional[APIPlan] = None, pending_sql: Optional[str] = None,
+                 turn_metrics: Optional[List[Dict[str, Any]]] = None, spec_loaded: bool = False,
+                 version: int = 0, history: Optional[ChatHistory] = None):
+        self.id = session_id or uuid.uuid4().hex
+        self.messages = messages if messages is not None else [{"role": "assistant", "content": GREETING, "data": None}]
+        self.history = history if history is not None else ChatHistory.from_messages(self.messages)
+        self.base_url = base_url
+        self.pending_api_request = pending_api_request
+        self.pending_api_plan = pending_api_plan
+        self.pending_sql = pending_sql
+        self.turn_metrics = turn_metrics or []
+        self.spec_loaded = spec_loaded
+        self.version = version
+        self.last_used = time.monotonic()
+        # Messages before this index are already in the store, their large results stored out of line.
+        self.stored_messages = 0
+
+    # --- Serialization ---
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "base_url": self.base_url,
+            "pending_api_request": self.pending_api_request.model_dump() if self.pending_api_request else None,
+            "pending_api_plan": self.pending_api_plan.model_dump() if self.pending_api_plan else None,
+            "pending_sql": self.pending_sql,
+            "turn_metrics": self.turn_metrics,
+            "spec_loaded": self.spec_loaded,
+            "history": self.history.to_records(),
+        }
+
+    @classmethod
+    def from_dict(cls, session_id: str, state: Dict[str, Any], version: int = 0) -> "Session":
+        request, plan = state.get("pending_api_request"), state.get("pending_api_plan")
+        records = state.get("history")
+        session = cls(
+            session_id, state.get("messages"), state.get("base_url"),
+            APIRequest.model_validate(request) if request else None,
+            APIPlan.model_validate(plan) if plan else None,
+            state.get("pending_sql"), state.get("turn_metrics"), state.get("spec_loaded", False), version,
+            ChatHistory.from_records(records) if records is not None else None,
+        )
+        session.stored_messages = len(session.messages)
+        return session
+
+    def summary(self) -> Dict[str, Any]:
+        """Everything a client shows besides the messages."""
+        return {
+            "session_id": self.id,
+            "base_url": self.base_url,
+            "spec_loaded": self.spec_loaded,
+            "pending_api_request": self.pending_api_request.model_dump() if self.pending_api_request else None,
+            "pending_api_plan": self.pending_api_plan.model_dump() if self.pending_api_plan else None,
+            "pending_sql": self.pending_sql,
+            "last_turn": self.turn_metrics[-1] if self.turn_metrics else None,
+        }
+
+    def add_message(self, role: str, content: str, data: Any = None) -> None:
+        self.messages.append({"role": role, "content": content, "data": data})
+        self.history.append(role, content, data)
+
+    def _record_turn_metrics(self, ttft: float, total: float, from_cache: bool, streamed: bool) -> None:
+        metrics = {"ttft_s": round(ttft, 3), "total_s": round(total, 3), "from_cache": from_cache, "streamed": streamed}
+        logger.info(f"Agent turn metrics: {metrics}")
+        self.turn_metrics = (self.turn_metrics + [metrics])[-MAX_TURN_METRICS:]
+
+    # --- API Agent ---
+
+    async def set_endpoint(self, url: str) -> None:
+        self.base_url = url.rstrip("/")
+        self.spec_loaded = False
+        self.pending_api_request = None
+        self.pending_api_plan = None
+        async with use_endpoint(self.base_url, reload=True) as endpoint:
+            self.spec_loaded = bool(endpoint.api_spec)
+        if self.spec_loaded:
+            self.add_message("assistant", f"✅ API endpoint set to `{url}` and specification loaded successfully! How can I help?")
+        else:
+            self.add_message("assistant", f"⚠️ API endpoint set to `{url}`, but I could not find a specification.")
+
+    async def stream_chat(self, prompt: str, stream: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Handles one chat message: a URL sets the API endpoint, anything else is an agent turn.
+        Yields {"type": "partial", "kind", "decision"} events while the decision streams in (when
+        `stream` is set), then {"type": "done", "messages": [messages added by this turn]}.
+        """
+        first_new = len(self.messages)
+        self.add_message("user", prompt)
+        url_match = _URL.search(prompt)
+        if url_match:
+            try:
+                await self.set_endpoint(url_match.group(0))
+            except Exception as e:
+                logger.error(f"Could not initialize API client: {e}", exc_info=True)
+                self.add_message("assistant", f"An error occurred: {e}")
+        elif not self.base_url:
+            self.add_message("assistant", "Please provide an API endpoint first.")
+        else:
+            # Decision and execution are timed as one "turn" trace (see the debug panel)
+            with span("turn", agent="api"):
+                try:
+                    async with use_endpoint(self.base_url) as endpoint:
+                        agent = get_cognitive_agent(self.base_url, endpoint.api_spec, endpoint.api_spec_compact)
+                        # The messages before this prompt that fit the history token budget go in as message history
+                        history = self.history.context(skip_last=1)
+                        if stream:
+                            final = None
+                            async for update in agent.stream_decide(prompt, history):
+                                if not update.done and update.decision is not None:
+                                    yield {"type": "partial", "kind": type(update.decision).__name__,
+                                           "decision": update.decision.model_dump(exclude_none=True)}
+                                final = update
+                            decision, from_cache = final.decision, final.from_cache
+                            self._record_turn_metrics(final.ttft, final.total, from_cache, streamed=True)
+                        else:
+                            started = time.perf_counter()
+                            decision, from_cache = await agent.decide(prompt, history)
+                            elapsed = time.perf_counter() - started
+                            self._record_turn_metrics(elapsed, elapsed, from_cache, streamed=False)
+                        await self._act(decision, from_cache, endpoint.client)
+                except Exception as e:
+                    logger.error(f"An error occurred: {e}", exc_info=True)
+                    self.add_message("assistant", f"An error occurred: {e}")
+        yield {"type": "done", "messages": self.messages[first_new:]}
+
+    async def chat(self, prompt: str) -> List[Dict[str, Any]]:
+        """Like stream_chat() without partial output; returns the messages added by this turn."""
+        async for event in self.stream_chat(prompt, stream=False):
+            if event["type"] == "done":
+                return event["messages"]
+        return []
+
+    async def _act(self, decision: Any, from_cache: bool, client: ApiClient) -> None:
+        if isinstance(decision, Question):
+            self.add_message("assistant", decision.question_to_user)
+
+        elif isinstance(decision, APIRequest):
+            # Replayed writes (including DELETE) always go through confirmation
+            if decision.method in ["POST", "PUT"] or (from_cache and decision.method != "GET"):
+                self.pending_api_request = decision
+            else: # For GET/DELETE, execute immediately
+                result = await client.make_request(decision.method, decision.endpoint, decision.json_payload, decision.params)
+                self.add_message("assistant", "API call successful.", data=result)
+
+        elif isinstance(decision, APIPlan):
+            # Plans that write, and replayed plans with any non-GET step, are confirmed as one batch
+            if decision.needs_confirmation or (from_cache and any(s.method != "GET" for s in decision.steps)):
+                self.pending_api_plan = decision
+            else:
+                await self._execute_plan(decision, client)
+        else:
+            self.add_message("assistant", "I'm not sure how to proceed. Can you please clarify?")
+
+    async def _execute_plan(self, plan: APIPlan, client: ApiClient) -> None:
+        """Runs all steps of a plan, independent ones concurrently, and reports each step's result."""
+        try:
+            results = await client.execute_plan(plan)
+        except Exception as e:
+            self.add_message("assistant", f"Plan execution failed: {e}")
+            return
+        failed = [step_id for step_id, result in results.items()
+                  if isinstance(result, dict) and result.get("status") in ("FAILED", "SKIPPED")]
+        summary = f"Plan executed: {len(results) - len(failed)}/{len(results)} steps succeeded."
+        if failed:
+            summary += f" Failed or skipped: {', '.join(failed)}."
+        self.add_message("assistant", summary, data=results)
+
+    async def confirm(self) -> List[Dict[str, Any]]:
+        """Executes the pending API request or plan; returns the messages added."""
+        first_new = len(self.messages)
+        request, plan = self.pending_api_request, self.pending_api_plan
+        self.pending_api_request = self.pending_api_plan = None
+        if request is None and plan is None:
+            return []
+        async with use_endpoint(self.base_url) as endpoint:
+            if request is not None:
+                try:
+                    result = await endpoint.client.make_request(request.method, request.endpoint,
+                                                                request.json_payload, request.params)
+                except Exception as e:
+                    result = {"status": "FAILED", "message": str(e)}
+                self.add_message("assistant", "API call executed.", data=result)
+            else:
+                await self._execute_plan(plan, endpoint.client)
+        return self.messages[first_new:]
+
+    def cancel(self) -> List[Dict[str, Any]]:
+        """Drops the pending API request or plan; returns the messages added."""
+        first_new = len(self.messages)
+        if self.pending_api_plan is not None:
+            self.add_message("assistant", "API plan cancelled.")
+        elif self.pending_api_request is not None:
+            self.add_message("assistant", "API request cancelled.")
+        self.pending_api_request = self.pending_api_plan = None
+        return self.messages[first_new:]
+
+    async def spec(self) -> Optional[str]:
+        """The (compact) spec of the session's API, for display."""
+        if not self.base_url:
+            return None
+        async with use_endpoint(self.base_url) as endpoint:
+            return endpoint.api_spec_compact or endpoint.api_spec
+
+    def data_page(self, index: int, page: int, page_size: int) -> Any:
+        """One page of a message's spilled result data, or None if there is none (or it is gone from disk)."""
+        if not 0 <= index < len(self.messages):
+            return None
+        data = self.messages[index].get("data")
+        spilled = data.get("spilled") if isinstance(data, dict) else None
+        if not spilled or not spilled.get("path") or not os.path.exists(spilled["path"]):
+            return None
+        return read_spill_page(spilled, page, page_size)
+
+    # --- Database Agent ---
+
+    async def generate(self, query: str):
+        """Runs the notes/DDL agent. Generated DDL is held in the session until execute() confirms it."""
+        from main import ask_generate
+        self.pending_sql = None
+        response = await ask_generate(query)
+        if response and response.response_type == "ddl_generated":
+            self.pending_sql = response.sql_query
+        return response
+
+    async def execute(self) -> Dict[str, str]:
+        """Executes the DDL generated by the last generate() call."""
+        from main import ask_execute
+        sql, self.pending_sql = self.pending_sql, None
+        if not sql:
+            return {"status": "FAILED", "message": "There is no generated SQL waiting to be executed."}
+        try:
+            return await ask_execute(sql)
+        except Exception as e:
+            return {"status": "FAILED", "message": str(e)}
+
+# --- Session Stores ---
+
+class MemorySessionStore:
+    """Sessions held in this process, least recently used first out. Needs sticky routing with several workers."""
+
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    async def load(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_used > self.ttl:
+            del self._sessions[session_id]
+            return None
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def save(self, session: Session) -> None:
+        session.version += 1
+        session.last_used = time.monotonic()
+        self._sessions[session.id] = session
+        self._sessions.move_to_end(session.id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    async def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    async def data_page(self, session: Session, index: int, page: int, page_size: int) -> Any:
+        return session.data_page(index, page, page_size)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+class PostgresSessionStore:
+    """Sessions in the agent_sessions table, so any worker (or host) can serve any request."""
+
+    def __init__(self, db: Optional[DatabaseConn] = None, ttl: float = SESSION_TTL):
+        self.db = db or DatabaseConn()
+        self.ttl = ttl
+        self._last_pruned = 0.0
+
+    async def load(self, session_id: str) -> Optional[Session]:
+        row = await self.db.load_session(session_id, float(self.ttl))
+        if row is None:
+            return None
+        state, version = row
+        return Session.from_dict(session_id, state, version)
+
+    async def save(self, session: Session) -> None:
+        # Only messages added since the load can hold a large result or a spill file; it is stored
+        # once, and the saved state carries a stand-in instead. The session's own messages are left
+        # as they are; stored spill files are removed once the save succeeds.
+        state, results, spill_paths = session.to_dict(), [], []
+        messages = state["messages"] = list(session.messages)
+        for index in range(session.stored_messages, len(messages)):
+            data = messages[index].get("data")
+            offloaded = offload_result(data)
+            if offloaded is not None:
+                stand_in, chunks = offloaded
+                if isinstance(data, dict) and "spilled" in data:
+                    spill_paths.append(data["spilled"]["path"])
+                messages[index] = {**messages[index], "data": stand_in}
+                results.append((index, chunks))
+        if not await self.db.save_session(session.id, state, session.version, results):
+            raise SessionConflict(f"Session {session.id} was changed by another request; please retry.")
+        session.version += 1
+        session.stored_messages = len(messages)
+        for path in spill_paths:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove stored spill file {path}: {e}")
+        if time.monotonic() - self._last_pruned > self.ttl / 10:
+            self._last_pruned = time.monotonic()
+            removed = await self.db.delete_idle_sessions(float(self.ttl))
+            if removed:
+                logger.info(f"Removed {removed} idle sessions")
+
+    async def delete(self, session_id: str) -> bool:
+        return await self.db.delete_session(session_id)
+
+    async def data_page(self, session: Session, index: int, page: int, page_size: int) -> Any:
+        data = session.messages[index].get("data") if 0 <= index < len(session.messages) else None
+        if not is_stored(data):
+            return session.data_page(index, page, page_size)
+        info = data["spilled"]
+        first, last = chunk_span(info, page, page_size)
+        chunks = await self.db.load_result_chunks(session.id, index, first, last)
+        if not chunks and first == 0:
+            return None  # nothing stored at all
+        return page_from_chunks(info, chunks, page, page_size)
+
+def create_session_store(kind: str = SESSION_STORE):
+    if kind == "postgres":
+        return PostgresSessionStore()
+    if kind != "memory":
+        raise ValueError(f"Unknown SESSION_STORE: {kind}")
+    return MemorySessionStore()
+
+class SessionManager:
+    """
+    Loads, locks and saves sessions around each request. Requests for the same session are
+    serialized within a process; across processes the store's version check reports conflicts.
+    """
+
+    def __init__(self, store=None):
+        self.store = store if store is not None else create_session_store()
+        self._locks: Dict[str, List[Any]] = {}  # session id -> [lock, number of holders and waiters]
+
+    async def create(self) -> Session:
+        session = Session()
+        await self.store.save(session)
+        return session
+
+    async def delete(self, session_id: str) -> bool:
+        return await self.store.delete(session_id)
+
+    async def data_page(self, session_id: str, index: int, page: int, page_size: int) -> Any:
+        """One page of a message's large result data, or None if there is none (or it is gone)."""
+        async with self.open(session_id, save=False) as session:
+            return await self.store.data_page(session, index, page, page_size)
+
+    @asynccontextmanager
+    async def open(self, session_id: str, save: bool = True) -> AsyncIterator[Session]:
+        """Yields the session for one request and saves it afterwards (if `save`), unless the request failed."""
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                session = await self.store.load(session_id)
+                if session is None:
+                    raise SessionNotFound(session_id)
+                yield session
+                if save:
+                    await self.store.save(session)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(session_id, None)
@@ -0,0 +1,82 @@
+# src/spec_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+SPEC_CACHE_ENABLED = os.getenv("SPEC_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SPEC_CACHE_DIR = os.getenv(
+    "SPEC_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "cognitive-api-agent", "specs")
+)
+SPEC_CACHE_TTL = float(os.getenv("SPEC_CACHE_TTL", "3600"))
+
+@dataclass
+class CachedSpec:
+    """A fetched OpenAPI spec plus the validators needed to revalidate it."""
+    base_url: str
+    spec_url: str
+    spec: Dict[str, Any]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+    compact: Optional[str] = None
+
+    def is_fresh(self, ttl: float) -> bool:
+        return (time.time() - self.fetched_at) < ttl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+class SpecCache:
+    """Persistent per-base-URL cache of API specs, one JSON file per base URL."""
+
+    def __init__(self, directory: str = SPEC_CACHE_DIR, ttl: float = SPEC_CACHE_TTL):
+        self.directory = directory
+        self.ttl = ttl
+
+    def _path(self, base_url: str) -> str:
+        key = hashlib.sha256(base_url.encode()).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, base_url: str) -> Optional[CachedSpec]:
+        path = self._path(base_url)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = CachedSpec(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable spec cache entry {path}: {e}")
+            return None
+        # Guard against hash collisions and entries copied between cache directories.
+        return entry if entry.base_url == base_url else None
+
+    def save(self, entry: CachedSpec) -> None:
+        """Writes the entry atomically so concurrent readers never see a partial file."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(asdict(entry), f, separators=(",", ":"))
+            os.replace(tmp_path, self._path(entry.base_url))
+        except Exception as e:
+            logger.warning(f"Could not write spec cache entry for {entry.base_url}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def touch(self, entry: CachedSpec) -> None:
+        """Marks an entry as freshly revalidated."""
+        entry.fetched_at = time.time()
+        self.save(entry)
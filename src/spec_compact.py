@@ -0,0 +1,210 @@
+# src/spec_compact.py
+
+import hashlib
+import json
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+HTTP_METHODS = ("get", "post", "put", "patch", "delete", "head", "options")
+SUMMARY_CHARS = 80
+
+# Example of the rendered form:
+#
+#   API Shop 1.0
+#   SCHEMAS
+#   Customer{name:string,email?:string,orders?:Order[]}
+#   OPERATIONS
+#   GET /customers/{id} path(id:integer) -> Customer  # Fetch one customer
+#   POST /customers body(Customer) -> Customer
+
+class SpecCompactor:
+    """
+    Renders an OpenAPI 3 / Swagger 2 spec as one compact signature per operation.
+    Named schemas are rendered once in a SCHEMAS section, and identical inline object
+    schemas that occur more than once are hoisted there as _S1, _S2, ... Optional
+    fields and parameters carry a '?' suffix. Output is deterministic for a given spec:
+    hoisted names are fixed up front (in fingerprint order), so an operation renders the
+    same whatever was rendered before it.
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.spec = spec
+        self._inline_counts: Dict[str, int] = {}
+        self._inline_schemas: Dict[str, Dict[str, Any]] = {}
+        self._count_inline_objects(spec.get("paths") or {})
+        repeated = sorted(key for key, count in self._inline_counts.items() if count > 1)
+        self._hoisted: Dict[str, str] = {key: f"_S{n}" for n, key in enumerate(repeated, 1)}
+
+    # --- Schema Rendering ---
+
+    def _lookup(self, ref: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        name = ref.rsplit("/", 1)[-1]
+        target: Any = self.spec
+        for part in ref[2:].split("/") if ref.startswith("#/") else []:
+            target = target.get(part.replace("~1", "/").replace("~0", "~")) if isinstance(target, dict) else None
+        return name, target if isinstance(target, dict) else None
+
+    @staticmethod
+    def _fingerprint(schema: Dict[str, Any]) -> str:
+        return hashlib.sha1(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+
+    def _count_inline_objects(self, node: Any) -> None:
+        if isinstance(node, dict):
+            if node.get("type") == "object" and node.get("properties") and "$ref" not in node:
+                key = self._fingerprint(node)
+                self._inline_counts[key] = self._inline_counts.get(key, 0) + 1
+                self._inline_schemas.setdefault(key, node)
+            for value in node.values():
+                self._count_inline_objects(value)
+        elif isinstance(node, list):
+            for value in node:
+                self._count_inline_objects(value)
+
+    def _object_fields(self, schema: Dict[str, Any], used: Dict[str, None]) -> str:
+        required = set(schema.get("required") or [])
+        fields = []
+        for name, prop in (schema.get("properties") or {}).items():
+            marker = "" if name in required else "?"
+            fields.append(f"{name}{marker}:{self.type_of(prop, used)}")
+        return "{" + ",".join(fields) + "}"
+
+    def type_of(self, schema: Any, used: Dict[str, None]) -> str:
+        """Short type expression for a schema; referenced schema names are recorded in `used`."""
+        if not isinstance(schema, dict):
+            return "any"
+        ref = schema.get("$ref")
+        if isinstance(ref, str):
+            name, _ = self._lookup(ref)
+            used[ref] = None
+            return name
+        for combinator, sep in (("allOf", "&"), ("oneOf", "|"), ("anyOf", "|")):
+            if schema.get(combinator):
+                return "(" + sep.join(self.type_of(s, used) for s in schema[combinator]) + ")"
+        if "enum" in schema:
+            return "|".join(json.dumps(v) for v in schema["enum"])
+        kind = schema.get("type")
+        if kind == "array":
+            return f"{self.type_of(schema.get('items'), used)}[]"
+        if kind == "object" or schema.get("properties"):
+            if not schema.get("properties"):
+                extra = schema.get("additionalProperties")
+                return f"map<{self.type_of(extra, used)}>" if isinstance(extra, dict) else "object"
+            key = self._fingerprint(schema)
+            if key in self._hoisted:
+                used[f"inline:{key}"] = None
+                return self._hoisted[key]
+            return self._object_fields(schema, used)
+        if schema.get("format"):
+            return f"{kind or 'string'}:{schema['format']}"
+        return kind or "any"
+
+    def _render_schemas(self, used: Dict[str, None]) -> List[str]:
+        """Renders every schema reachable from `used`, each exactly once, in a stable order."""
+        lines: Dict[str, str] = {}
+        pending = list(used)
+        while pending:
+            ref = pending.pop()
+            if ref in lines:
+                continue
+            nested: Dict[str, None] = {}
+            if ref.startswith("inline:"):
+                key = ref[len("inline:"):]
+                lines[ref] = f"{self._hoisted[key]}{self._object_fields(self._inline_schemas[key], nested)}"
+            else:
+                name, target = self._lookup(ref)
+                if target is None:
+                    lines[ref] = f"{name}=any"
+                elif target.get("type") == "object" or target.get("properties"):
+                    lines[ref] = f"{name}{self._object_fields(target, nested)}"
+                else:
+                    lines[ref] = f"{name}={self.type_of(target, nested)}"
+            pending.extend(r for r in nested if r not in lines)
+        return sorted(lines.values())
+
+    # --- Operation Rendering ---
+
+    def _param(self, param: Dict[str, Any]) -> Dict[str, Any]:
+        if "$ref" in param:
+            _, target = self._lookup(param["$ref"])
+            return target or {}
+        return param
+
+    def _body_schema(self, op: Dict[str, Any], params: List[Dict[str, Any]]) -> Optional[Any]:
+        body = op.get("requestBody")
+        if isinstance(body, dict) and "$ref" in body:
+            _, body = self._lookup(body["$ref"])
+        if isinstance(body, dict):
+            content = body.get("content") or {}
+            media = content.get("application/json") or next(iter(content.values()), {})
+            return (media or {}).get("schema")
+        for param in params:
+            if param.get("in") == "body":
+                return param.get("schema")
+        return None
+
+    def _response_schema(self, op: Dict[str, Any]) -> Optional[Any]:
+        responses = sorted(((str(code), response) for code, response in (op.get("responses") or {}).items()),
+                           key=lambda item: item[0])
+        for code, response in responses:
+            if not code.startswith("2") or not isinstance(response, dict):
+                continue
+            if "$ref" in response:
+                _, response = self._lookup(response["$ref"])
+                response = response or {}
+            if "schema" in response:
+                return response["schema"]
+            content = response.get("content") or {}
+            media = content.get("application/json") or next(iter(content.values()), {})
+            if (media or {}).get("schema"):
+                return media["schema"]
+        return None
+
+    def operation_signature(self, method: str, path: str, used: Dict[str, None]) -> str:
+        item = (self.spec.get("paths") or {}).get(path) or {}
+        op = item.get(method) or {}
+        params = [self._param(p) for p in (item.get("parameters") or []) + (op.get("parameters") or [])
+                  if isinstance(p, dict)]
+        parts = [f"{method.upper()} {path}"]
+        for location in ("path", "query", "header", "formData"):
+            group = []
+            for p in params:
+                if p.get("in") != location:
+                    continue
+                marker = "" if p.get("required") or location == "path" else "?"
+                group.append(f"{p.get('name')}{marker}:{self.type_of(p.get('schema', p), used)}")
+            if group:
+                parts.append(f"{location}({','.join(group)})")
+        body = self._body_schema(op, params)
+        if body is not None:
+            parts.append(f"body({self.type_of(body, used)})")
+        response = self._response_schema(op)
+        if response is not None:
+            parts.append(f"-> {self.type_of(response, used)}")
+        line = " ".join(parts)
+        summary = (op.get("summary") or op.get("operationId") or "").strip().replace("\n", " ")
+        if summary:
+            line += f"  # {summary[:SUMMARY_CHARS]}"
+        return line
+
+    def operations(self) -> List[Tuple[str, str]]:
+        return [(method, path) for path, item in (self.spec.get("paths") or {}).items() if isinstance(item, dict)
+                for method in HTTP_METHODS if isinstance(item.get(method), dict)]
+
+    def render(self, operations: Optional[Iterable[Tuple[str, str]]] = None) -> str:
+        """Renders the given (method, path) operations, or all of them, with the schemas they use."""
+        used: Dict[str, None] = {}
+        if operations is None:
+            operations = self.operations()
+        signatures = [self.operation_signature(m, p, used) for m, p in operations]
+        info = self.spec.get("info") or {}
+        lines = [f"API {info.get('title', '')} {info.get('version', '')}".rstrip()]
+        schemas = self._render_schemas(used)
+        if schemas:
+            lines.append("SCHEMAS")
+            lines.extend(schemas)
+        lines.append("OPERATIONS")
+        lines.extend(signatures)
+        return "\n".join(lines)
+
+def compact_spec(spec: Dict[str, Any]) -> str:
+    """Compact, deterministic text rendering of a whole spec for prompts."""
+    return SpecCompactor(spec).render()
@@ -0,0 +1,211 @@
+# src/spec_index.py
+
+import hashlib
+import json
+import logging
+import math
+import re
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+from src.spec_compact import SpecCompactor
+
+logger = logging.getLogger(__name__)
+
+HTTP_METHODS = ("get", "post", "put", "patch", "delete", "head", "options")
+DEFAULT_TOP_K = 8
+MAX_REF_DEPTH = 6
+INDEX_CACHE_SIZE = 16
+
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "for", "in", "on", "by", "with", "is", "are", "be",
+    "me", "my", "i", "you", "it", "this", "that", "please", "can", "could", "would", "all", "from",
+}
+
+# --- Text Helpers ---
+
+def estimate_tokens(text: str) -> int:
+    """Cheap, offline token estimate (~4 characters per token for English/JSON)."""
+    return (len(text) + 3) // 4
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens with camelCase/snake_case split and a naive plural strip."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    tokens = []
+    for word in re.findall(r"[A-Za-z0-9]+", text.lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+# --- $ref Resolution ---
+
+def resolve_refs(node: Any, spec: Dict[str, Any], depth: int = 0, seen: Tuple[str, ...] = ()) -> Any:
+    """Inlines local '#/...' references. Cycles and very deep nesting are left as {'$ref': ...}."""
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/"):
+            if ref in seen or depth >= MAX_REF_DEPTH:
+                return {"$ref": ref}
+            target: Any = spec
+            for part in ref[2:].split("/"):
+                part = part.replace("~1", "/").replace("~0", "~")
+                target = target.get(part) if isinstance(target, dict) else None
+            if target is None:
+                return {"$ref": ref}
+            return resolve_refs(target, spec, depth + 1, seen + (ref,))
+        return {k: resolve_refs(v, spec, depth, seen) for k, v in node.items()}
+    if isinstance(node, list):
+        return [resolve_refs(v, spec, depth, seen) for v in node]
+    return node
+
+# --- Operation Chunks ---
+
+@dataclass
+class Operation:
+    method: str
+    path: str
+    fragment: Dict[str, Any]
+    tokens: List[str] = field(default_factory=list)
+
+    @property
+    def key(self) -> str:
+        return f"{self.method.upper()} {self.path}"
+
+def _searchable_text(path: str, method: str, op: Dict[str, Any]) -> str:
+    parts = [method, path, path, op.get("operationId", ""), op.get("summary", ""), op.get("description", "")]
+    parts.extend(op.get("tags", []))
+    for param in op.get("parameters", []):
+        if isinstance(param, dict):
+            parts.extend([param.get("name", ""), param.get("description", "")])
+    schema = (((op.get("requestBody") or {}).get("content") or {}).get("application/json") or {}).get("schema")
+    if isinstance(schema, dict):
+        parts.extend((schema.get("properties") or {}).keys())
+        parts.append(schema.get("title", ""))
+    return " ".join(str(p) for p in parts if p)
+
+def merge_parameters(shared: List[Any], own: List[Any]) -> List[Dict[str, Any]]:
+    """
+    A path item's parameters plus an operation's own. Both apply to the operation; an operation
+    parameter replaces the path-level one with the same name and location.
+    """
+    merged: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+    for param in list(shared) + list(own):
+        if isinstance(param, dict):
+            merged[(param.get("name"), param.get("in"))] = param
+    return list(merged.values())
+
+def split_operations(spec: Dict[str, Any]) -> List[Operation]:
+    """Splits a spec into one self-contained chunk per (method, path), with $refs resolved."""
+    operations = []
+    for path, item in (spec.get("paths") or {}).items():
+        if not isinstance(item, dict):
+            continue
+        shared_params = item.get("parameters", [])
+        for method in HTTP_METHODS:
+            op = item.get(method)
+            if not isinstance(op, dict):
+                continue
+            resolved = resolve_refs(op, spec)
+            if shared_params:
+                resolved["parameters"] = merge_parameters(resolve_refs(shared_params, spec),
+                                                          resolved.get("parameters") or [])
+            # Only the success responses help the agent shape a call; error bodies are noise.
+            responses = {code: body for code, body in (resolved.get("responses") or {}).items()
+                         if str(code).startswith("2")}
+            if responses:
+                resolved["responses"] = responses
+            else:
+                resolved.pop("responses", None)
+            operations.append(Operation(
+                method=method, path=path, fragment=resolved,
+                tokens=tokenize(_searchable_text(path, method, resolved)),
+            ))
+    return operations
+
+# --- BM25 Index ---
+
+class SpecIndex:
+    """Local BM25 index over the operations of one OpenAPI spec."""
+
+    def __init__(self, spec: Dict[str, Any], k1: float = 1.5, b: float = 0.75):
+        self.spec = spec
+        self.k1 = k1
+        self.b = b
+        self.operations = split_operations(spec)
+        self.compactor = SpecCompactor(spec)
+        self.full_tokens = estimate_tokens(json.dumps(spec, indent=2))
+        self._term_freqs = [Counter(op.tokens) for op in self.operations]
+        self._lengths = [len(op.tokens) for op in self.operations]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        doc_freq: Counter = Counter()
+        for tf in self._term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(self.operations)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def search(self, query: str, k: int = DEFAULT_TOP_K) -> List[Operation]:
+        if len(self.operations) <= k:
+            return list(self.operations)
+        terms = [t for t in set(tokenize(query)) if t in self._idf]
+        scored = []
+        for i, tf in enumerate(self._term_freqs):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / (self._avg_length or 1.0))
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            scored.append((score, i))
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        return [self.operations[i] for _, i in scored[:k]]
+
+    def build_context(self, query: str, k: int = DEFAULT_TOP_K) -> Tuple[str, Dict[str, int]]:
+        """
+        Renders compact signatures of the top-k operations for `query` (plus the schemas they use)
+        and reports the token savings versus the full pretty-printed spec.
+        """
+        selected = self.search(query, k)
+        text = self.compactor.render([(op.method, op.path) for op in selected])
+        if len(selected) < len(self.operations):
+            text += (f"\n(Showing the {len(selected)} most relevant of {len(self.operations)} operations. "
+                     "Ask the user to clarify if none of them fit.)")
+        used = estimate_tokens(text)
+        stats = {
+            "operations_total": len(self.operations),
+            "operations_selected": len(selected),
+            "full_spec_tokens": self.full_tokens,
+            "context_tokens": used,
+            "tokens_saved": max(self.full_tokens - used, 0),
+        }
+        return text, stats
+
+# --- Index Cache ---
+
+_index_cache: "OrderedDict[str, SpecIndex]" = OrderedDict()
+
+def spec_hash(api_spec: str) -> str:
+    return hashlib.sha256(api_spec.encode()).hexdigest()
+
+def get_spec_index(api_spec: str) -> Optional[SpecIndex]:
+    """Returns the (cached) index for a JSON spec string, or None if the string is not a spec."""
+    key = spec_hash(api_spec)
+    index = _index_cache.get(key)
+    if index is not None:
+        _index_cache.move_to_end(key)
+        return index
+    try:
+        spec = json.loads(api_spec)
+    except (TypeError, json.JSONDecodeError):
+        return None
+    if not isinstance(spec, dict):
+        return None
+    index = SpecIndex(spec)
+    _index_cache[key] = index
+    if len(_index_cache) > INDEX_CACHE_SIZE:
+        _index_cache.popitem(last=False)
+    logger.info(f"Indexed {len(index.operations)} API operations")
+    return index
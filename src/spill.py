@@ -0,0 +1,224 @@
+# src/spill.py
+
+import codecs
+import json
+import logging
+import os
+import re
+import tempfile
+import uuid
+from itertools import islice
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SPILL_DIR = os.getenv("API_SPILL_DIR", os.path.join(tempfile.gettempdir(), "cognitive-api-agent", "responses"))
+SPILL_PREVIEW_ITEMS = 20
+
+# --- Incremental JSON Array Parsing ---
+
+class JsonArrayParser:
+    """
+    Incrementally parses a top-level JSON array fed in byte chunks, returning each element
+    as soon as it is complete, so arbitrarily long arrays never sit in memory as one string.
+    An element cut off by a chunk boundary is scanned for its end once, across feeds, and only
+    decoded when the end has been seen: a closing bracket or quote, or, for a number or literal,
+    the delimiter that follows it.
+    """
+
+    # Runs the scanner can skip in one step: the rest of a string (up to its closing quote or an
+    # escape cut off by the chunk boundary), anything but brackets and strings inside a container,
+    # and the characters of a number or literal.
+    _STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+    _NESTED_RUN = re.compile(r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*', re.S)
+    _SCALAR = re.compile(r'[^"\[\]{}, \t\r\n]*')
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._started = False
+        self._finished = False
+        # An incomplete element starts at the beginning of the buffer and is scanned up to _scanned.
+        self._in_element = False
+        self._scanned = 0
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        self._buffer += self._text.decode(chunk)
+        return self._drain()
+
+    def close(self) -> List[Any]:
+        self._buffer += self._text.decode(b"", final=True)
+        items = self._drain()
+        if not self._finished or self._buffer.strip():
+            raise ValueError("Response body is not a complete JSON array.")
+        return items
+
+    def _element_end(self, buf: str, i: int) -> Optional[int]:
+        """
+        The end of the element being scanned, or None if it is not complete yet. Scanning starts at
+        `i` and, when the element is incomplete, resumes where it stopped on the next call.
+        """
+        n = len(buf)
+        while i < n:
+            if self._in_string:
+                i = self._STRING_BODY.match(buf, i).end()
+                if i >= n or buf[i] != '"':
+                    break  # the string, or an escape in it, continues in the next chunk
+                i += 1
+                self._in_string = False
+                if self._depth == 0:
+                    return i
+                continue
+            i = (self._NESTED_RUN if self._depth else self._SCALAR).match(buf, i).end()
+            if i >= n:
+                break
+            char = buf[i]
+            if char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+            elif char in "]}":
+                if self._depth == 0:
+                    return i  # a number or literal closed by the end of the array
+                self._depth -= 1
+                if self._depth == 0:
+                    return i + 1
+            else:
+                return i  # a number or literal followed by a delimiter
+            i += 1
+        self._scanned = min(i, n)
+        return None
+
+    def _drain(self) -> List[Any]:
+        items = []
+        pos = 0
+        buf = self._buffer
+        while not self._finished:
+            if not self._in_element:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos >= len(buf):
+                    break
+                if not self._started:
+                    if buf[pos] != "[":
+                        raise ValueError("Response body is not a JSON array.")
+                    self._started = True
+                    pos += 1
+                    continue
+                if buf[pos] == "]":
+                    self._finished = True
+                    pos += 1
+                    continue
+                # Most elements arrive whole: one decode takes them, unless a number or literal is
+                # not followed by a delimiter yet (more of it may follow). The rest are scanned for their end.
+                try:
+                    item, stop = self._decoder.raw_decode(buf, pos)
+                    if buf[pos] in '[{"' or (stop < len(buf) and buf[stop] in " \t\r\n,]"):
+                        items.append(item)
+                        pos = stop
+                        continue
+                except json.JSONDecodeError:
+                    pass
+                self._in_element, self._scanned, self._depth, self._in_string = True, pos, 0, False
+            end = self._element_end(buf, self._scanned)
+            if end is None:
+                break
+            item, stop = self._decoder.raw_decode(buf, pos)
+            if stop != end:
+                raise ValueError("Response body is not a JSON array.")
+            items.append(item)
+            self._in_element = False
+            pos = end
+        self._buffer = buf[pos:]
+        self._scanned -= pos
+        return items
+
+# --- Spill Files ---
+
+class SpillWriter:
+    """
+    Writes an oversized response to disk. The raw body is always kept; if the body is a JSON
+    array its elements are also written as JSON Lines, which replaces the raw copy on success.
+    """
+
+    def __init__(self, content_type: str, directory: str = SPILL_DIR):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, uuid.uuid4().hex)
+        self._raw_path = base + ".raw"
+        self._raw = open(self._raw_path, "wb")
+        self._parser: Optional[JsonArrayParser] = None
+        self._lines = None
+        if "json" in content_type:
+            self._parser = JsonArrayParser()
+            self._lines_path = base + ".jsonl"
+            self._lines = open(self._lines_path, "wb")
+        self.items = 0
+        self.bytes = 0
+        self.preview: List[Any] = []
+
+    def write(self, chunk: bytes) -> None:
+        self.bytes += len(chunk)
+        self._raw.write(chunk)
+        if self._parser is not None:
+            try:
+                self._write_items(self._parser.feed(chunk))
+            except ValueError:
+                self._abandon_lines()
+
+    def _write_items(self, items: List[Any]) -> None:
+        for item in items:
+            self._lines.write(json.dumps(item, separators=(",", ":")).encode() + b"\n")
+            if len(self.preview) < SPILL_PREVIEW_ITEMS:
+                self.preview.append(item)
+            self.items += 1
+
+    def _abandon_lines(self) -> None:
+        """The body is not a JSON array after all; keep only the raw copy."""
+        self._parser = None
+        self._lines.close()
+        os.remove(self._lines_path)
+        self.preview = []
+
+    def discard(self) -> None:
+        """Drops a partially written spill, e.g. when the transfer fails midway."""
+        self._raw.close()
+        paths = [self._raw_path]
+        if self._parser is not None:
+            self._lines.close()
+            paths.append(self._lines_path)
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def finish(self) -> Dict[str, Any]:
+        self._raw.close()
+        if self._parser is not None:
+            try:
+                self._write_items(self._parser.close())
+            except ValueError:
+                self._abandon_lines()
+        if self._parser is not None:
+            self._lines.close()
+            os.remove(self._raw_path)
+            path, fmt = self._lines_path, "jsonl"
+        else:
+            path, fmt = self._raw_path, "raw"
+        logger.info(f"Spilled {self.bytes} byte response to {path}")
+        return {
+            "path": path, "format": fmt, "bytes": self.bytes,
+            "items": self.items if fmt == "jsonl" else None, "preview": self.preview,
+        }
+
+def read_spill_page(spill: Dict[str, Any], page: int, page_size: int = 100) -> Any:
+    """Reads one page of a spilled response: a list of elements for JSON Lines, else a text slice."""
+    page = max(page, 0)
+    if spill.get("format") == "jsonl":
+        with open(spill["path"], "rb") as f:
+            return [json.loads(line) for line in islice(f, page * page_size, (page + 1) * page_size)]
+    chunk_bytes = page_size * 100
+    with open(spill["path"], "rb") as f:
+        f.seek(page * chunk_bytes)
+        return f.read(chunk_bytes).decode("utf-8", errors="replace")
@@ -1,7 +1,7 @@
 # src/tools.py
 
-from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional, Literal, Union
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, Any, List, Optional, Literal, Union
 
 # --- Pydantic Schemas for Agent Output ---
 
@@ -16,5 +16,47 @@ class Question(BaseModel):
     """The agent's decision to ask the user a clarifying question."""
     question_to_user: str = Field(..., description="A clear, specific question to ask the user to get missing information.")
 
-# The agent's final output must be one of these two types
-AgentDecision = Union[APIRequest, Question]
\ No newline at end of file
+class PlanStep(APIRequest):
+    """One API call within a multi-step plan."""
+    id: str = Field(..., description="A short unique id for this step, e.g. 's1'.")
+    depends_on: List[str] = Field(
+        default_factory=list,
+        description="Ids of steps whose output this step needs. Steps without dependencies run in parallel.",
+    )
+
+class APIPlan(BaseModel):
+    """
+    The agent's decision to make several API calls at once. A step can use an earlier step's
+    output in its endpoint, params or payload with a placeholder like '{{s1.id}}' or
+    '{{s1.items.0.customerId}}'; the referenced step must be listed in `depends_on`.
+    """
+    steps: List[PlanStep] = Field(..., description="The API calls to make.")
+
+    @model_validator(mode="after")
+    def check_dependencies(self) -> "APIPlan":
+        ids = [step.id for step in self.steps]
+        if len(ids) != len(set(ids)):
+            raise ValueError("Plan step ids must be unique.")
+        known = set(ids)
+        for step in self.steps:
+            missing = [dep for dep in step.depends_on if dep not in known]
+            if missing:
+                raise ValueError(f"Step '{step.id}' depends on unknown steps: {missing}")
+        # Reject cycles: repeatedly peel off steps whose dependencies are all resolved.
+        resolved: set = set()
+        remaining = list(self.steps)
+        while remaining:
+            ready = [s for s in remaining if set(s.depends_on) <= resolved]
+            if not ready:
+                raise ValueError("Plan steps have circular dependencies.")
+            resolved.update(s.id for s in ready)
+            remaining = [s for s in remaining if s.id not in resolved]
+        return self
+
+    @property
+    def needs_confirmation(self) -> bool:
+        """Plans that write (POST/PUT) are confirmed as one batch before anything runs."""
+        return any(step.method in ("POST", "PUT") for step in self.steps)
+
+# The agent's final output must be one of these types
+AgentDecision = Union[APIRequest, APIPlan, Question]
\ No newline at end of file
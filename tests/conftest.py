@@ -0,0 +1,8 @@
+# tests/conftest.py
+
+import os
+import sys
+
+# The agents build their OpenAI models at import time; the tests never call OpenAI.
+os.environ.setdefault("OPENAI_API_KEY", "test-offline")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,36 @@
+# tests/test_api_client.py
+
+import pytest
+
+from src.api_client import resolve_path, resolve_placeholders
+
+
+def test_path_values_are_encoded_as_one_segment():
+    outputs = {"s1": {"id": "7/../admin?x=1#top", "n": 42}}
+    assert resolve_path("/customers/{{s1.id}}/orders", outputs) == "/customers/7%2F..%2Fadmin%3Fx%3D1%23top/orders"
+    assert resolve_path("/customers/{{ s1.n }}", outputs) == "/customers/42"
+
+
+def test_payload_placeholders_keep_their_type():
+    outputs = {"s1": [{"id": 5}]}
+    assert resolve_placeholders({"customerId": "{{s1.0.id}}", "note": "for {{s1.0.id}}"}, outputs) == \
+        {"customerId": 5, "note": "for 5"}
+
+
+def test_unknown_step_output_is_an_error():
+    with pytest.raises(ValueError, match="no output yet"):
+        resolve_path("/customers/{{s9.id}}", {})
+
+
+def test_rate_limiter_works_across_event_loops():
+    import asyncio
+    from src.api_client import RateLimiter
+
+    limiter = RateLimiter(rate=1000, burst=1)
+
+    async def contend():
+        # Waiters contend for the lock, which binds an asyncio.Lock to the running loop.
+        await asyncio.gather(*(limiter.acquire() for _ in range(3)))
+
+    asyncio.run(contend())
+    asyncio.run(contend())  # a lock kept from the first loop raises RuntimeError here
@@ -0,0 +1,58 @@
+# tests/test_backend.py
+
+import json
+
+import httpx
+import pytest
+
+from src.backend import ServiceBackend
+from src.session import SessionNotFound
+
+
+def make_backend(handler):
+    backend = ServiceBackend("http://agent.test")
+    backend._client = httpx.Client(base_url=backend.base_url, transport=httpx.MockTransport(handler))
+    return backend
+
+
+def busy_then(response_for):
+    """A handler that answers the first request 503 + Retry-After, then delegates."""
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.path)
+        if len(seen) == 1:
+            return httpx.Response(503, headers={"retry-after": "0"}, json={"detail": "busy"})
+        return response_for(request)
+
+    return handler, seen
+
+
+def test_stream_chat_waits_out_backpressure():
+    events = [{"type": "partial", "kind": "Question", "decision": {}}, {"type": "done", "messages": []}]
+    body = "".join(json.dumps(e) + "\n" for e in events)
+    handler, seen = busy_then(lambda request: httpx.Response(200, text=body))
+    assert list(make_backend(handler).stream_chat("abc", "hi")) == events
+    assert seen == ["/sessions/abc/chat"] * 2
+
+
+def test_data_page_waits_out_backpressure():
+    handler, seen = busy_then(lambda request: httpx.Response(200, json={"rows": [{"id": 1}]}))
+    assert make_backend(handler).data_page("abc", 2, 0, 100) == [{"id": 1}]
+    assert len(seen) == 2
+
+
+@pytest.mark.parametrize("call", [
+    lambda backend: list(backend.stream_chat("gone", "hi")),
+    lambda backend: backend.data_page("gone", 2, 0, 100),
+    lambda backend: backend.chat("gone", "hi"),
+])
+def test_missing_sessions_raise_session_not_found(call):
+    backend = make_backend(lambda request: httpx.Response(404, json={"detail": "not found"}))
+    with pytest.raises(SessionNotFound):
+        call(backend)
+
+
+def test_expired_data_page_is_none():
+    backend = make_backend(lambda request: httpx.Response(410, json={"detail": "gone"}))
+    assert backend.data_page("abc", 2, 0, 100) is None
@@ -0,0 +1,41 @@
+# tests/test_intent_router.py
+
+import pytest
+
+from intent_router import parse_intent
+
+
+@pytest.mark.parametrize("query, tool, args", [
+    ("list notes", "list_notes_tool", {}),
+    ("Please show me all of my notes.", "list_notes_tool", {}),
+    ("what notes do i have?", "list_notes_tool", {}),
+    ("show note bench-7", "retrieve_note_tool", {"title": "bench-7"}),
+    ("get note titled Plan", "retrieve_note_tool", {"title": "Plan"}),
+    ("open the note v1.2!", "retrieve_note_tool", {"title": "v1.2"}),
+    ("show me note 'Meeting from Monday'", "retrieve_note_tool", {"title": "Meeting from Monday"}),
+    ('read note "Bob\'s list"', "retrieve_note_tool", {"title": "Bob's list"}),
+    ("delete note 'Draft.'", "delete_note_tool", {"title": "Draft."}),
+    ("remove my note `a, b and c`.", "delete_note_tool", {"title": "a, b and c"}),
+    ("search notes for quarterly report", "search_notes_tool", {"search_term": "quarterly report"}),
+    ("find notes about 'milk, eggs'?", "search_notes_tool", {"search_term": "milk, eggs"}),
+])
+def test_plain_commands_are_routed(query, tool, args):
+    intent = parse_intent(query)
+    assert intent is not None
+    assert (intent.tool_name, intent.args) == (tool, args)
+
+
+@pytest.mark.parametrize("query", [
+    "show me note from Monday",
+    "get note titled Plan please",
+    'delete note ""',
+    "delete note '  '",
+    "delete note 'a' and 'b'",
+    "delete note Plan and Draft",
+    "show note",
+    "search notes for ''",
+    "search notes for cats and then delete them",
+    "create a note titled Plan",
+])
+def test_anything_else_goes_to_the_agent(query):
+    assert parse_intent(query) is None
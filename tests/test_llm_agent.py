@@ -0,0 +1,105 @@
+# tests/test_llm_agent.py
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from pydantic import TypeAdapter
+
+from src import llm_agent
+from src.decision_cache import DecisionCache
+from src.tools import Question
+
+
+class UnreadableStream:
+    """A streamed run whose structured output never validates."""
+
+    async def stream_structured(self, debounce_by=None):
+        for last in (False, False, True):
+            yield object(), last
+
+    async def validate_structured_result(self, message, allow_partial=False):
+        TypeAdapter(int).validate_python("not a decision")  # raises ValidationError
+
+    def usage(self):
+        return None
+
+    def all_messages(self):
+        return []
+
+
+class InvalidFinalStream(UnreadableStream):
+    """Partial decisions validate, but the final structured output does not."""
+
+    async def validate_structured_result(self, message, allow_partial=False):
+        if allow_partial:
+            return Question(question_to_user="Which customer")
+        await super().validate_structured_result(message, allow_partial)
+
+
+class RunResult:
+    def __init__(self, data):
+        self.data = data
+
+    def all_messages(self):
+        return []
+
+
+class FakeAgent:
+    def __init__(self, stream=UnreadableStream, repaired=None):
+        self.stream = stream
+        self.repaired = repaired
+        self.repair_prompts = []
+
+    @asynccontextmanager
+    async def run_stream(self, prompt, message_history=None):
+        yield self.stream()
+
+    async def run(self, prompt, message_history=None):
+        self.repair_prompts.append(prompt)
+        return RunResult(self.repaired)
+
+
+def make_agent(monkeypatch, **kwargs):
+    cache = DecisionCache()
+    monkeypatch.setattr(llm_agent, "get_decision_cache", lambda: cache)
+    monkeypatch.setattr(llm_agent, "record_usage", lambda result: None)
+    agent = llm_agent.CognitiveAgent(agent=FakeAgent(**kwargs), system_prompt="", api_spec="{}", spec_key="k",
+                                     spec_inline=True)
+    return agent, cache
+
+
+def stream(agent, prompt="get customer 7"):
+    async def run():
+        return [update async for update in agent.stream_decide(prompt, [])]
+    return asyncio.run(run())
+
+
+def test_stream_without_a_valid_decision_falls_back_to_a_question(monkeypatch):
+    monkeypatch.setattr(llm_agent, "DECISION_REPAIR_TURNS", 0)
+    agent, cache = make_agent(monkeypatch)
+
+    updates = stream(agent)
+    assert len(updates) == 1 and updates[0].done
+    assert isinstance(updates[0].decision, Question)
+    assert cache.stats()["stores"] == 0
+
+
+def test_invalid_final_message_is_not_replaced_by_the_last_partial(monkeypatch):
+    monkeypatch.setattr(llm_agent, "DECISION_REPAIR_TURNS", 0)
+    agent, cache = make_agent(monkeypatch, stream=InvalidFinalStream)
+
+    updates = stream(agent)
+    assert [u.done for u in updates] == [False, False, True]
+    final = updates[-1].decision
+    assert isinstance(final, Question) and final.question_to_user.startswith("I could not put together")
+    assert cache.stats()["stores"] == 0
+
+
+def test_invalid_final_message_goes_through_repair(monkeypatch):
+    repaired = Question(question_to_user="Which customer id?")
+    agent, cache = make_agent(monkeypatch, stream=InvalidFinalStream, repaired=repaired)
+
+    updates = stream(agent)
+    assert updates[-1].done and updates[-1].decision == repaired
+    assert len(agent.agent.repair_prompts) == 1
+    assert cache.stats()["stores"] == 1
@@ -0,0 +1,77 @@
+# tests/test_notes_agent.py
+
+import asyncio
+import re
+
+import pytest
+
+import main
+from bench.fake_llm import notes_model
+from src.decision_cache import DecisionCache
+
+
+class MemoryNotes:
+    """The DatabaseConn calls the note tools make, kept in a dict."""
+
+    def __init__(self):
+        self.notes = {}
+
+    async def add_note(self, title, text):
+        if title in self.notes:
+            return False
+        self.notes[title] = {"title": title, "text": text}
+        return True
+
+    async def get_note_by_title(self, title):
+        return self.notes.get(title)
+
+    async def delete_note(self, title):
+        return self.notes.pop(title, None) is not None
+
+
+def _script(prompt):
+    title = re.search(r"'([^']+)'", prompt).group(1)
+    if prompt.startswith("Jot down"):
+        return "create_note_tool", {"title": title, "text": "hello"}
+    return "retrieve_note_tool", {"title": title}
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    db, cache, calls = MemoryNotes(), DecisionCache(), []
+    monkeypatch.setattr(main, "_db", db)
+    monkeypatch.setattr(main, "get_decision_cache", lambda: cache)
+
+    def script(prompt):
+        calls.append(prompt)
+        return _script(prompt)
+
+    with main.main_agent.override(model=notes_model(script, latency=0)):
+        yield db, calls
+
+
+def test_repeated_reads_are_replayed_without_the_model(agent):
+    db, calls = agent
+    db.notes["Plan"] = {"title": "Plan", "text": "ship it"}
+
+    async def run():
+        first = await main.ask_generate("What did I write in 'Plan'?")
+        second = await main.ask_generate("what did I write in 'Plan'")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.note == second.note == db.notes["Plan"]
+    assert len(calls) == 1
+
+
+def test_writes_are_never_replayed_from_the_cache(agent):
+    db, calls = agent
+
+    async def run():
+        await main.ask_generate("Jot down a note titled 'Plan'")
+        del db.notes["Plan"]
+        return await main.ask_generate("Jot down a note titled 'Plan'")
+
+    asyncio.run(run())
+    assert len(calls) == 2  # the model was asked both times
+    assert "Plan" in db.notes
@@ -0,0 +1,26 @@
+# tests/test_operation_model.py
+
+from src.operation_model import OperationModel
+
+SPEC = {
+    "openapi": "3.0.3",
+    "info": {"title": "Shop", "version": "1.0"},
+    "paths": {
+        "/customers/{id}": {
+            "parameters": [
+                {"name": "id", "in": "path", "required": True, "schema": {"type": "integer"}},
+                {"name": "expand", "in": "query", "schema": {"type": "boolean"}},
+            ],
+            "get": {"parameters": [{"name": "fields", "in": "query", "schema": {"type": "string"}}]},
+        },
+    },
+}
+
+
+def test_path_level_and_operation_parameters_both_apply():
+    model = OperationModel(SPEC)
+    assert model.validate("GET", "/customers/42", {"expand": "true", "fields": "name"}) == []
+    assert model.validate("GET", "/customers/abc", {"expand": "true"}) == [
+        'path parameter \'id\': expected integer, got "abc"']
+    assert model.validate("GET", "/customers/42", {"sort": "name"}) == [
+        "unknown query parameters ['sort'] (known: expand, fields)"]
@@ -0,0 +1,175 @@
+# tests/test_resilience.py
+
+import asyncio
+import time
+
+import pytest
+
+from bench.servers import serve_asgi
+from bench.standin_api import Faults, StandinAPI
+from src.api_client import ApiClient
+from src.resilience import CircuitBreaker, ConcurrencyLimiter, RetryPolicy, parse_retry_after
+
+# ApiClient's retries, Retry-After handling, circuit breaker and concurrency cap, exercised against
+# the bench's fault-injecting stand-in API served on a local port.
+
+
+class InFlight:
+    """ASGI wrapper that records the most requests the stand-in was serving at once."""
+
+    def __init__(self, app):
+        self.app = app
+        self.current = 0
+        self.peak = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.current += 1
+        self.peak = max(self.peak, self.current)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.current -= 1
+
+
+@pytest.fixture(scope="module")
+def server():
+    standin = StandinAPI(customers=50)
+    app = InFlight(standin)
+    with serve_asgi(app) as url:
+        yield standin, app, url
+
+
+@pytest.fixture
+def standin(server):
+    standin, app, _ = server
+    standin.faults = Faults()
+    standin.reset_counts()
+    app.peak = 0
+    return standin
+
+
+def make_client(url, max_retries=3, max_delay=10.0, threshold=100, reset_timeout=30.0):
+    client = ApiClient(url, retry=RetryPolicy(max_retries=max_retries, base_delay=0.001, max_delay=max_delay))
+    client.response_cache = None
+    # Breakers and limiters are shared per base URL; each test gets its own.
+    client.breaker = CircuitBreaker(threshold=threshold, reset_timeout=reset_timeout)
+    client.concurrency = ConcurrencyLimiter(10)
+    return client
+
+
+def run(client, *calls):
+    async def go():
+        try:
+            return await asyncio.gather(*(client.make_request(*call) for call in calls))
+        finally:
+            await client.aclose()
+    return asyncio.run(go())
+
+
+# --- Retries ---
+
+def test_idempotent_requests_are_retried_up_to_the_limit(server, standin):
+    standin.faults = Faults(error_rate=1.0, error_status=503)
+    (result,) = run(make_client(server[2], max_retries=2), ("GET", "/customers/1"))
+    assert result["status"] == "FAILED" and "503" in result["message"]
+    assert standin.status_counts == {503: 3}  # the first try and two retries
+
+
+def test_non_idempotent_requests_are_not_retried(server, standin):
+    standin.faults = Faults(error_rate=1.0, error_status=503)
+    run(make_client(server[2], max_retries=3), ("POST", "/customers", {"name": "Ada", "email": "ada@example.com"}))
+    assert standin.status_counts == {503: 1}
+
+
+def test_statuses_outside_the_retry_set_are_returned_at_once(server, standin):
+    standin.faults = Faults(error_rate=1.0, error_status=500)
+    run(make_client(server[2], max_retries=3), ("GET", "/customers/1"))
+    assert standin.status_counts == {500: 1}
+
+
+def test_transient_failures_are_hidden_by_retries(server, standin):
+    standin.faults = Faults(error_rate=0.3, error_status=502)
+    client = make_client(server[2], max_retries=8)
+    results = run(client, *[("GET", f"/customers/{i}") for i in range(1, 21)])
+    assert all(r.get("status") != "FAILED" for r in results)
+    assert standin.status_counts.get(502, 0) > 0
+
+
+# --- Retry-After ---
+
+def test_retry_after_is_honoured(server, standin):
+    standin.faults = Faults(error_rate=1.0, error_status=429, retry_after="1")
+    started = time.monotonic()
+    run(make_client(server[2], max_retries=1), ("GET", "/customers/1"))
+    assert time.monotonic() - started >= 0.95  # not the ~1ms jittered backoff
+    assert standin.status_counts == {429: 2}
+
+
+def test_retry_after_beyond_the_budget_is_not_waited_for(server, standin):
+    standin.faults = Faults(error_rate=1.0, error_status=503, retry_after="120")
+    started = time.monotonic()
+    (result,) = run(make_client(server[2], max_retries=3, max_delay=5), ("GET", "/customers/1"))
+    assert time.monotonic() - started < 2
+    assert result["status"] == "FAILED"
+    assert standin.status_counts == {503: 1}
+
+
+def test_parse_retry_after_accepts_seconds_and_dates():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0  # in the past
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+# --- Circuit Breaker ---
+
+def test_open_breaker_fails_fast_without_calling_the_api(server, standin):
+    standin.faults = Faults(error_rate=1.0, error_status=503)
+    client = make_client(server[2], max_retries=0, threshold=2)
+    run(client, ("GET", "/customers/1"))
+    run(client, ("GET", "/customers/1"))
+    assert client.breaker.state == "open"
+
+    (result,) = run(client, ("GET", "/customers/1"))
+    assert result["status"] == "FAILED" and "failing repeatedly" in result["message"]
+    assert standin.status_counts == {503: 2}
+
+
+def test_half_open_breaker_lets_exactly_one_trial_through(server, standin):
+    standin.faults = Faults(error_rate=1.0, error_status=503)
+    client = make_client(server[2], max_retries=0, threshold=1, reset_timeout=0.2)
+    run(client, ("GET", "/customers/1"))
+    assert client.breaker.state == "open"
+    time.sleep(0.25)
+
+    standin.faults = Faults(latency_ms=100)  # healthy again, but slow enough for the calls to overlap
+    standin.reset_counts()
+    results = run(client, *[("GET", f"/customers/{i}") for i in range(1, 6)])
+    assert standin.status_counts == {200: 1}
+    assert sum("failing repeatedly" in str(r.get("message", "")) for r in results) == 4
+    assert client.breaker.state == "closed"
+
+
+def test_failed_trial_reopens_the_breaker(server, standin):
+    standin.faults = Faults(error_rate=1.0, error_status=503)
+    client = make_client(server[2], max_retries=0, threshold=1, reset_timeout=0.2)
+    run(client, ("GET", "/customers/1"))
+    time.sleep(0.25)
+    run(client, ("GET", "/customers/1"))
+    assert client.breaker.state == "open"
+    assert standin.status_counts == {503: 2}
+
+
+# --- Concurrency Limit ---
+
+def test_concurrency_limiter_caps_in_flight_requests(server, standin):
+    _, app, url = server
+    standin.faults = Faults(latency_ms=50)
+    client = make_client(url)
+    client.concurrency = ConcurrencyLimiter(3)
+    results = run(client, *[("GET", f"/customers/{i}") for i in range(1, 13)])
+    assert all(r.get("status") != "FAILED" for r in results)
+    assert app.peak == 3
@@ -0,0 +1,35 @@
+# tests/test_response_cache.py
+
+import copy
+
+import pytest
+
+from src import response_cache
+from src.response_cache import ResponseCache, freshness_lifetime
+
+
+@pytest.mark.parametrize("cache_control", ["private", "private, max-age=60", "no-store", "max-age=60, Private"])
+def test_private_and_no_store_responses_are_not_stored(cache_control):
+    assert freshness_lifetime({"cache-control": cache_control}) is None
+    cache = ResponseCache()
+    assert cache.store("k", "http://api", "/me", {"id": 1}, {"cache-control": cache_control, "etag": '"a"'}, 0.1) is None
+
+
+def test_responses_without_freshness_headers_are_not_served_fresh():
+    cache = ResponseCache()
+    assert cache.store("k", "http://api", "/customers", [1], {}, 0.1) is None
+    entry = cache.store("k", "http://api", "/customers", [1], {"etag": '"a"'}, 0.1)
+    assert entry is not None and not entry.is_fresh()  # kept only to revalidate
+    assert cache.store("k", "http://api", "/customers", [1], {"cache-control": "max-age=60"}, 0.1).is_fresh()
+
+
+def test_result_is_copied_only_once_it_fits(monkeypatch):
+    copies = []
+    monkeypatch.setattr(response_cache.copy, "deepcopy", lambda value: copies.append(value) or copy.copy(value))
+    cache = ResponseCache(max_entry_bytes=100)
+    assert cache.store("big", "http://api", "/export", ["x" * 200], {"cache-control": "max-age=60"}, 0.1) is None
+    assert copies == []
+
+    result = {"id": 1}
+    entry = cache.store("small", "http://api", "/customers/1", result, {"cache-control": "max-age=60"}, 0.1)
+    assert copies == [result] and entry.result is not result
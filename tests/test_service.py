@@ -0,0 +1,47 @@
+# tests/test_service.py
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import service
+from src.session import MemorySessionStore, SessionManager
+
+
+class CountingStore(MemorySessionStore):
+    def __init__(self):
+        super().__init__()
+        self.loads = 0
+
+    async def load(self, session_id):
+        self.loads += 1
+        return await super().load(session_id)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = CountingStore()
+    monkeypatch.setattr(service, "sessions", SessionManager(store))
+    with TestClient(service.app) as client:
+        yield client, store
+
+
+def test_streamed_chat_loads_the_session_once(client):
+    client, store = client
+    session_id = client.post("/sessions").json()["state"]["session_id"]
+    response = client.post(f"/sessions/{session_id}/chat", json={"prompt": "hello", "stream": True})
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+    assert events[-1]["type"] == "done"
+    assert [m["content"] for m in events[-1]["messages"]] == ["hello", "Please provide an API endpoint first."]
+    assert store.loads == 1
+
+    state = client.get(f"/sessions/{session_id}").json()
+    assert len(state["messages"]) == 3  # greeting, prompt, reply: the streamed turn was saved
+
+
+def test_streamed_chat_for_a_missing_session_is_404(client):
+    client, _ = client
+    response = client.post("/sessions/nope/chat", json={"prompt": "hello", "stream": True})
+    assert response.status_code == 404
@@ -0,0 +1,178 @@
+# tests/test_session.py
+
+import asyncio
+import json
+import os
+
+import pytest
+
+from src import session as session_module
+from src.api_client import ApiClient
+from src.spill import SpillWriter, read_spill_page
+
+
+@pytest.fixture
+def endpoints(monkeypatch):
+    closed = []
+
+    async def get_api_spec(self):
+        return None
+
+    async def aclose(self):
+        closed.append(self.base_url)
+
+    monkeypatch.setattr(ApiClient, "get_api_spec", get_api_spec)
+    monkeypatch.setattr(ApiClient, "aclose", aclose)
+    monkeypatch.setattr(session_module, "ENDPOINT_CACHE_SIZE", 2)
+    monkeypatch.setattr(session_module, "_endpoints", type(session_module._endpoints)())
+    monkeypatch.setattr(session_module, "_endpoint_locks", {})
+    return closed
+
+
+def test_evicted_endpoint_is_closed_after_its_last_user(endpoints):
+    closed = endpoints
+
+    async def scenario():
+        async with session_module.use_endpoint("http://a") as held:
+            async with session_module.use_endpoint("http://b"):
+                pass
+            async with session_module.use_endpoint("http://c"):
+                pass
+            # "a" is now evicted from the cache, but still in use here.
+            assert "http://a" not in session_module._endpoints
+            assert closed == []
+            assert held.users == 1
+        assert closed == ["http://a"]
+
+        async with session_module.use_endpoint("http://d"):
+            pass
+        assert closed == ["http://a", "http://b"]
+
+    asyncio.run(scenario())
+
+
+def test_reused_endpoint_is_shared_and_not_closed(endpoints):
+    closed = endpoints
+
+    async def scenario():
+        async with session_module.use_endpoint("http://a") as first:
+            async with session_module.use_endpoint("http://a") as second:
+                assert first is second
+                assert first.users == 2
+        assert first.users == 0
+        assert closed == []
+
+    asyncio.run(scenario())
+
+
+class FakeSessionDb:
+    """The agent-session queries of DatabaseConn, in memory."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.results = {}
+
+    async def load_session(self, session_id, max_idle):
+        row = self.sessions.get(session_id)
+        return (json.loads(row[0]), row[1]) if row else None
+
+    async def save_session(self, session_id, state, version, results=None):
+        stored = self.sessions.get(session_id)
+        if (stored[1] if stored else 0) != version:
+            return False
+        self.sessions[session_id] = (json.dumps(state, default=str), version + 1)
+        for index, chunks in results or []:
+            for n, chunk in enumerate(chunks):
+                self.results[(session_id, index, n)] = json.loads(json.dumps(chunk))
+        return True
+
+    async def load_result_chunks(self, session_id, index, first, last):
+        return [self.results[(session_id, index, n)] for n in range(first, last + 1)
+                if (session_id, index, n) in self.results]
+
+    async def delete_idle_sessions(self, max_idle):
+        return 0
+
+
+@pytest.fixture
+def postgres_store():
+    return session_module.PostgresSessionStore(db=FakeSessionDb())
+
+
+def test_saved_state_keeps_large_results_out_of_line(postgres_store):
+    rows = [{"id": i, "name": f"item {i}"} for i in range(2000)]
+
+    async def scenario():
+        session = session_module.Session()
+        session.add_message("user", "list everything")
+        session.add_message("assistant", "API call successful.", data=rows)
+        session.add_message("assistant", "Small one.", data={"id": 1})
+        await postgres_store.save(session)
+        # The session itself still holds the full result for the response being sent.
+        assert session.messages[2]["data"] is rows
+
+        state, _ = postgres_store.db.sessions[session.id]
+        assert len(state) < 20_000
+        saved = json.loads(state)
+        assert saved["messages"][2]["data"]["spilled"]["items"] == 2000
+        assert saved["messages"][3]["data"] == {"id": 1}
+
+        manager = session_module.SessionManager(postgres_store)
+        assert await manager.data_page(session.id, 2, 4, 100) == rows[400:500]
+        # A page spanning two stored chunks.
+        assert await manager.data_page(session.id, 2, 1, 300) == rows[300:600]
+        assert await manager.data_page(session.id, 2, 10, 300) == []
+        assert await manager.data_page(session.id, 3, 0, 100) is None
+
+    asyncio.run(scenario())
+
+
+def test_loading_restores_history_without_rebuilding_it(postgres_store, monkeypatch):
+    async def scenario():
+        session = session_module.Session()
+        session.add_message("user", "list everything")
+        session.add_message("assistant", "API call successful.", data=[{"id": i} for i in range(5000)])
+        await postgres_store.save(session)
+
+        def rebuild(*args, **kwargs):
+            raise AssertionError("history rebuilt from messages")
+
+        monkeypatch.setattr(session_module.ChatHistory, "from_messages", rebuild)
+        loaded = await postgres_store.load(session.id)
+        assert [r.to_list() for r in loaded.history.context()] == [r.to_list() for r in session.history.context()]
+
+        # Results already stored are not written again by later saves.
+        written = len(postgres_store.db.results)
+        loaded.add_message("user", "thanks")
+        await postgres_store.save(loaded)
+        assert len(postgres_store.db.results) == written
+        assert (await postgres_store.load(session.id)).version == 2
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("content_type, body", [
+    ("application/json", json.dumps([{"id": i} for i in range(1200)]).encode()),
+    ("text/plain", b"x" * 120_000),
+])
+def test_spilled_response_is_readable_by_any_worker(postgres_store, tmp_path, content_type, body):
+    writer = SpillWriter(content_type, str(tmp_path))
+    for start in range(0, len(body), 7000):
+        writer.write(body[start:start + 7000])
+    spilled = writer.finish()
+    local_pages = [read_spill_page(spilled, page, 100) for page in (0, 5, 11)]
+
+    async def scenario():
+        session = session_module.Session()
+        session.add_message("assistant", "API call successful.",
+                            data={"status": "SUCCESS", "message": "Large response saved to disk.", "spilled": spilled})
+        await postgres_store.save(session)
+        assert not os.path.exists(spilled["path"])
+
+        # Another worker: its own manager, the same database.
+        other = session_module.SessionManager(session_module.PostgresSessionStore(db=postgres_store.db))
+        loaded = await other.store.load(session.id)
+        assert "path" not in loaded.messages[1]["data"]["spilled"]
+        assert [await other.data_page(session.id, 1, page, 100) for page in (0, 5, 11)] == local_pages
+
+    asyncio.run(scenario())
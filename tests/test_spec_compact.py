@@ -0,0 +1,47 @@
+# tests/test_spec_compact.py
+
+from src.spec_compact import SpecCompactor, compact_spec
+
+
+def _address():
+    return {"type": "object", "properties": {"street": {"type": "string"}, "city": {"type": "string"}}}
+
+
+def _tag():
+    return {"type": "object", "required": ["name"], "properties": {"name": {"type": "string"}}}
+
+
+def _json(schema):
+    return {"content": {"application/json": {"schema": schema}}}
+
+
+SPEC = {
+    "openapi": "3.0.3",
+    "info": {"title": "Shop", "version": "1.0"},
+    "paths": {
+        "/homes": {"post": {"requestBody": _json(_address()), "responses": {"201": {"description": "ok"}}}},
+        "/offices": {"post": {"requestBody": _json(_address()), "responses": {"201": {"description": "ok"}}}},
+        "/posts": {"put": {"requestBody": _json(_tag()), "responses": {"200": {"description": "ok"}}}},
+        "/photos": {"put": {"requestBody": _json(_tag()), "responses": {"200": {"description": "ok"}}}},
+    },
+}
+
+
+def test_hoisted_names_do_not_depend_on_render_order():
+    shared = SpecCompactor(SPEC)
+    first = shared.render([("put", "/posts")])
+    shared.render([("post", "/homes")])
+    assert shared.render([("put", "/posts")]) == first
+    assert SpecCompactor(SPEC).render([("put", "/posts")]) == first
+
+    other = SpecCompactor(SPEC)
+    other.render([("post", "/homes")])
+    assert other.render([("put", "/posts")]) == first
+
+
+def test_repeated_inline_objects_are_hoisted_once():
+    text = compact_spec(SPEC)
+    assert text == compact_spec(SPEC)
+    schemas = text.split("SCHEMAS\n")[1].split("\nOPERATIONS")[0].splitlines()
+    assert sorted(line[:3] for line in schemas) == ["_S1", "_S2"]
+    assert "{street?:string,city?:string}" not in text.split("OPERATIONS")[1]
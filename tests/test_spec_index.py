@@ -0,0 +1,47 @@
+# tests/test_spec_index.py
+
+from src.spec_index import SpecIndex, split_operations
+
+SPEC = {
+    "openapi": "3.0.3",
+    "info": {"title": "Shop", "version": "1.0"},
+    "components": {"parameters": {
+        "Expand": {"name": "expand", "in": "query", "schema": {"type": "boolean"}},
+    }},
+    "paths": {
+        "/customers/{id}": {
+            "parameters": [
+                {"name": "id", "in": "path", "required": True, "schema": {"type": "integer"}},
+                {"$ref": "#/components/parameters/Expand"},
+                {"name": "limit", "in": "query", "schema": {"type": "integer"}},
+            ],
+            "get": {
+                "summary": "Get a customer",
+                "parameters": [
+                    {"name": "fields", "in": "query", "schema": {"type": "string"}},
+                    {"name": "limit", "in": "query", "required": True, "schema": {"type": "integer", "maximum": 10}},
+                ],
+            },
+            "delete": {"summary": "Delete a customer"},
+        },
+        "/orders": {"get": {"summary": "List orders"}},
+    },
+}
+
+
+def _params(method, path):
+    op = next(op for op in split_operations(SPEC) if (op.method, op.path) == (method, path))
+    return {(p["name"], p["in"]): p for p in op.fragment["parameters"]}
+
+
+def test_path_level_parameters_apply_alongside_operation_parameters():
+    params = _params("get", "/customers/{id}")
+    assert set(params) == {("id", "path"), ("expand", "query"), ("limit", "query"), ("fields", "query")}
+    # The operation's own definition wins over the path-level one.
+    assert params[("limit", "query")]["required"] is True
+    assert set(_params("delete", "/customers/{id}")) == {("id", "path"), ("expand", "query"), ("limit", "query")}
+
+
+def test_path_level_parameter_names_are_indexed():
+    found = SpecIndex(SPEC).search("expand", k=3)
+    assert {(op.method, op.path) for op in found[:2]} == {("get", "/customers/{id}"), ("delete", "/customers/{id}")}
@@ -0,0 +1,50 @@
+# tests/test_spill.py
+
+import json
+
+import pytest
+
+from src.spill import JsonArrayParser
+
+BODY = json.dumps([
+    1001, 1002, -10.5e3, "a \"quoted\" \\ string, with ] and }", True, False, None,
+    {"name": "café", "tags": ["x", "y"], "n": 12345}, [[1, 2], []], "", 0,
+], ensure_ascii=False).encode()
+
+
+def parse(chunks):
+    parser = JsonArrayParser()
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    items.extend(parser.close())
+    return items
+
+
+def test_number_split_across_chunks():
+    assert parse([b"[1001, 1002, 10", b"03, 1004]"]) == [1001, 1002, 1003, 1004]
+    assert parse([b"[1001,10", b"02]"]) == [1001, 1002]
+
+
+@pytest.mark.parametrize("split", range(1, len(BODY)))
+def test_every_split_point(split):
+    assert parse([BODY[:split], BODY[split:]]) == json.loads(BODY)
+
+
+def test_byte_at_a_time():
+    assert parse([BODY[i:i + 1] for i in range(len(BODY))]) == json.loads(BODY)
+
+
+def test_elements_are_returned_once_complete():
+    parser = JsonArrayParser()
+    assert parser.feed(b'[{"a": 1}, tr') == [{"a": 1}]
+    assert parser.feed(b"ue") == []
+    assert parser.feed(b", nul") == [True]
+    assert parser.feed(b"l]") == [None]
+    assert parser.close() == []
+
+
+@pytest.mark.parametrize("body", [b"[1, 2", b'{"a": 1}', b"[1, tru]", b"[1] 2"])
+def test_invalid_arrays_are_rejected(body):
+    with pytest.raises(ValueError):
+        parse([body])